@@ -0,0 +1,110 @@
+"""
+Synthetic projects built from the game catalog (enhanced_recipes.json + data.json),
+for the benchmarks. Shapes:
+    mixed  top-level items expanded with random recipes, down to 12 levels (like real projects)
+    deep   long chains: one ingredient of each node is expanded (following recipe
+           cycles such as Rubber <-> Plastic), the others are outsourced
+    wide   many top-level items, each expanded over 2 levels only
+
+    python benchmarks/generator.py --nodes 10000 --shape deep > project_bench.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from models.catalog import get_catalog
+
+SHAPES = ('mixed', 'deep', 'wide')
+# Depth limit of each top-level item, per shape
+MAX_DEPTH = {'mixed': 12, 'deep': 200, 'wide': 2}
+
+
+def generate_project_dict(node_count, seed=0, name=None, shape='mixed'):
+    """
+    Generate a project (in the JSON format) of about node_count nodes: top-level items
+    expanded with random recipes of the catalog until the node budget is used.
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape '{shape}' (expected one of {', '.join(SHAPES)})")
+    rng = random.Random(seed)
+    catalog = get_catalog()
+    craftable = sorted(item_id for item_id in catalog.items if catalog.producers(item_id))
+    max_depth = MAX_DEPTH[shape]
+    remaining = node_count
+
+    def node(item_id, rate, depth):
+        nonlocal remaining
+        remaining -= 1
+        producers = catalog.producers(item_id)
+        data = {
+            'item_id': item_id,
+            'rate': rate,
+            'recipe_id': None,
+            'outsourced': False,
+            'ingredients': [],
+            'uuid': '%032x' % rng.getrandbits(128),
+            'extra_rate': 0.0,
+            'use_extra_rate': False
+        }
+        if producers and depth < max_depth and remaining > 0:
+            recipe_id = rng.choice(producers)
+            data['recipe_id'] = recipe_id
+            ratios = catalog.ingredient_ratios(recipe_id, item_id) or {}
+            # Deep chains: continue with one craftable ingredient, outsource the others
+            expanded = None
+            if shape == 'deep':
+                candidates = [ing_id for ing_id in ratios if catalog.producers(ing_id)]
+                expanded = rng.choice(candidates) if candidates else None
+            for ing_id, ratio in ratios.items():
+                if remaining <= 0:
+                    break
+                if shape == 'deep' and ing_id != expanded:
+                    remaining -= 1
+                    data['ingredients'].append({
+                        'item_id': ing_id, 'rate': rate * ratio, 'recipe_id': None, 'outsourced': True,
+                        'ingredients': [], 'uuid': '%032x' % rng.getrandbits(128),
+                        'extra_rate': 0.0, 'use_extra_rate': False
+                    })
+                    continue
+                data['ingredients'].append(node(ing_id, rate * ratio, depth + 1))
+        else:
+            data['outsourced'] = not producers or remaining <= 0
+        return data
+
+    items = []
+    while remaining > 0:
+        items.append(node(rng.choice(craftable), rng.uniform(1, 100), 0))
+    return {'name': name or f'Generated {node_count} ({shape})', 'items': items, 'dirty': False}
+
+
+def tree_stats(data):
+    """Return (node count, max depth) of a generated project."""
+    count = depth = 0
+    stack = [(item, 1) for item in data['items']]
+    while stack:
+        item, level = stack.pop()
+        count += 1
+        depth = max(depth, level)
+        stack.extend((ing, level + 1) for ing in item['ingredients'])
+    return count, depth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic project (JSON on stdout)")
+    parser.add_argument('--nodes', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shape', choices=SHAPES, default='mixed')
+    args = parser.parse_args()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    data = generate_project_dict(args.nodes, args.seed, shape=args.shape)
+    count, depth = tree_stats(data)
+    print(f"{count} nodes, {len(data['items'])} top-level items, depth {depth}", file=sys.stderr)
+    json.dump(data, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
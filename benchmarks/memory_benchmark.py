@@ -0,0 +1,93 @@
+"""
+Memory used by a generated project in its different in-memory forms:
+    - the parsed JSON (dicts and lists)
+    - Item trees (with __slots__), and Items with a per-instance __dict__ (the old layout)
+    - ArenaProject (parallel arrays)
+
+    python benchmarks/memory_benchmark.py [--nodes 50000] [--seed 0]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.generator import generate_project_dict
+from models.arena import ArenaProject
+from models.catalog import get_catalog
+from models.item import Item
+from models.project import Project
+
+
+class DictItem:
+    """The node fields of Item as they were before __slots__: a per-instance __dict__, ids not interned (for comparison only)."""
+
+    def __init__(self, item_id, rate, recipe_id=None, outsourced=False, ingredients=None, uuid_str=None, extra_rate=0.0, use_extra_rate=False):
+        self.item_id = item_id
+        self.rate = rate
+        self.recipe_id = recipe_id
+        self.outsourced = outsourced
+        self.ingredients = ingredients or []
+        self.uuid = uuid_str
+        self.extra_rate = extra_rate
+        self.use_extra_rate = use_extra_rate
+        self._card = None
+
+
+def measure(build):
+    """
+    Return (result, bytes allocated by build() and still alive, seconds). Strings shared
+    with the parsed JSON (uuids, ids) are not counted for the Item trees.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def item_from_dict(cls, data):
+    return cls(
+        data['item_id'], data['rate'], data.get('recipe_id'), data.get('outsourced', False),
+        [item_from_dict(cls, ing) for ing in data.get('ingredients', [])],
+        data.get('uuid'), data.get('extra_rate', 0.0), data.get('use_extra_rate', False)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the memory used by project representations")
+    parser.add_argument('--nodes', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    get_catalog()  # Load the game data before measuring
+
+    text = json.dumps(generate_project_dict(args.nodes, args.seed))
+    data, json_size, json_time = measure(lambda: json.loads(text))
+    node_count = sum(sum(1 for _ in Item.from_dict(d).walk()) for d in data['items'])
+    _dict_items, dict_size, dict_time = measure(lambda: [item_from_dict(DictItem, d) for d in data['items']])
+    # Both Item rows are bare trees (no Project uuid/parent indexes), built the same way
+    _slots_items, slots_size, slots_time = measure(lambda: [item_from_dict(Item, d) for d in data['items']])
+    project = Project.from_dict(data)
+    _arena, arena_size, arena_time = measure(lambda: ArenaProject.from_project(project))
+
+    print(f"Generated project: {node_count} nodes ({len(text) / 1024:.0f} KB of JSON)\n")
+    print(f"{'Representation':<28}{'Memory':>12}{'Per node':>12}{'Build time':>14}")
+    for label, size, elapsed in (
+        ('Parsed JSON (dicts)', json_size, json_time),
+        ('Item with __dict__', dict_size, dict_time),
+        ('Item with __slots__', slots_size, slots_time),
+        ('ArenaProject (arrays)', arena_size, arena_time),
+    ):
+        print(f"{label:<28}{size / 1024 / 1024:>10.2f}MB{size / max(node_count, 1):>10.0f} B{elapsed * 1000:>11.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Benchmark suite of the hot paths, on generated projects (see benchmarks/generator.py)
+of several sizes and shapes:
+    from_dict / to_dict         Project.from_dict / Project.to_dict
+    report_cold / report        first Project.get_production_report (builds the totals) / later calls
+    change_rate                 Project.change_rate on random nodes (compiled trees, running report)
+    update_rate                 Item.update_rate on the top-level items
+    cards_cold / cards          Item.to_card_dict of all top-level items, first call / after one edit
+    view_cold / view            GET /project/<id> with the Flask test client: project loaded from
+                                disk and cards rendered / project cached, after one edit
+and, once per run, on a few items:
+    crafting_paths/find_all         recipe_analyzer.find_all_crafting_paths: one compact
+                                    tree of the alternatives
+    crafting_paths/all_solutions    all of recipe_analyzer.iter_crafting_paths: every full
+                                    recipe combination (thousands per item), a different
+                                    and much larger output, not comparable with find_all
+
+Each case reports its best time over --repeat runs and its peak memory (tracemalloc,
+measured in a separate run). Results can be saved as a JSON baseline; a later run given
+--baseline fails (exit status 1) when a case is slower than its baseline by more than
+--threshold (and by more than --min-delta seconds, to ignore timer noise).
+
+    python benchmarks/run_benchmarks.py                                 # 100, 1000, 10000 nodes
+    python benchmarks/run_benchmarks.py --sizes 100000 --shapes deep
+    python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 0.25
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.generator import SHAPES, generate_project_dict, tree_stats
+from models.catalog import get_catalog
+from models.project import Project
+
+# (item, max_depth) of the crafting path benchmark (the number of paths grows very fast with the depth)
+CRAFTING_PATH_TARGETS = (('Desc_IronPlateReinforced_C', 3), ('Desc_ModularFrame_C', 2), ('Desc_Rotor_C', 2))
+# Random nodes edited by one change_rate run
+CHANGE_RATE_EDITS = 100
+
+
+def best_time(func, repeat, setup=None):
+    """Return the best time in seconds of func(setup()) over `repeat` runs (setup not timed)."""
+    best = float('inf')
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        gc.collect()
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func, setup=None):
+    """Peak bytes allocated by one run of func(setup())."""
+    arg = setup() if setup else None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(arg)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(results, name, func, repeat, setup=None):
+    seconds = best_time(func, repeat, setup)
+    peak = peak_memory(func, setup)
+    results[name] = {'seconds': seconds, 'peak_bytes': peak}
+    print(f"{name:<34}{seconds * 1000:>11.2f} ms{peak / 1024:>12.0f} KB", flush=True)
+
+
+def project_cases(results, data, prefix, repeat, seed):
+    catalog = get_catalog()
+    item_names = catalog.item_names
+    resource_names = catalog.resource_names
+    resource_ids = set(catalog.resource_ids)
+    rng = random.Random(seed)
+    uuids = []
+    stack = list(data['items'])
+    while stack:
+        item = stack.pop()
+        uuids.append(item['uuid'])
+        stack.extend(item['ingredients'])
+    edits = [(rng.choice(uuids), rng.uniform(1, 100)) for _ in range(CHANGE_RATE_EDITS)]
+
+    def fresh():
+        return Project.from_dict(data)
+
+    def with_report():
+        project = fresh()
+        project.get_production_report(item_names, resource_ids, resource_names)
+        return project
+
+    def with_cards():
+        project = with_report()
+        cards(project)
+        project.change_rate(edits[0][0], edits[0][1])
+        return project
+
+    def cards(project):
+        return [item.to_card_dict(item_names, None, resource_names, include_extra_products=True) for item in project.items]
+
+    def change_rates(project):
+        for uuid_str, rate in edits:
+            project.change_rate(uuid_str, rate)
+
+    def update_rates(project):
+        for item in project.items:
+            item.update_rate(item.rate * 1.5)
+
+    run_case(results, f'{prefix}/from_dict', lambda _: Project.from_dict(data), repeat)
+    run_case(results, f'{prefix}/to_dict', lambda project: project.to_dict(), repeat, fresh)
+    run_case(results, f'{prefix}/report_cold',
+             lambda project: project.get_production_report(item_names, resource_ids, resource_names), repeat, fresh)
+    run_case(results, f'{prefix}/report',
+             lambda project: project.get_production_report(item_names, resource_ids, resource_names), repeat, with_report)
+    run_case(results, f'{prefix}/change_rate', change_rates, repeat, with_report)
+    run_case(results, f'{prefix}/update_rate', update_rates, repeat, fresh)
+    run_case(results, f'{prefix}/cards_cold', cards, repeat, with_report)
+    run_case(results, f'{prefix}/cards', cards, repeat, with_cards)
+
+
+def view_cases(results, data, prefix, repeat, app_module, storage_dir):
+    """Time GET /project/<id> of the app, with the project saved in storage_dir."""
+    main = app_module
+    project_id = prefix.replace('/', '-')
+    main.storage.save(Project.from_dict(data), project_id)
+    client = main.app.test_client()
+    url = f'/project/{project_id}'
+
+    def uncached():
+        main.project_cache.pop(project_id, None)
+        return None
+
+    def view_cold(_):
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+
+    def edited():
+        client.get(url)
+        project = main.project_cache[project_id]
+        first = project.items[0]
+        project.change_rate(first.uuid, first.rate * 1.1)
+        return None
+
+    run_case(results, f'{prefix}/view_cold', view_cold, repeat, uncached)
+    run_case(results, f'{prefix}/view', view_cold, repeat, edited)
+    main.project_cache.pop(project_id, None)
+    main.storage.delete(project_id)
+
+
+def crafting_path_cases(results, repeat):
+    import recipe_analyzer
+    data = recipe_analyzer.load_data()
+
+    def find_all(_):
+        # The analyzer prints its exploration: keep it out of the output (not out of the timing)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for item_id, max_depth in CRAFTING_PATH_TARGETS:
+                recipe_analyzer.find_all_crafting_paths(data, item_id, max_depth=max_depth)
+
+    def iter_all(_):
+        # Enumerates every solution: not the same output as find_all (see CraftingPathEnumerator)
+        for item_id, max_depth in CRAFTING_PATH_TARGETS:
+            for _solution in recipe_analyzer.iter_crafting_paths(data, item_id, max_depth=max_depth):
+                pass
+
+    run_case(results, 'crafting_paths/find_all', find_all, repeat)
+    run_case(results, 'crafting_paths/all_solutions', iter_all, repeat)
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Print the cases slower than the baseline. Returns the number of regressions."""
+    regressions = 0
+    print(f"\nCompared with the baseline (threshold +{threshold:.0%}):")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else 1.0
+        delta = result['seconds'] - base['seconds']
+        if ratio > 1 + threshold and delta > min_delta:
+            regressions += 1
+            print(f"  REGRESSION {name}: {base['seconds'] * 1000:.2f} ms -> {result['seconds'] * 1000:.2f} ms ({ratio:.2f}x)")
+    missing = [name for name in baseline if name not in results]
+    if not regressions:
+        print("  No regression.")
+    if missing:
+        print(f"  ({len(missing)} baseline case(s) not run)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths on generated projects")
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help="Comma-separated project sizes in nodes (e.g. 100,1000,10000,100000)")
+    parser.add_argument('--shapes', default=','.join(SHAPES), help=f"Comma-separated shapes ({', '.join(SHAPES)})")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-view', action='store_true', help="Skip the Flask view_project cases")
+    parser.add_argument('--no-crafting-paths', action='store_true', help="Skip the recipe_analyzer cases")
+    parser.add_argument('--save', metavar='PATH', help="Save the results as a JSON baseline")
+    parser.add_argument('--baseline', metavar='PATH', help="Compare with a saved baseline, fail on regressions")
+    parser.add_argument('--threshold', type=float, default=0.25, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument('--min-delta', type=float, default=0.001,
+                        help="Ignore slowdowns smaller than this (seconds)")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    shapes = args.shapes.split(',')
+    for shape in shapes:
+        if shape not in SHAPES:
+            parser.error(f"Unknown shape '{shape}'")
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+    get_catalog()  # Load the game data before measuring
+
+    results = {}
+    with tempfile.TemporaryDirectory() as storage_dir:
+        app_module = None
+        if not args.no_view:
+            import main as app_module
+            from models.project_index import ProjectIndex
+            from models.storage import JsonStorage
+            # Serve the generated projects from a temp directory, not projects/
+            app_module.storage = JsonStorage(storage_dir)
+            app_module.project_index = ProjectIndex(app_module.storage, os.path.join(storage_dir, 'index.json'))
+        print(f"{'Case':<34}{'Best time':>14}{'Peak memory':>15}")
+        for shape in shapes:
+            for size in sizes:
+                data = generate_project_dict(size, args.seed, shape=shape)
+                count, depth = tree_stats(data)
+                prefix = f'{shape}/{size}'
+                print(f"-- {prefix}: {count} nodes, {len(data['items'])} top-level items, depth {depth}")
+                project_cases(results, data, prefix, args.repeat, args.seed)
+                if app_module is not None:
+                    view_cases(results, data, prefix, args.repeat, app_module, storage_dir)
+        if not args.no_crafting_paths:
+            print("-- crafting paths")
+            crafting_path_cases(results, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'results': results,
+            }, f, indent=2)
+        print(f"\nResults saved to {args.save}")
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold, args.min_delta):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
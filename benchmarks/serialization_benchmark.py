@@ -0,0 +1,60 @@
+"""
+Save / load times and file sizes of a generated project in the two project file
+formats: indented JSON (as the app writes it) and the binary format
+(models/binary_format.py). Files are written with JsonStorage, in a temp directory.
+
+    python benchmarks/serialization_benchmark.py [--nodes 50000] [--seed 0] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.generator import generate_project_dict
+from models.catalog import get_catalog
+from models.project import Project
+from models.storage import JsonStorage
+
+
+def best_time(func, repeat):
+    """Return (last result, best time in seconds) of func() over `repeat` runs."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the JSON and binary project file formats")
+    parser.add_argument('--nodes', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    get_catalog()
+
+    project = Project.from_dict(generate_project_dict(args.nodes, args.seed))
+    expected = project.to_dict()
+    node_count = sum(sum(1 for _ in item.walk()) for item in project.items)
+    print(f"Generated project: {node_count} nodes\n")
+    print(f"{'Format':<10}{'File size':>12}{'Save':>12}{'Load':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for file_format in JsonStorage.FILE_FORMATS:
+            storage = JsonStorage(os.path.join(tmp_dir, file_format), file_format=file_format)
+            _result, save_time = best_time(lambda: storage.save(project, 'bench'), args.repeat)
+            loaded, load_time = best_time(lambda: storage.load('bench'), args.repeat)
+            expected['version'] = project.version  # Incremented by every save
+            if loaded.to_dict() != expected:
+                print(f"{file_format}: the loaded project differs from the saved one!")
+            size = storage.stat('bench')[1]
+            print(f"{file_format:<10}{size / 1024:>10.0f}KB{save_time * 1000:>9.0f} ms{load_time * 1000:>9.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
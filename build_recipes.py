@@ -0,0 +1,317 @@
+"""
+Build raw_data/enhanced_recipes.json from the per-recipe files of raw_data/recipes/
+(one <recipe_id>.json per recipe) and the items/resources of raw_data/data.json.
+
+For every recipe it adds (same rules as the original notebook steps):
+    - the per-minute rate of each product and ingredient: round(60 / time * amount, 3)
+    - a 'resource' tag on each ingredient
+    - for each non-resource ingredient, the alternate recipes producing it ('recipes':
+      recipe_id, factor = ingredient rate / product rate, ingredients_id)
+    - 'recipe_id' on the recipes listed as alternates
+
+The build is incremental: each input file is hashed, and only new or changed files are
+parsed again (in a process pool); the alternates lists are only recomputed for the
+items produced by the recipes that changed. Hashes are kept in
+raw_data/.build_recipes_cache.json; a change of data.json (or of the output file
+outside this script) triggers a full rebuild. The output is validated before being
+written (atomically): a build with errors writes nothing.
+
+    python build_recipes.py [--full] [--jobs N] [--strict] [--compile-catalog]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+RAW_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'raw_data')
+RECIPES_DIR = os.path.join(RAW_DATA_DIR, 'recipes')
+DATA_PATH = os.path.join(RAW_DATA_DIR, 'data.json')
+OUTPUT_PATH = os.path.join(RAW_DATA_DIR, 'enhanced_recipes.json')
+CACHE_PATH = os.path.join(RAW_DATA_DIR, '.build_recipes_cache.json')
+CACHE_VERSION = 1
+# Below this number of files to parse, a process pool costs more than it saves
+POOL_MIN_FILES = 32
+# Keys computed by the build (ignored if present in the input files)
+DERIVED_KEYS = ('recipe_id',)
+DERIVED_ENTRY_KEYS = ('rate', 'resource', 'recipes')
+
+
+def sha256(raw):
+    return hashlib.sha256(raw).hexdigest()
+
+
+def entry_rate(recipe, entry):
+    return round(60 / recipe.get('time', 1.0) * entry.get('amount', 1), 3)
+
+
+def parse_recipe_file(path):
+    """
+    Read one recipe file: return (base recipe with its rates, warnings, number of stale
+    rates). The derived fields of the file are dropped and recomputed.
+    """
+    with open(path, 'rb') as f:
+        recipe = json.loads(f.read())
+    recipe_id = os.path.basename(path)[:-len('.json')]
+    warnings = []
+    stale_rates = 0
+    if recipe.get('recipe_id', recipe_id) != recipe_id:
+        warnings.append(f"{recipe_id}: recipe_id '{recipe['recipe_id']}' does not match the file name")
+    base = {key: value for key, value in recipe.items() if key not in DERIVED_KEYS}
+    # Recipes without products (e.g. buildings) get no rates
+    with_rates = bool(recipe.get('products')) and bool(recipe.get('time', 1.0))
+    for kind in ('ingredients', 'products'):
+        entries = []
+        for entry in recipe.get(kind, []):
+            if not isinstance(entry, dict):
+                continue
+            clean = {key: value for key, value in entry.items() if key not in DERIVED_ENTRY_KEYS}
+            if with_rates:
+                clean['rate'] = entry_rate(recipe, entry)
+                stale_rates += 'rate' in entry and entry['rate'] != clean['rate']
+            entries.append(clean)
+        base[kind] = entries
+    return base, warnings, stale_rates
+
+
+def read_json(path, default=None):
+    try:
+        with open(path, 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return default
+
+
+def write_atomic(path, content):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def recipe_order(recipe_ids, data):
+    """Recipes in data.json order first (the order of the original file), then the others by id."""
+    known = [recipe_id for recipe_id in data.get('recipes', {}) if recipe_id in recipe_ids]
+    return known + sorted(set(recipe_ids) - set(known))
+
+
+def product_items(recipe):
+    return {prod.get('item') for prod in recipe.get('products', []) if isinstance(prod, dict)}
+
+
+def item_alternates(recipes, producers, recipe_id, ingredient):
+    """The 'recipes' list of one ingredient of recipe_id (None if nothing produces it)."""
+    item = ingredient.get('item')
+    alternates = []
+    if not producers.get(item):
+        return None
+    for ir_id in producers[item]:
+        ir = recipes[ir_id]
+        if ir_id == recipe_id:
+            continue  # Skip the recipe itself (circular reference)
+        ingredients_id = [ir_ingredient['item'] for ir_ingredient in ir.get('ingredients', [])]
+        for product in ir.get('products', []):
+            if not isinstance(product, dict):
+                continue
+            if product.get('item') == item:
+                if item in ingredients_id:
+                    # The alternate also consumes the item: no factor (1)
+                    continue
+                factor = ingredient.get('rate', 1) / product.get('rate', 1)
+                break
+        else:
+            factor = 1
+        alternates.append({'recipe_id': ir_id, 'factor': factor, 'ingredients_id': ingredients_id})
+    return alternates
+
+
+def enhance(base_recipes, data, previous=None, affected_items=None, changed=()):
+    """
+    Return {recipe_id: enhanced recipe} from the base recipes (in output order).
+    With `previous` (the last output), the alternates of the ingredients that are not in
+    affected_items are reused for the recipes not in `changed`.
+    """
+    resources = data.get('resources', {})
+    valid = set(data.get('items', {})) | set(resources)
+    producers = {}  # item -> [recipe_id] (unpackage recipes are never alternates)
+    for recipe_id, recipe in base_recipes.items():
+        if not recipe.get('products') or 'unpackage' in recipe_id.lower():
+            continue
+        for item in dict.fromkeys(prod.get('item') for prod in recipe['products'] if isinstance(prod, dict)):
+            producers.setdefault(item, []).append(recipe_id)
+
+    result = {}
+    listed = set()  # Recipes returned as alternates get a 'recipe_id'
+    for recipe_id, base in base_recipes.items():
+        recipe = dict(base)
+        recipe['ingredients'] = [dict(ing) for ing in base.get('ingredients', [])]
+        recipe['products'] = [dict(prod) for prod in base.get('products', [])]
+        old = (previous or {}).get(recipe_id)
+        reuse = previous is not None and recipe_id not in changed and old is not None
+        for position, ingredient in enumerate(recipe['ingredients']):
+            item = ingredient.get('item')
+            ingredient['resource'] = item in valid and item in resources
+            if ingredient['resource']:
+                continue
+            listed.update(producers.get(item, ()))
+            if reuse and item not in affected_items:
+                old_ingredients = old.get('ingredients', [])
+                if position < len(old_ingredients) and 'recipes' in old_ingredients[position]:
+                    ingredient['recipes'] = old_ingredients[position]['recipes']
+                continue
+            alternates = item_alternates(base_recipes, producers, recipe_id, ingredient)
+            if alternates is not None:
+                ingredient['recipes'] = alternates
+        result[recipe_id] = recipe
+    for recipe_id in listed:
+        result[recipe_id]['recipe_id'] = recipe_id
+    return result
+
+
+def validate(recipes, data):
+    """Return (errors, warnings) of the enhanced recipes."""
+    errors = []
+    warnings = []
+    valid = set(data.get('items', {})) | set(data.get('resources', {}))
+    machines = set(data.get('machines', {}))
+    for recipe_id, recipe in recipes.items():
+        recipe_time = recipe.get('time', 1.0)
+        if not isinstance(recipe_time, (int, float)) or recipe_time <= 0:
+            errors.append(f"{recipe_id}: invalid time {recipe_time!r}")
+            continue
+        if recipe.get('machine') not in machines:
+            warnings.append(f"{recipe_id}: unknown machine {recipe.get('machine')}")
+        for kind in ('ingredients', 'products'):
+            for entry in recipe.get(kind, []):
+                item = entry.get('item')
+                if item not in valid:
+                    warnings.append(f"{recipe_id}: unknown {kind[:-1]} {item}")
+                amount = entry.get('amount', 1)
+                if not isinstance(amount, (int, float)) or amount <= 0:
+                    errors.append(f"{recipe_id}: invalid amount {amount!r} for {item}")
+                elif recipe.get('products') and entry.get('rate') != entry_rate(recipe, entry):
+                    errors.append(f"{recipe_id}: rate {entry.get('rate')} of {item} != amount * 60 / time")
+        for ingredient in recipe.get('ingredients', []):
+            for alternate in ingredient.get('recipes', []):
+                other = recipes.get(alternate.get('recipe_id'))
+                if other is None:
+                    errors.append(f"{recipe_id}: alternate {alternate.get('recipe_id')} does not exist")
+                elif ingredient['item'] not in product_items(other):
+                    errors.append(f"{recipe_id}: alternate {alternate['recipe_id']} does not produce {ingredient['item']}")
+    return errors, warnings
+
+
+def build(full=False, jobs=None, strict=False, recipes_dir=RECIPES_DIR, data_path=DATA_PATH,
+          output_path=OUTPUT_PATH, cache_path=CACHE_PATH):
+    """
+    Rebuild output_path. Returns (recipes, errors, warnings, stats); nothing is written
+    when there are errors (or warnings, with strict).
+    """
+    with open(data_path, 'rb') as f:
+        data_raw = f.read()
+    data = json.loads(data_raw)
+    data_hash = sha256(data_raw)
+
+    cache = read_json(cache_path, {})
+    previous = None
+    if not full and cache.get('version') == CACHE_VERSION and cache.get('data_hash') == data_hash:
+        try:
+            with open(output_path, 'rb') as f:
+                output_raw = f.read()
+            if sha256(output_raw) == cache.get('output_hash'):
+                previous = json.loads(output_raw)
+        except (OSError, ValueError):
+            previous = None
+    cached_files = cache.get('files', {}) if previous is not None else {}
+
+    hashes = {}
+    for fname in sorted(os.listdir(recipes_dir)):
+        if fname.endswith('.json'):
+            with open(os.path.join(recipes_dir, fname), 'rb') as f:
+                hashes[fname[:-len('.json')]] = sha256(f.read())
+    changed = [recipe_id for recipe_id, digest in hashes.items()
+               if cached_files.get(recipe_id, {}).get('hash') != digest]
+    removed = [recipe_id for recipe_id in cached_files if recipe_id not in hashes]
+
+    paths = [os.path.join(recipes_dir, f'{recipe_id}.json') for recipe_id in changed]
+    if len(paths) >= POOL_MIN_FILES and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parsed = list(pool.map(parse_recipe_file, paths, chunksize=16))
+    else:
+        parsed = [parse_recipe_file(path) for path in paths]
+
+    warnings = []
+    files = {}
+    stale_rates = 0
+    for recipe_id, (base, file_warnings, file_stale_rates) in zip(changed, parsed):
+        files[recipe_id] = {'hash': hashes[recipe_id], 'recipe': base}
+        warnings.extend(file_warnings)
+        stale_rates += file_stale_rates
+    for recipe_id in hashes:
+        files.setdefault(recipe_id, cached_files.get(recipe_id))
+    base_recipes = {recipe_id: files[recipe_id]['recipe'] for recipe_id in recipe_order(files, data)}
+
+    # Items whose alternates may differ: everything produced by a changed/removed recipe (before and after)
+    affected_items = set()
+    for recipe_id in changed + removed:
+        for entry in (cached_files.get(recipe_id), files.get(recipe_id)):
+            if entry:
+                affected_items |= product_items(entry['recipe'])
+    recipes = enhance(base_recipes, data, previous, affected_items, set(changed))
+
+    errors, check_warnings = validate(recipes, data)
+    warnings.extend(check_warnings)
+    stats = {'recipes': len(recipes), 'parsed': len(changed), 'removed': len(removed), 'stale_rates': stale_rates,
+             'affected_items': len(affected_items) if previous is not None else None}
+    if errors or (strict and warnings):
+        return recipes, errors, warnings, stats
+
+    content = json.dumps(recipes, indent=4, ensure_ascii=False)
+    write_atomic(output_path, content)
+    write_atomic(cache_path, json.dumps({
+        'version': CACHE_VERSION,
+        'data_hash': data_hash,
+        'output_hash': sha256(content.encode('utf-8')),
+        'files': files,
+    }))
+    return recipes, errors, warnings, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build enhanced_recipes.json from raw_data/recipes/")
+    parser.add_argument('--full', action='store_true', help="Ignore the cache and rebuild everything")
+    parser.add_argument('--jobs', type=int, default=None, help="Worker processes (default: CPU count, 1 to disable)")
+    parser.add_argument('--strict', action='store_true', help="Treat warnings (unknown items/machines) as errors")
+    parser.add_argument('--compile-catalog', action='store_true',
+                        help="Also rebuild the catalog artifact (see compile_catalog.py)")
+    parser.add_argument('--output', default=OUTPUT_PATH, help="Path of enhanced_recipes.json")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    _recipes, errors, warnings, stats = build(args.full, args.jobs, args.strict, output_path=args.output)
+    for warning in warnings:
+        print(f"Warning: {warning}")
+    for error in errors:
+        print(f"Error: {error}")
+    if errors or (args.strict and warnings):
+        print(f"\n{len(errors)} error(s), {len(warnings)} warning(s): {args.output} was not written.")
+        sys.exit(1)
+    if stats['stale_rates']:
+        print(f"{stats['stale_rates']} rate(s) of the input files did not match amount * 60 / time (recomputed)")
+    affected = 'all' if stats['affected_items'] is None else stats['affected_items']
+    print(f"\n{stats['recipes']} recipes ({stats['parsed']} file(s) parsed, {stats['removed']} removed, "
+          f"alternates recomputed for {affected} item(s)) written to {args.output} "
+          f"in {time.perf_counter() - start:.2f}s")
+    if args.compile_catalog:
+        from models.catalog import DATA_PATH as CATALOG_DATA_PATH
+        from models.catalog_artifact import write_artifact
+        size = write_artifact(CATALOG_DATA_PATH, args.output)
+        print(f"Catalog artifact rebuilt ({size / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,25 @@
-import json
-from collections import Counter
+import os
+import sys
+from models.storage import read_project_file
+
+PROJECTS_DIR = os.path.join(os.path.dirname(__file__), 'projects')
 
 def find_duplicate_uuids(json_path):
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    uuids = []
-    def collect_uuids(item):
-        if isinstance(item, dict):
-            if 'uuid' in item:
-                uuids.append(item['uuid'])
-            for v in item.values():
-                collect_uuids(v)
-        elif isinstance(item, list):
-            for v in item:
-                collect_uuids(v)
-    collect_uuids(data)
-    counter = Counter(uuids)
-    dups = [uuid for uuid, count in counter.items() if count > 1]
-    if dups:
-        print('Duplicate UUIDs found:', dups)
+    """Check the uuid index of a project file (duplicated uuids, broken links). Returns the problems found."""
+    problems = read_project_file(json_path).check_consistency()
+    if problems:
+        print(f'{json_path}:')
+        for problem in problems:
+            print(f'  {problem}')
     else:
-        print('No duplicate UUIDs found.')
+        print(f'{json_path}: no duplicate UUIDs found.')
+    return problems
 
 if __name__ == '__main__':
-    find_duplicate_uuids('projects/project_d32c662c-e8d6-4b00-b2e7-e91ae7e199cb.json')
+    # Check the given project files, or all of them
+    paths = sys.argv[1:] or sorted(
+        os.path.join(PROJECTS_DIR, fname) for fname in os.listdir(PROJECTS_DIR)
+        if fname.startswith('project_') and fname.endswith('.json')
+    )
+    failed = [path for path in paths if find_duplicate_uuids(path)]
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,25 @@
+"""
+Compile the game data (raw_data/data.json + raw_data/enhanced_recipes.json) into the
+memory-mapped catalog artifact (raw_data/catalog.bin, see models/catalog_artifact.py).
+Run it again after changing the JSON files: a stale artifact is ignored and the app
+falls back to parsing the JSON files.
+
+    python compile_catalog.py [--output raw_data/catalog.bin]
+"""
+import argparse
+from models.catalog import DATA_PATH, RECIPES_PATH
+from models.catalog_artifact import ARTIFACT_PATH, write_artifact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the game catalog into a memory-mapped artifact")
+    parser.add_argument('--data', default=DATA_PATH, help="Path of data.json")
+    parser.add_argument('--recipes', default=RECIPES_PATH, help="Path of enhanced_recipes.json")
+    parser.add_argument('--output', default=ARTIFACT_PATH, help="Path of the artifact to write")
+    args = parser.parse_args()
+    size = write_artifact(args.data, args.recipes, args.output)
+    print(f"Wrote {args.output} ({size / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    main()
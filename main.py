@@ -1,70 +1,235 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_file, g
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
 from models.item import Item
 from models.project import Project
-import json
+from models.catalog import get_catalog
+from models.project_index import ProjectIndex
+from models.storage import get_storage, VersionConflict
+from models.flusher import WriteBehindFlusher
+from models.project_cache import ProjectCache
+from models.batch import apply_batch, parse_rate, BatchError
+from models.fragment_cache import FragmentCache
+from models.project_locks import ProjectLocks
+from models.metrics import metrics, SlowRequestProfiles
+from models.aggregate import AggregateReports
+from datetime import datetime, timezone
+import functools
 import os
+import time
 import uuid
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # For session management
+# Set REPORT_DEBUG=1 to cross-check the running production reports against a full recompute
+Project.debug_report = os.environ.get('REPORT_DEBUG') == '1'
 
 PROJECTS_DIR = os.path.join(os.path.dirname(__file__), 'projects')
 os.makedirs(PROJECTS_DIR, exist_ok=True)
 
-def get_project_path(project_id):
-    return os.path.join(PROJECTS_DIR, f'project_{project_id}.json')
+# Project storage backend: JSON files (default) or SQLite, see PROJECT_STORAGE in models/storage.py
+# (PROJECT_FILE_FORMAT=binary writes the project files in the compact binary format)
+storage = get_storage()
+
+# Multi-worker mode (MULTI_WORKER=1, for several server processes): cached projects are
+# checked against the saved version before use and reloaded if another worker saved them.
+# Saves always check the version (a conflict returns 409 instead of overwriting the other
+# edits). Set PROJECT_FILE_LOCK=1 too with the JSON storage (see models/storage.py).
+MULTI_WORKER = os.environ.get('MULTI_WORKER') == '1'
+
+# Write-behind mode: with WRITE_BEHIND_INTERVAL=<seconds>, edits are saved by a background
+# thread (coalesced, at most once per interval per project) instead of inside the request.
+# Not available in multi-worker mode: the other workers would not see the pending edits.
+WRITE_BEHIND_INTERVAL = float(os.environ.get('WRITE_BEHIND_INTERVAL') or 0)
+if MULTI_WORKER and WRITE_BEHIND_INTERVAL > 0:
+    print("Warning: WRITE_BEHIND_INTERVAL is ignored in multi-worker mode")
+    WRITE_BEHIND_INTERVAL = 0
+
+# Per-project writer locks: requests editing a project (and its write-behind saves) are
+# serialized, page views render the project's last snapshot without waiting for them
+project_locks = ProjectLocks()
+
+def project_writer(view):
+    """Run a view that edits the project <project_id> under the project's lock."""
+    @functools.wraps(view)
+    def locked_view(*args, **kwargs):
+        with project_locks.hold(kwargs['project_id']):
+            return view(*args, **kwargs)
+    return locked_view
+
+def write_project(project: Project, project_id: str):
+    metrics.count('project_saves')
+    storage.save(project, project_id)
+    project_index.update(project_id, project)
+
+flusher = WriteBehindFlusher(write_project, WRITE_BEHIND_INTERVAL, lock_for=project_locks.hold) if WRITE_BEHIND_INTERVAL > 0 else None
 
 def save_project_to_disk(project: Project, project_id: str):
-    with open(get_project_path(project_id), 'w', encoding='utf-8') as f:
-        json.dump(project.to_dict(), f, indent=2)
+    """Save a project now."""
+    if flusher:
+        flusher.discard(project_id)
+    write_project(project, project_id)
+
+def persist_project(project: Project, project_id: str):
+    """Save a project after an edit: deferred to the flusher in write-behind mode."""
+    if flusher:
+        flusher.schedule(project_id, project)
+    else:
+        save_project_to_disk(project, project_id)
 
 def load_project_from_disk(project_id: str) -> Project:
-    with open(get_project_path(project_id), 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        return Project.from_dict(data)
+    if flusher:
+        flusher.flush(project_id)  # Don't read an outdated copy
+    metrics.count('project_loads')
+    return storage.load(project_id)
+
+def is_project_current(project_id: str, project: Project) -> bool:
+    """Cheap check (file stat / version query) that project was not saved by another worker."""
+    return storage.is_current(project_id, project)
+
+# In-memory project cache for unsaved changes (keyed by project_id), bounded in entries
+# and bytes: clean projects are evicted (least recently used first), dirty ones are kept
+project_cache = ProjectCache(
+    max_entries=int(os.environ.get('PROJECT_CACHE_MAX_ENTRIES', 32)),
+    max_bytes=int(os.environ.get('PROJECT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    validate=is_project_current if MULTI_WORKER else None
+)
+
+# Names and summaries of the saved projects (projects/index.json)
+project_index = ProjectIndex(storage)
+
+# Combined report of several projects (/api/report), per-project summaries computed in
+# AGGREGATE_WORKERS processes (default: CPU count, 1 to compute them in the server process)
+aggregate_reports = AggregateReports(storage, workers=int(os.environ.get('AGGREGATE_WORKERS') or 0) or None)
+
+# Rendered card fragments, reused while a node and its sub-tree are unchanged
+fragment_cache = FragmentCache(max_bytes=int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+
+# Request metrics, served in the Prometheus text format on /metrics (see models/metrics.py)
+def cache_stat(name):
+    return lambda: {'projects': project_cache.stats()[name], 'fragments': fragment_cache.stats()[name]}
+
+def project_cache_hit_ratio():
+    stats = project_cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    return {'projects': round(stats['hits'] / lookups, 4) if lookups else None,
+            'fragments': fragment_cache.stats()['hit_rate']}
+
+metrics.add_collector('cache_hits_total', 'Cache hits, per cache.', cache_stat('hits'), 'counter')
+metrics.add_collector('cache_misses_total', 'Cache misses, per cache.', cache_stat('misses'), 'counter')
+metrics.add_collector('cache_evictions_total', 'Cache evictions, per cache.', cache_stat('evictions'), 'counter')
+metrics.add_collector('cache_hit_ratio', 'Cache hits / lookups, per cache.', project_cache_hit_ratio)
+metrics.add_collector('cache_entries', 'Cache entries, per cache.', cache_stat('entries'))
+metrics.add_collector('cache_bytes', 'Approximate cache size in bytes, per cache.', cache_stat('bytes'))
+metrics.add_collector('project_cache_dirty', 'Cached projects with unsaved changes.', lambda: project_cache.stats()['dirty'])
+metrics.add_collector('catalog_generation', 'Loads of the game data.', lambda: get_catalog().generation)
+
+# Opt-in request profiling (cProfile): PROFILE_REQUESTS=all profiles every request,
+# PROFILE_REQUESTS=header only the requests sent with an "X-Profile: 1" header. The stats
+# of the PROFILE_KEEP (default 10) slowest ones are kept in PROFILE_DIR (default profiles/)
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '')
+if PROFILE_REQUESTS not in ('', 'all', 'header'):
+    print(f"Warning: unknown PROFILE_REQUESTS value '{PROFILE_REQUESTS}', request profiling disabled")
+    PROFILE_REQUESTS = ''
+request_profiles = SlowRequestProfiles(
+    os.environ.get('PROFILE_DIR') or os.path.join(os.path.dirname(__file__), 'profiles'),
+    keep=int(os.environ.get('PROFILE_KEEP', 10))
+) if PROFILE_REQUESTS else None
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = metrics.start_request()
+    if request_profiles and (PROFILE_REQUESTS == 'all' or request.headers.get('X-Profile') == '1'):
+        g.request_profile = request_profiles.start()
+
+@app.teardown_request
+def end_request_metrics(exc):
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    # Route pattern, not the path: one series per route, not per project
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    seconds, _counts = metrics.end_request(route, request.method, start)
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        path = request_profiles.finish(profile, route, request.method, seconds)
+        if path:
+            print(f"Profile of {request.method} {request.path} ({seconds * 1000:.1f} ms) saved to {path}")
+
+# Part of the project page ETags, so that they are not reused by another process
+ETAG_PREFIX = uuid.uuid4().hex[:12]
+
+@app.template_global()
+def card_fragment(card, project_root, is_root=False):
+    """HTML of a card and its ingredients (card_fragment.html), from the fragment cache if unchanged."""
+    def render():
+        catalog = get_catalog()
+        return render_template(
+            'card_fragment.html',
+            card=card,
+            project_root=project_root,
+            is_root=is_root,
+            resource_ids=catalog.resource_ids,
+            resource_names=catalog.resource_names
+        )
+    return Markup(fragment_cache.get_or_render((project_root, card['uuid'], is_root), card, render))
+
+def project_page_etag(snapshot):
+    """
+    Version of a project page: the project state (revision, see Project.touch), the
+    project list shown in the open modal and the game data.
+    """
+    return f"{ETAG_PREFIX}-{snapshot.revision}-{project_index.current_revision()}-{snapshot.generation}"
 
-# In-memory project cache for unsaved changes (keyed by project_id)
-project_cache = {}
+@app.errorhandler(VersionConflict)
+def version_conflict(e):
+    # Another worker saved the project first: drop our copy (the next request reloads it)
+    project_cache.pop(e.project_id, None)
+    print(f"Conflict: {e}")
+    if request.path.startswith('/api/'):
+        return jsonify({'error': str(e), 'version': e.stored}), 409
+    return f"{e}. Reload the project to see its current state.", 409
 
 @app.route('/project/<project_id>', methods=['GET'])
 def view_project(project_id):
-    # Prefer in-memory cache if present
-    if project_id in project_cache:
-        project = project_cache[project_id]
+    # Prefer in-memory cache if present (marked clean when loaded from disk)
+    project = Project.load(project_id, project_cache, load_project_from_disk)
+    # Render the last snapshot of the project: only wait for the project lock (edit in
+    # progress) if it changed since
+    snapshot = project.current_snapshot()
+    if snapshot is None:
+        with project_locks.hold(project_id):
+            snapshot = project.snapshot()
+    # Conditional GET: unchanged since the client's copy (ETag, or Last-Modified) -> 304
+    etag = project_page_etag(snapshot)
+    last_modified = datetime.fromtimestamp(int(snapshot.modified), timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(status=304)
     else:
-        project = load_project_from_disk(project_id)
-        project.mark_clean()  # Mark as clean when loaded from disk
-        project_cache[project_id] = project
+        response = app.make_response(render_project_page(snapshot, project_id))
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True  # Always revalidate
+    return response
+
+def render_project_page(snapshot, project_id):
     # List all projects for modal
-    projects = []
-    for fname in os.listdir(PROJECTS_DIR):
-        if fname.startswith('project_') and fname.endswith('.json'):
-            pid = fname[len('project_'):-len('.json')]
-            try:
-                p = load_project_from_disk(pid)
-                projects.append({'id': pid, 'name': p.name})
-            except Exception:
-                projects.append({'id': pid, 'name': f"(corrupt or missing) {pid}"})
-    items = Item.all_items()
-    # Load resource item_ids from data.json
-    data_path = os.path.join(os.path.dirname(__file__), 'raw_data', 'data.json')
-    with open(data_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    resource_ids = set(data.get('resources', {}).keys())
-    resource_names = {item_id: res['name'] for item_id, res in data.get('resources', {}).items()}
+    projects = project_index.list_projects()
+    catalog = get_catalog()
+    items = catalog.item_names
+    # Resource item_ids and names from data.json
+    resource_ids = set(catalog.resource_ids)
+    resource_names = catalog.resource_names
     # Build a mapping from item_id to name for display
     item_names = items
-    # Attach resource_names to project for report use
-    project.resource_names = resource_names
-    # Convert each item to a card dict for rendering
-    project_items = [item.to_card_dict(item_names, None, resource_names, include_extra_products=True) for item in project.items]
-    # --- Production report ---
-    report = project.get_production_report(item_names=item_names, resource_ids=resource_ids)
+    # Cards of the items and production report, from the snapshot (see Project.snapshot)
+    project_items = snapshot.cards
+    report = snapshot.report
     return render_template(
         'index.html',
-        project=project,
+        project=snapshot,
         project_items=project_items,
-        project_name=project.name,
+        project_name=snapshot.name,
         project_id=project_id,
         total_power=report['total_power'],
         machines=report['machines'],
@@ -77,8 +242,9 @@ def view_project(project_id):
     )
 
 @app.route('/project/<project_id>/rename', methods=['POST'])
+@project_writer
 def rename_project(project_id):
-    project = project_cache.get(project_id) or load_project_from_disk(project_id)
+    project = Project.load(project_id, project_cache, load_project_from_disk)
     new_name = request.form.get('new_name')
     if new_name:
         project.rename(new_name)
@@ -103,14 +269,16 @@ def save_project():
     if not project_id or project_id not in project_cache:
         flash('No unsaved project to save.', 'error')
         return redirect(url_for('index'))
-    project = project_cache[project_id]
-    save_project_to_disk(project, project_id)
-    project.mark_clean()
-    project_cache[project_id] = project
+    with project_locks.hold(project_id):
+        project = project_cache[project_id]
+        save_project_to_disk(project, project_id)
+        project.mark_clean()
+        project_cache[project_id] = project
     flash('Project saved.', 'success')
     return redirect(url_for('view_project', project_id=project_id))
 
 @app.route('/project/<project_id>/add_item', methods=['POST'])
+@project_writer
 def add_item(project_id):
     project = Project.load(project_id, project_cache, load_project_from_disk)
     item_id = request.form.get('item')
@@ -118,13 +286,14 @@ def add_item(project_id):
     # Create a new Item instance with the selected item_id and rate
     new_item = Item(item_id=item_id, rate=rate)
     project.add_item(new_item)
-    project.save(project_id, project_cache, save_project_to_disk)
+    project.save(project_id, project_cache, persist_project)
     return redirect(url_for('view_project', project_id=project_id))
 
 @app.route('/project/<project_id>/item/<item_uuid>/edit', methods=['POST'])
+@project_writer
 def edit_item(project_id, item_uuid):
     """Edit an item's rate or recipe selection."""
-    project = load_project_from_disk(project_id)
+    project = Project.load(project_id, project_cache, load_project_from_disk)
     item = project.find_item_by_uuid(item_uuid)
     if not item:
         flash('Item not found', 'error')
@@ -134,41 +303,46 @@ def edit_item(project_id, item_uuid):
         item.rate = float(request.form['rate'])
     # Update recipe
     if 'recipe_id' in request.form:
-        item.recipe_id = request.form['recipe_id']
-    save_project_to_disk(project, project_id)
+        item.select_recipe(request.form['recipe_id'])
+    project.item_changed(item)
+    project.save(project_id, project_cache, persist_project)
     return redirect(url_for('view_project', project_id=project_id))
 
 @app.route('/project/<project_id>/item/<item_uuid>/remove', methods=['POST'])
+@project_writer
 def remove_item(project_id, item_uuid):
     """Remove an item from the project."""
     project = Project.load(project_id, project_cache, load_project_from_disk)
     project.remove_item(item_uuid)
-    project.save(project_id, project_cache, save_project_to_disk)
+    project.save(project_id, project_cache, persist_project)
     return redirect(url_for('view_project', project_id=project_id))
 
 @app.route('/project/<project_id>/item/<item_uuid>/change_rate', methods=['POST'])
+@project_writer
 def change_item_rate(project_id, item_uuid):
     project = Project.load(project_id, project_cache, load_project_from_disk)
     new_rate = float(request.form.get('rate', 0))
     project.change_rate(item_uuid, new_rate)
-    project.save(project_id, project_cache, save_project_to_disk)
+    project.save(project_id, project_cache, persist_project)
     return redirect(url_for('view_project', project_id=project_id))
 
 @app.route('/project/<project_id>/item/<item_uuid>/add_extra_product', methods=['POST'])
+@project_writer
 def add_extra_product(project_id, item_uuid):
-    project = project_cache.get(project_id) or load_project_from_disk(project_id)
+    project = Project.load(project_id, project_cache, load_project_from_disk)
     item = project.find_item_by_uuid(item_uuid)
     extra_item_id = request.form.get('extra_item_id')
     if item and extra_item_id:
         item.add_extra_product(extra_item_id)
         project.mark_dirty()
-        save_project_to_disk(project, project_id)  # Ensure it is saved to disk
+        persist_project(project, project_id)  # Ensure it is saved to disk
         project_cache[project_id] = project
     return redirect(url_for('view_project', project_id=project_id))
 
 @app.route('/project/<project_id>/item/<item_uuid>/update_extra_product', methods=['POST'])
+@project_writer
 def update_extra_product(project_id, item_uuid):
-    project = project_cache.get(project_id) or load_project_from_disk(project_id)
+    project = Project.load(project_id, project_cache, load_project_from_disk)
     item = project.find_item_by_uuid(item_uuid)
     extra_uuid = request.form.get('extra_uuid')
     new_rate = float(request.form.get('rate', 0))
@@ -179,8 +353,9 @@ def update_extra_product(project_id, item_uuid):
     return redirect(url_for('view_project', project_id=project_id))
 
 @app.route('/project/<project_id>/item/<item_uuid>/remove_extra_product', methods=['POST'])
+@project_writer
 def remove_extra_product(project_id, item_uuid):
-    project = project_cache.get(project_id) or load_project_from_disk(project_id)
+    project = Project.load(project_id, project_cache, load_project_from_disk)
     item = project.find_item_by_uuid(item_uuid)
     extra_uuid = request.form.get('extra_uuid')
     if item and extra_uuid:
@@ -190,53 +365,223 @@ def remove_extra_product(project_id, item_uuid):
     return redirect(url_for('view_project', project_id=project_id))
 
 @app.route('/project/<project_id>/item/<item_uuid>/set_extra_rate', methods=['POST'])
+@project_writer
 def set_extra_rate(project_id, item_uuid):
-    project = project_cache.get(project_id) or load_project_from_disk(project_id)
-    item = project.find_item_by_uuid(item_uuid)
+    project = Project.load(project_id, project_cache, load_project_from_disk)
     try:
         value = float(request.form.get('extra_rate', 0.0))
     except Exception:
         value = 0.0
-    if item:
-        item.set_extra_rate(value)
-        # Recalculate rates for this item and its children
-        parent = find_parent(project, item_uuid)
-        parent_base_rate = get_base_rate(parent, item) if parent else item.rate
-        item.update_rate(parent_base_rate)
-        project.mark_dirty()
-        save_project_to_disk(project, project_id)
+    # Recalculates the rates of this item and its children
+    if project.set_extra_rate(item_uuid, value):
+        persist_project(project, project_id)
         project_cache[project_id] = project
     return ('', 204)
 
 @app.route('/project/<project_id>/item/<item_uuid>/set_use_extra_rate', methods=['POST'])
+@project_writer
 def set_use_extra_rate(project_id, item_uuid):
-    project = project_cache.get(project_id) or load_project_from_disk(project_id)
-    item = project.find_item_by_uuid(item_uuid)
+    project = Project.load(project_id, project_cache, load_project_from_disk)
     value = request.form.get('use_extra_rate', 'false').lower() == 'true'
-    if item:
-        item.set_use_extra_rate(value)
-        # Recalculate rates for this item and its children
-        parent = find_parent(project, item_uuid)
-        parent_base_rate = get_base_rate(parent, item) if parent else item.rate
-        item.update_rate(parent_base_rate)
-        project.mark_dirty()
-        save_project_to_disk(project, project_id)
+    # Recalculates the rates of this item and its children
+    if project.set_use_extra_rate(item_uuid, value):
+        persist_project(project, project_id)
         project_cache[project_id] = project
     return ('', 204)
 
+# --- JSON mutation API -------------------------------------------------------
+# Same mutations as the form routes, but the response only describes what changed, so
+# that the page can be patched in place (static/project_api.js) instead of reloaded:
+#   nodes: [{uuid, rate, num_machines, total_power, byproducts, extra_rate, use_extra_rate}]
+#          for the edited item and its sub-tree (the only nodes a mutation can change)
+#   report: production report totals (total_power, machines, items), report_html: its card body
+#   html: {uuid: card HTML} when the card structure changed (recipe, extra product bar)
+
+def card_deltas(card):
+    """Flatten a card tree into the per-node values the page shows."""
+    deltas = []
+    stack = [card]
+    while stack:
+        card = stack.pop()
+        deltas.append({
+            'uuid': card['uuid'],
+            'rate': card['rate'],
+            'num_machines': card['num_machines'],
+            'total_power': card['total_power'],
+            'byproducts': [{'item_id': bp['item_id'], 'rate': bp['rate']} for bp in card['byproducts']],
+            'extra_rate': card['extra_rate'],
+            'use_extra_rate': card['use_extra_rate'],
+        })
+        stack.extend(reversed(card['ingredients']))
+    return deltas
+
+def report_payload(project):
+    """Production report totals and card body, plus the dirty flag, of an API response."""
+    catalog = get_catalog()
+    report = project.get_production_report(
+        item_names=catalog.item_names,
+        resource_ids=set(catalog.resource_ids),
+        resource_names=catalog.resource_names
+    )
+    return {
+        'report': {
+            'total_power': report['total_power'],
+            'machines': report['machines'],
+            'items': report['items'],
+        },
+        'report_html': render_template(
+            'production_report.html',
+            total_power=report['total_power'],
+            machines=report['machines'],
+            item_report=report['items']
+        ),
+        'dirty': project.dirty,
+    }
+
+def mutation_response(project, project_id, item, replace_card=False):
+    catalog = get_catalog()
+    item_names = catalog.item_names
+    resource_ids = set(catalog.resource_ids)
+    resource_names = catalog.resource_names
+    is_root = project.root_of(item.uuid) is item
+    card = item.to_card_dict(item_names, None, resource_names, include_extra_products=is_root)
+    payload = {'nodes': card_deltas(card), **report_payload(project)}
+    if replace_card:
+        payload['html'] = {item.uuid: str(card_fragment(card, project_id, is_root))}
+    return jsonify(payload)
+
+def api_params():
+    """Parameters of an API call: JSON body or form fields."""
+    return request.get_json(silent=True) or request.form
+
+def api_error(message, status):
+    return jsonify({'error': message}), status
+
+def load_api_project(project_id):
+    """Project.load for the JSON routes: None if the project does not exist (-> 404)."""
+    try:
+        return Project.load(project_id, project_cache, load_project_from_disk)
+    except FileNotFoundError:
+        return None
+
+@app.route('/api/project/<project_id>/item/<item_uuid>/change_rate', methods=['POST'])
+@project_writer
+def api_change_rate(project_id, item_uuid):
+    project = load_api_project(project_id)
+    if project is None:
+        return api_error('Project not found', 404)
+    item = project.find_item_by_uuid(item_uuid)
+    if not item:
+        return api_error('Item not found', 404)
+    try:
+        new_rate = parse_rate(api_params().get('rate', 0))
+    except ValueError as e:
+        return api_error(f'Invalid rate: {e}', 400)
+    project.change_rate(item_uuid, new_rate)
+    project.save(project_id, project_cache, persist_project)
+    return mutation_response(project, project_id, item)
+
+@app.route('/api/project/<project_id>/item/<item_uuid>/set_extra_rate', methods=['POST'])
+@project_writer
+def api_set_extra_rate(project_id, item_uuid):
+    project = load_api_project(project_id)
+    if project is None:
+        return api_error('Project not found', 404)
+    try:
+        value = parse_rate(api_params().get('extra_rate', 0.0))
+    except ValueError as e:
+        return api_error(f'Invalid extra rate: {e}', 400)
+    item = project.set_extra_rate(item_uuid, value)
+    if not item:
+        return api_error('Item not found', 404)
+    project.save(project_id, project_cache, persist_project)
+    return mutation_response(project, project_id, item)
+
+@app.route('/api/project/<project_id>/item/<item_uuid>/set_use_extra_rate', methods=['POST'])
+@project_writer
+def api_set_use_extra_rate(project_id, item_uuid):
+    project = load_api_project(project_id)
+    if project is None:
+        return api_error('Project not found', 404)
+    value = str(api_params().get('use_extra_rate', 'false')).lower() == 'true'
+    item = project.set_use_extra_rate(item_uuid, value)
+    if not item:
+        return api_error('Item not found', 404)
+    project.save(project_id, project_cache, persist_project)
+    # The extra product bar is shown or hidden: send the card again
+    return mutation_response(project, project_id, item, replace_card=True)
+
+@app.route('/api/project/<project_id>/item/<item_uuid>/select_recipe', methods=['POST'])
+@project_writer
+def api_select_recipe(project_id, item_uuid):
+    project = load_api_project(project_id)
+    if project is None:
+        return api_error('Project not found', 404)
+    recipe_id = api_params().get('recipe_id')
+    if not recipe_id:
+        return api_error('Missing recipe_id', 400)
+    item = project.select_recipe(item_uuid, recipe_id)
+    if not item:
+        return api_error('Item not found', 404)
+    project.save(project_id, project_cache, persist_project)
+    # New ingredients: send the card again
+    return mutation_response(project, project_id, item, replace_card=True)
+
+# Batched edits: {"operations": [{"op": "change_rate", "item_uuid": ..., "rate": ...}, ...]}
+# (operations in models/batch.py), applied in order to a working copy of the project and
+# saved once; if an operation fails, nothing is applied and {error, index} is returned.
+# Returns {applied, results, report, report_html, dirty}: the page reloads to show the cards.
+@app.route('/api/project/<project_id>/batch', methods=['POST'])
+@project_writer
+def api_batch(project_id):
+    operations = (request.get_json(silent=True) or {}).get('operations')
+    if not isinstance(operations, list) or not operations:
+        return api_error('Expected a non-empty list of operations', 400)
+    project = load_api_project(project_id)
+    if project is None:
+        return api_error('Project not found', 404)
+    start = time.perf_counter()
+    try:
+        working, results = apply_batch(project, operations)
+    except BatchError as e:
+        print(f"Batch on project {project_id} rejected: {e}")
+        return jsonify({'error': e.message, 'index': e.index}), e.status
+    payload = report_payload(working)
+    applied = time.perf_counter()
+    working.save(project_id, project_cache, persist_project)
+    saved = time.perf_counter()
+    print(f"Batch on project {project_id}: {len(operations)} operation(s) applied in "
+          f"{(applied - start) * 1000:.1f} ms, saved in {(saved - applied) * 1000:.1f} ms")
+    payload['dirty'] = working.dirty
+    return jsonify({'applied': len(operations), 'results': results, **payload})
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    """Size and hit counts of the project, card fragment and project summary caches."""
+    return jsonify({'projects': project_cache.stats(), 'fragments': fragment_cache.stats(),
+                    'reports': aggregate_reports.stats()})
+
+@app.route('/api/report', methods=['GET'])
+def aggregate_report():
+    """
+    Combined production report of the saved projects in ?projects=<id>,<id>,... (default:
+    all of them): total power, machines, resources and the item balance across projects.
+    """
+    if flusher:
+        flusher.flush()  # Include the edits not saved yet
+    project_ids = [project_id for project_id in request.args.get('projects', '').split(',') if project_id]
+    return jsonify(aggregate_reports.report(project_ids or None))
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Request latencies, counters and cache statistics, in the Prometheus text format."""
+    return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/', methods=['GET'])
 def index():
     """Show the main UI with no project selected. All project management is via the sidebar and modals."""
     # List all projects for modal
-    projects = []
-    for fname in os.listdir(PROJECTS_DIR):
-        if fname.startswith('project_') and fname.endswith('.json'):
-            pid = fname[len('project_'):-len('.json')]
-            try:
-                p = load_project_from_disk(pid)
-                projects.append({'id': pid, 'name': p.name})
-            except Exception:
-                projects.append({'id': pid, 'name': f"(corrupt or missing) {pid}"})
+    projects = project_index.list_projects()
     items = Item.all_items()
     return render_template(
         'index.html',
@@ -254,15 +599,7 @@ def index():
 
 @app.route('/list_projects', methods=['GET'])
 def list_projects():
-    projects = []
-    for fname in os.listdir(PROJECTS_DIR):
-        if fname.startswith('project_') and fname.endswith('.json'):
-            project_id = fname[len('project_'):-len('.json')]
-            try:
-                project = load_project_from_disk(project_id)
-                projects.append({'id': project_id, 'name': project.name})
-            except Exception:
-                projects.append({'id': project_id, 'name': f"(corrupt or missing) {project_id}"})
+    projects = project_index.list_projects()
     return jsonify(projects)
 
 @app.route('/modal/rename_project')
@@ -274,15 +611,7 @@ def modal_rename_project():
 @app.route('/modal/open_project')
 def modal_open_project():
     # List all projects for modal
-    projects = []
-    for fname in os.listdir(PROJECTS_DIR):
-        if fname.startswith('project_') and fname.endswith('.json'):
-            project_id = fname[len('project_'):-len('.json')]
-            try:
-                project = load_project_from_disk(project_id)
-                projects.append({'id': project_id, 'name': project.name})
-            except Exception:
-                projects.append({'id': project_id, 'name': f"(corrupt or missing) {project_id}"})
+    projects = project_index.list_projects()
     return render_template('modal_open_project.html', projects=projects)
 
 @app.route('/project/<project_id>/add_item_modal', methods=['GET'])
@@ -291,6 +620,7 @@ def add_item_modal(project_id):
     return render_template('modal_add_item.html', items=items, project_id=project_id)
 
 @app.route('/project/<project_id>/item/<item_uuid>/select_recipe', methods=['GET', 'POST'])
+@project_writer
 def select_recipe(project_id, item_uuid):
     """
     Show a page to select a recipe for the given item in the project.
@@ -302,9 +632,8 @@ def select_recipe(project_id, item_uuid):
         flash('Item not found', 'error')
         return redirect(url_for('view_project', project_id=project_id))
 
-    # Load recipes data
-    with open(os.path.join(os.path.dirname(__file__), 'raw_data', 'enhanced_recipes.json'), 'r', encoding='utf-8') as f:
-        recipes = json.load(f)
+    # Recipes data (shared, read-only)
+    recipes = get_catalog().recipes
     # Find all recipes that produce this item
     candidate_recipes = item.get_recipes()
 
@@ -321,41 +650,8 @@ def select_recipe(project_id, item_uuid):
 
     if request.method == 'POST':
         selected_recipe_id = request.form.get('recipe_id')
-        if selected_recipe_id == '__outsourced__':
-            item.recipe_id = None
-            item.outsourced = True
-            item.ingredients = []
-        else:
-            item.recipe_id = selected_recipe_id
-            item.outsourced = False
-            # Populate ingredients from recipe
-            recipe = recipes.get(selected_recipe_id)
-            item.ingredients = []
-            if recipe:
-                for ing in recipe.get('ingredients', []):
-                    # Calculate the required rate for the ingredient
-                    # Parent rate * (ingredient rate / product rate)
-                    # Find the main product for this recipe
-                    main_product = None
-                    for prod in recipe.get('products', []):
-                        if prod['item'] == item.item_id:
-                            main_product = prod
-                            break
-                    if main_product and main_product.get('rate'):
-                        factor = item.rate / main_product['rate']
-                    else:
-                        factor = 1
-                    ing_rate = ing.get('rate', ing.get('amount', 1)) * factor
-                    # Create new Item for ingredient, default to outsourced
-                    new_ing = Item(
-                        item_id=ing['item'],
-                        rate=ing_rate,
-                        recipe_id=None,
-                        outsourced=True,
-                        ingredients=[]
-                    )
-                    item.ingredients.append(new_ing)
-        project.save(project_id, project_cache, save_project_to_disk)
+        project.select_recipe(item_uuid, selected_recipe_id)
+        project.save(project_id, project_cache, persist_project)
         return redirect(url_for('view_project', project_id=project_id))
 
     return render_template(
@@ -372,15 +668,19 @@ def select_recipe(project_id, item_uuid):
     )
 
 @app.route('/project/<project_id>/delete', methods=['POST'])
+@project_writer
 def delete_project(project_id):
     """Delete the project file and remove from cache, then redirect to home."""
     # Remove from cache if present
     project_cache.pop(project_id, None)
-    # Delete the file
-    project_path = get_project_path(project_id)
+    fragment_cache.discard(project_id)
+    aggregate_reports.discard(project_id)
+    if flusher:
+        flusher.discard(project_id)
+    # Delete the file (or database rows)
     try:
-        if os.path.exists(project_path):
-            os.remove(project_path)
+        if storage.delete(project_id):
+            project_index.remove(project_id)
             flash('Project deleted.', 'success')
         else:
             flash('Project file not found.', 'error')
@@ -388,47 +688,6 @@ def delete_project(project_id):
         flash(f'Error deleting project: {e}', 'error')
     return redirect(url_for('index'))
 
-# Helper to find parent of an item by uuid
-
-def find_parent(project, child_uuid):
-    def walk(item):
-        for ing in getattr(item, 'ingredients', []):
-            if getattr(ing, 'uuid', None) == child_uuid:
-                return item
-            found = walk(ing)
-            if found:
-                return found
-        return None
-    for item in project.items:
-        result = walk(item)
-        if result:
-            return result
-    return None
-
-# Helper to get the base rate for a child from its parent (excluding extra_rate)
-def get_base_rate(parent, child):
-    if not parent or not hasattr(parent, 'ingredients'):
-        return child.rate
-    # Find the recipe and the ingredient ratio
-    import json, os
-    recipes_path = os.path.join(os.path.dirname(__file__), 'raw_data/enhanced_recipes.json')
-    with open(recipes_path, 'r', encoding='utf-8') as f:
-        recipes = json.load(f)
-    recipe = recipes.get(parent.recipe_id)
-    if not recipe or 'ingredients' not in recipe or 'products' not in recipe:
-        return child.rate
-    prod_rate = None
-    for prod in recipe['products']:
-        if prod['item'] == parent.item_id:
-            prod_rate = prod.get('rate')
-            break
-    if not prod_rate:
-        return child.rate
-    for ing in recipe['ingredients']:
-        if ing['item'] == child.item_id:
-            return parent.rate * (ing['rate'] / prod_rate)
-    return child.rate
-
 if __name__ == "__main__":
     app.run(debug=True)
 
@@ -0,0 +1,66 @@
+"""
+Copy projects between the JSON files (projects/project_<id>.json) and the SQLite
+database used when PROJECT_STORAGE=sqlite, or convert the project files between the
+JSON and binary formats (see PROJECT_FILE_FORMAT in models/storage.py).
+
+    python migrate_projects.py import   # JSON files -> SQLite
+    python migrate_projects.py export   # SQLite -> JSON files (same format as the app writes)
+    python migrate_projects.py export --format binary   # SQLite -> binary project files
+    python migrate_projects.py convert --format binary  # Rewrite the project files as binary
+    python migrate_projects.py convert --format json    # ... or back to JSON
+"""
+import argparse
+from models.storage import JsonStorage, SqliteStorage, PROJECTS_DIR, DEFAULT_DB_PATH
+
+
+def copy_projects(source, target, overwrite=False):
+    """Copy every project of source into target. Returns (copied, skipped, failed) counts."""
+    copied = skipped = failed = 0
+    for project_id in list(source.project_ids()):
+        if not overwrite and target.exists(project_id):
+            print(f"Skipping {project_id} (already exists, use --overwrite)")
+            skipped += 1
+            continue
+        try:
+            project = source.load(project_id)
+        except Exception as e:
+            print(f"Error reading {project_id}: {e}")
+            failed += 1
+            continue
+        stored = target.stored_version(project_id)
+        if stored is not None:
+            project.version = stored  # Replace the target's copy (saved as its next version)
+        target.save(project, project_id)
+        print(f"Copied {project_id} ({project.name})")
+        copied += 1
+    return copied, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import/export projects between project files and SQLite")
+    parser.add_argument('direction', choices=['import', 'export', 'convert'],
+                        help="import: project files -> SQLite, export: SQLite -> project files, "
+                             "convert: rewrite the project files in --format")
+    parser.add_argument('--format', choices=JsonStorage.FILE_FORMATS, default='json',
+                        help="Format of the project files written by export / convert")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="SQLite database path")
+    parser.add_argument('--projects-dir', default=PROJECTS_DIR, help="Directory of the JSON project files")
+    parser.add_argument('--overwrite', action='store_true', help="Replace projects that already exist in the target")
+    args = parser.parse_args()
+
+    json_storage = JsonStorage(args.projects_dir, file_format=args.format)
+    if args.direction == 'convert':
+        # Project files are read whatever their format: rewrite them all in place
+        copied, skipped, failed = copy_projects(JsonStorage(args.projects_dir), json_storage, overwrite=True)
+        print(f"\n{copied} project(s) converted to {args.format}, {failed} failed.")
+        return
+    sqlite_storage = SqliteStorage(args.db)
+    if args.direction == 'import':
+        copied, skipped, failed = copy_projects(json_storage, sqlite_storage, args.overwrite)
+    else:
+        copied, skipped, failed = copy_projects(sqlite_storage, json_storage, args.overwrite)
+    print(f"\n{copied} project(s) copied, {skipped} skipped, {failed} failed.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from models.catalog import get_catalog
+from models.report import ProductionReport
+
+# Net rates closer to zero than this are reported as balanced (float rounding)
+BALANCE_EPSILON = 1e-9
+
+
+def summarize_project(storage, project_id):
+    """
+    Load a saved project and return the part of its production report that can be
+    combined with other projects (run in the worker processes):
+        name, version, total_power, machines {name: [count, power]},
+        resources {item_id: rate}     resources drawn by the project
+        imports {item_id: rate}       outsourced items (supplied from outside the project)
+        byproducts {item_id: rate}    byproducts of its recipes
+        outputs {item_id: rate}       top-level items (what the project produces)
+    """
+    project = storage.load(project_id)
+    catalog = get_catalog()
+    report = ProductionReport(catalog.resource_ids, catalog)
+    report.update(added=[node for item in project.items for node in item.walk()], catalog=catalog)
+    rates = {'resource': {}, 'outsourced': {}, 'byproduct': {}}
+    for (item_id, kind), (rate, _count) in report.items.items():
+        if kind in rates:
+            rates[kind][item_id] = rates[kind].get(item_id, 0.0) + rate
+    outputs = {}
+    for item in project.items:
+        outputs[item.item_id] = outputs.get(item.item_id, 0.0) + item.rate
+    return {
+        'name': project.name,
+        'version': project.version,
+        'total_power': report.total_power,
+        'machines': {name: [count, power] for name, (count, power, _nodes) in report.machines.items()},
+        'resources': rates['resource'],
+        'imports': rates['outsourced'],
+        'byproducts': rates['byproduct'],
+        'outputs': outputs,
+    }
+
+
+def combine_summaries(summaries, item_names, resource_names):
+    """
+    Combine project summaries (project_id -> summarize_project result) into one report:
+        total_power, machines {name: {count, power}}, resources {item_id: {name, rate}}
+        balance {item_id: {name, outputs, byproducts, imports, net}}: what the projects
+            produce (top-level items and byproducts) against what they import, netted
+            across projects; net > 0 is a surplus, net < 0 a deficit to supply from outside
+    """
+    total_power = 0.0
+    machines = {}
+    resources = {}
+    balance = {}
+
+    def name_of(item_id):
+        return resource_names.get(item_id) or item_names.get(item_id, item_id)
+
+    def add_balance(item_id, field, rate):
+        entry = balance.get(item_id)
+        if entry is None:
+            entry = balance[item_id] = {'name': name_of(item_id), 'outputs': 0.0, 'byproducts': 0.0, 'imports': 0.0}
+        entry[field] += rate
+
+    for summary in summaries.values():
+        total_power += summary['total_power']
+        for name, (count, power) in summary['machines'].items():
+            entry = machines.setdefault(name, {'count': 0, 'power': 0.0})
+            entry['count'] += count
+            entry['power'] += power
+        for item_id, rate in summary['resources'].items():
+            entry = resources.setdefault(item_id, {'name': name_of(item_id), 'rate': 0.0})
+            entry['rate'] += rate
+        for field in ('outputs', 'byproducts', 'imports'):
+            for item_id, rate in summary[field].items():
+                add_balance(item_id, field, rate)
+    for entry in balance.values():
+        net = entry['outputs'] + entry['byproducts'] - entry['imports']
+        entry['net'] = 0.0 if abs(net) < BALANCE_EPSILON else net
+    return {
+        'total_power': round(total_power, 2),
+        'machines': {name: {'count': int(m['count']), 'power': round(m['power'], 2)} for name, m in machines.items()},
+        'resources': resources,
+        'balance': balance,
+    }
+
+
+class AggregateReports:
+    """
+    Production report over several saved projects (e.g. one per sub-factory).
+
+    The summary of each project (see summarize_project) is computed in a pool of worker
+    processes and cached with the project's storage stamp (mtime/size of the file, or
+    update time/node count of the database row, which change with every save, and so
+    with every version) and the catalog generation: after one project is saved, only
+    that project is loaded and summarized again. Checking the stamps does not read the
+    projects. Only saved projects are reported (flush the write-behind saves first).
+
+    workers: size of the process pool (default: CPU count); with 1 (or when only one
+    project needs a summary), summaries are computed in the calling process.
+    """
+
+    def __init__(self, storage, workers=None):
+        self.storage = storage  # Pickled into the tasks (see JsonStorage.__reduce__)
+        self.workers = workers or os.cpu_count() or 1
+        self._cache = {}  # project_id -> (stamp, generation, summary)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.hits = 0
+        self.misses = 0
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _summarize(self, project_ids):
+        """Return ({project_id: summary}, {project_id: error}) for project_ids."""
+        summaries, errors = {}, {}
+        if len(project_ids) > 1 and self.workers > 1:
+            try:
+                futures = {project_id: self._pool().submit(summarize_project, self.storage, project_id)
+                           for project_id in project_ids}
+                for project_id, future in futures.items():
+                    try:
+                        summaries[project_id] = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        errors[project_id] = str(e) or type(e).__name__
+                return summaries, errors
+            except BrokenProcessPool:
+                print("Warning: report worker pool failed, computing the project summaries in-process")
+                self._executor = None
+                summaries, errors = {}, {}
+        for project_id in project_ids:
+            try:
+                summaries[project_id] = summarize_project(self.storage, project_id)
+            except Exception as e:
+                errors[project_id] = str(e) or type(e).__name__
+        return summaries, errors
+
+    def report(self, project_ids=None):
+        """
+        Combined report of project_ids (default: all saved projects), see
+        combine_summaries, plus:
+            projects [{id, name, version, total_power}]
+            errors {project_id: message} for missing or unreadable projects
+        """
+        catalog = get_catalog()
+        if project_ids is None:
+            project_ids = list(self.storage.project_ids())
+        with self._lock:
+            summaries, errors, stale, stamps = {}, {}, [], {}
+            for project_id in dict.fromkeys(project_ids):
+                stamp = self.storage.stat(project_id)
+                if stamp is None:
+                    errors[project_id] = 'Project not found'
+                    continue
+                stamps[project_id] = tuple(stamp)
+                cached = self._cache.get(project_id)
+                if cached is not None and cached[0] == stamps[project_id] and cached[1] == catalog.generation:
+                    summaries[project_id] = cached[2]
+                    self.hits += 1
+                else:
+                    stale.append(project_id)
+            self.misses += len(stale)
+            computed, failed = self._summarize(stale)
+            for project_id, summary in computed.items():
+                self._cache[project_id] = (stamps[project_id], catalog.generation, summary)
+            summaries.update(computed)
+            errors.update(failed)
+        summaries = {project_id: summaries[project_id] for project_id in stamps if project_id in summaries}
+        report = combine_summaries(summaries, catalog.item_names, catalog.resource_names)
+        report['projects'] = [
+            {'id': project_id, 'name': summary['name'], 'version': summary['version'],
+             'total_power': round(summary['total_power'], 2)}
+            for project_id, summary in summaries.items()
+        ]
+        report['errors'] = errors
+        return report
+
+    def discard(self, project_id):
+        """Forget the summary of a deleted project."""
+        with self._lock:
+            self._cache.pop(project_id, None)
+
+    def stats(self):
+        return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses, 'workers': self.workers}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,233 @@
+from array import array
+from models.item import Item, intern_id
+
+# Flag bits (ArenaProject.flags)
+OUTSOURCED = 1
+USE_EXTRA_RATE = 2
+
+
+class ArenaProject:
+    """
+    Compact, read-mostly form of a Project: every node is an integer index into
+    parallel arrays instead of an Item object.
+        - item_ids / recipe_ids: index in a shared string table (-1 for None)
+        - rates / extra_rates: float arrays
+        - flags: outsourced / use_extra_rate bits
+        - parents, first_child, next_sibling: tree links (-1 for none)
+        - uuids: 16 bytes per node (uuids that are not 32-char lowercase hex are kept aside)
+    Nodes are stored in pre-order. Use from_project() / to_project() to convert;
+    ItemView gives an Item-like view of a node for templates and read-only code.
+    Rates and extra rates can be edited in place; structural changes need a Project.
+    """
+
+    def __init__(self, name="Untitled Project"):
+        self.name = name
+        self.strings = []
+        self._string_index = {}
+        self.item_ids = array('i')
+        self.recipe_ids = array('i')
+        self.rates = array('d')
+        self.extra_rates = array('d')
+        self.flags = bytearray()
+        self.parents = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.uuids = bytearray()
+        self._other_uuids = {}  # node index -> uuid string that is not 32-char lowercase hex
+        self.roots = array('i')
+        self._card_cache = {}  # node index -> cached card (see Item.to_card_dict)
+
+    def __len__(self):
+        return len(self.rates)
+
+    def _string(self, value):
+        if value is None:
+            return -1
+        idx = self._string_index.get(value)
+        if idx is None:
+            idx = self._string_index[value] = len(self.strings)
+            self.strings.append(intern_id(value))
+        return idx
+
+    def _add_node(self, item, parent):
+        idx = len(self.rates)
+        self.item_ids.append(self._string(item.item_id))
+        self.recipe_ids.append(self._string(item.recipe_id))
+        self.rates.append(item.rate)
+        self.extra_rates.append(item.extra_rate or 0.0)
+        self.flags.append((OUTSOURCED if item.outsourced else 0) | (USE_EXTRA_RATE if item.use_extra_rate else 0))
+        self.parents.append(parent)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        try:
+            raw = bytes.fromhex(item.uuid)
+        except (TypeError, ValueError):
+            raw = b''
+        if len(raw) != 16 or raw.hex() != item.uuid:
+            self._other_uuids[idx] = item.uuid
+            raw = bytes(16)
+        self.uuids += raw
+        return idx
+
+    @classmethod
+    def from_project(cls, project):
+        arena = cls(project.name)
+        for root in project.items:
+            # Iterative pre-order walk, linking each node to its previous sibling
+            stack = [(root, -1)]
+            previous = {}  # parent index -> last child index added
+            while stack:
+                item, parent = stack.pop()
+                idx = arena._add_node(item, parent)
+                if parent < 0:
+                    arena.roots.append(idx)
+                elif parent in previous:
+                    arena.next_sibling[previous[parent]] = idx
+                else:
+                    arena.first_child[parent] = idx
+                previous[parent] = idx
+                for ing in reversed(item.ingredients):
+                    stack.append((ing, idx))
+        return arena
+
+    def children(self, idx):
+        child = self.first_child[idx]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def uuid_of(self, idx):
+        other = self._other_uuids.get(idx)
+        if other is not None:
+            return other
+        return self.uuids[idx * 16:(idx + 1) * 16].hex()
+
+    def to_item(self, idx):
+        """Rebuild the Item tree of a node."""
+        strings = self.strings
+        root = None
+        stack = [(idx, None)]
+        while stack:
+            node, parent_item = stack.pop()
+            recipe = self.recipe_ids[node]
+            item = Item(
+                strings[self.item_ids[node]],
+                self.rates[node],
+                strings[recipe] if recipe >= 0 else None,
+                bool(self.flags[node] & OUTSOURCED),
+                None,
+                self.uuid_of(node),
+                self.extra_rates[node],
+                bool(self.flags[node] & USE_EXTRA_RATE)
+            )
+            if parent_item is None:
+                root = item
+            else:
+                parent_item.ingredients.append(item)
+            stack.extend((child, item) for child in reversed(list(self.children(node))))
+        return root
+
+    def to_project(self):
+        from models.project import Project
+        return Project(name=self.name, items=[self.to_item(root) for root in self.roots])
+
+    @property
+    def items(self):
+        """Top-level items, as ItemViews."""
+        return [ItemView(self, root) for root in self.roots]
+
+    def find_item_by_uuid(self, uuid_str):
+        for idx in range(len(self.rates)):
+            if self.uuid_of(idx) == uuid_str:
+                return ItemView(self, idx)
+        return None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "items": [view.to_dict() for view in self.items],
+            "dirty": False
+        }
+
+
+class ItemView:
+    """Item-like view of one node of an ArenaProject (see Item for the attributes)."""
+    __slots__ = ('arena', 'index')
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, ItemView) and other.arena is self.arena and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.arena), self.index))
+
+    @property
+    def item_id(self):
+        return self.arena.strings[self.arena.item_ids[self.index]]
+
+    @property
+    def recipe_id(self):
+        recipe = self.arena.recipe_ids[self.index]
+        return self.arena.strings[recipe] if recipe >= 0 else None
+
+    @property
+    def rate(self):
+        return self.arena.rates[self.index]
+
+    @rate.setter
+    def rate(self, value):
+        self.arena.rates[self.index] = value
+
+    @property
+    def extra_rate(self):
+        return self.arena.extra_rates[self.index]
+
+    @extra_rate.setter
+    def extra_rate(self, value):
+        self.arena.extra_rates[self.index] = value
+
+    @property
+    def outsourced(self):
+        return bool(self.arena.flags[self.index] & OUTSOURCED)
+
+    @property
+    def use_extra_rate(self):
+        return bool(self.arena.flags[self.index] & USE_EXTRA_RATE)
+
+    @use_extra_rate.setter
+    def use_extra_rate(self, value):
+        if value:
+            self.arena.flags[self.index] |= USE_EXTRA_RATE
+        else:
+            self.arena.flags[self.index] &= ~USE_EXTRA_RATE
+
+    @property
+    def uuid(self):
+        return self.arena.uuid_of(self.index)
+
+    @property
+    def ingredients(self):
+        return [ItemView(self.arena, child) for child in self.arena.children(self.index)]
+
+    @property
+    def _card(self):
+        return self.arena._card_cache.get(self.index)
+
+    @_card.setter
+    def _card(self, value):
+        self.arena._card_cache[self.index] = value
+
+    # Read-only Item behaviour, shared with Item
+    to_dict = Item.to_dict
+    walk = Item.walk
+    find_by_uuid = Item.find_by_uuid
+    get_recipes = Item.get_recipes
+    get_machine_name = staticmethod(Item.get_machine_name)
+    to_card_dict = Item.to_card_dict
+    _build_card = Item._build_card
+    set_extra_rate = Item.set_extra_rate
+    set_use_extra_rate = Item.set_use_extra_rate
+
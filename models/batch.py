@@ -0,0 +1,138 @@
+"""
+Ordered batches of project edits, applied all-or-nothing (see apply_batch).
+
+Each operation is a dict with an 'op' key:
+    {'op': 'change_rate', 'item_uuid': ..., 'rate': 12.5}
+    {'op': 'select_recipe', 'item_uuid': ..., 'recipe_id': ...}   ('__outsourced__' to outsource)
+    {'op': 'set_extra_rate', 'item_uuid': ..., 'extra_rate': 2}
+    {'op': 'set_use_extra_rate', 'item_uuid': ..., 'use_extra_rate': true}
+    {'op': 'remove_item', 'item_uuid': ...}                         (top-level items)
+    {'op': 'add_item', 'item_id': ..., 'rate': 10, 'uuid': ...}     (uuid optional, so that
+                                                                     later operations can use it)
+"""
+import math
+from models.catalog import get_catalog
+from models.item import Item
+
+
+class BatchError(Exception):
+    """An operation of a batch is invalid: the whole batch is rejected."""
+
+    def __init__(self, index, message, status=400):
+        super().__init__(f"Operation {index}: {message}")
+        self.index = index
+        self.message = message
+        self.status = status  # HTTP status for the API (404 for unknown items)
+
+
+def parse_rate(value):
+    """
+    A rate or extra rate sent by a client (number or numeric string): a finite,
+    non-negative float. Raises ValueError (with the reason) otherwise. Shared with the
+    single-edit API routes, so that both APIs accept the same values.
+    """
+    if isinstance(value, bool):
+        raise ValueError("must be a number")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("must be a number")
+    if not math.isfinite(value):
+        raise ValueError("must be a finite number")
+    if value < 0:
+        raise ValueError("must not be negative")
+    return value
+
+
+def _number(operation, key, index, default=None):
+    try:
+        return parse_rate(operation.get(key, default))
+    except ValueError as e:
+        raise BatchError(index, f"'{key}' {e}")
+
+
+def _item(project, operation, index):
+    item_uuid = operation.get('item_uuid')
+    item = project.find_item_by_uuid(item_uuid) if item_uuid else None
+    if item is None:
+        raise BatchError(index, f"item '{item_uuid}' not found", 404)
+    return item
+
+
+def _change_rate(project, operation, index):
+    item = _item(project, operation, index)
+    project.change_rate(item.uuid, _number(operation, 'rate', index))
+
+
+def _select_recipe(project, operation, index):
+    item = _item(project, operation, index)
+    recipe_id = operation.get('recipe_id')
+    if recipe_id != '__outsourced__' and recipe_id not in get_catalog().producers(item.item_id):
+        raise BatchError(index, f"recipe '{recipe_id}' does not produce {item.item_id}")
+    project.select_recipe(item.uuid, recipe_id)
+
+
+def _set_extra_rate(project, operation, index):
+    item = _item(project, operation, index)
+    project.set_extra_rate(item.uuid, _number(operation, 'extra_rate', index, 0.0))
+
+
+def _set_use_extra_rate(project, operation, index):
+    item = _item(project, operation, index)
+    value = str(operation.get('use_extra_rate', 'false')).lower() == 'true'
+    project.set_use_extra_rate(item.uuid, value)
+
+
+def _remove_item(project, operation, index):
+    item = _item(project, operation, index)
+    if project.find_parent(item.uuid) is not None:
+        raise BatchError(index, f"item '{item.uuid}' is not a top-level item")
+    project.remove_item(item.uuid)
+
+
+def _add_item(project, operation, index):
+    catalog = get_catalog()
+    item_id = operation.get('item_id')
+    if item_id not in catalog.item_names and item_id not in catalog.resource_names:
+        raise BatchError(index, f"unknown item '{item_id}'")
+    item_uuid = operation.get('uuid')
+    if item_uuid is not None and (not isinstance(item_uuid, str) or project.find_item_by_uuid(item_uuid)):
+        raise BatchError(index, f"uuid '{item_uuid}' is invalid or already used")
+    item = Item(item_id=item_id, rate=_number(operation, 'rate', index), uuid_str=item_uuid)
+    project.add_item(item)
+    return {'uuid': item.uuid}
+
+
+OPERATIONS = {
+    'change_rate': _change_rate,
+    'select_recipe': _select_recipe,
+    'set_extra_rate': _set_extra_rate,
+    'set_use_extra_rate': _set_use_extra_rate,
+    'remove_item': _remove_item,
+    'add_item': _add_item,
+}
+
+
+def apply_operations(project, operations):
+    """
+    Apply the operations in order to project (modified in place, even if one fails).
+    Returns one result per operation (the uuid of added items, None otherwise).
+    """
+    results = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            op = operation.get('op') if isinstance(operation, dict) else operation
+            raise BatchError(index, f"unknown operation {op!r}")
+        results.append(OPERATIONS[operation['op']](project, operation, index))
+    return results
+
+
+def apply_batch(project, operations):
+    """
+    Apply the operations to a working copy of project. Returns (working copy, results);
+    on the first invalid operation, raises BatchError and project is left untouched.
+    The caller commits by replacing the project with the working copy.
+    """
+    working = project.copy()
+    results = apply_operations(working, operations)
+    return working, results
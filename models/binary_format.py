@@ -0,0 +1,172 @@
+"""
+Compact binary encoding of projects (an alternative to the indented JSON files).
+
+Layout (little-endian):
+    header:  magic b'SPPB', version (u16), flags (u16), payload size (u32), CRC-32 of the payload (u32)
+    payload: string table: count (u32), then for each string its UTF-8 size (u32) and bytes
+             name (string index, u32), root count (u32), node count (u32), project version (u32)
+             node table: one NODE record per node, in depth-first pre-order
+A node's children are the `child_count` records that follow its sub-tree, so the
+loader rebuilds the trees with an explicit stack (no recursion).
+Version 1 files (without the project version) are still read.
+"""
+import struct
+import zlib
+from models.item import Item
+from models.project import Project
+
+MAGIC = b'SPPB'
+VERSION = 2
+HEADER = struct.Struct('<4sHHII')
+COUNTS = struct.Struct('<IIII')
+COUNTS_V1 = struct.Struct('<III')
+STRING_SIZE = struct.Struct('<I')
+# item_id, recipe_id (string indices, -1 for None), child_count, rate, extra_rate, uuid, flags
+NODE = struct.Struct('<iiIdd16sB')
+
+# Header flags
+PROJECT_DIRTY = 1
+# Node flags
+OUTSOURCED = 1
+USE_EXTRA_RATE = 2
+RATE_IS_INT = 4  # Restore ints as ints, so that a JSON -> binary -> JSON round trip is exact
+EXTRA_RATE_IS_INT = 8
+UUID_IS_STRING = 16  # uuid is not 32-char lowercase hex: stored in the string table (index in the first 4 bytes)
+
+
+class BinaryFormatError(ValueError):
+    pass
+
+
+def is_binary(data):
+    """True if data (bytes, or at least its first 4 bytes) is a binary project."""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def _number(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise BinaryFormatError(f"{name} must be a number, got {value!r}")
+    return isinstance(value, int)
+
+
+def dumps(project):
+    """Encode a Project to bytes."""
+    strings = []
+    string_index = {}
+
+    def string(value):
+        if value is None:
+            return -1
+        idx = string_index.get(value)
+        if idx is None:
+            idx = string_index[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    name_idx = string(project.name)
+    nodes = bytearray()
+    node_count = 0
+    stack = list(reversed(project.items))
+    while stack:
+        item = stack.pop()
+        flags = (OUTSOURCED if item.outsourced else 0) | (USE_EXTRA_RATE if item.use_extra_rate else 0)
+        rate = item.rate
+        extra_rate = item.extra_rate or 0.0
+        if _number(rate, 'rate'):
+            flags |= RATE_IS_INT
+        if _number(extra_rate, 'extra_rate'):
+            flags |= EXTRA_RATE_IS_INT
+        try:
+            raw_uuid = bytes.fromhex(item.uuid)
+        except (TypeError, ValueError):
+            raw_uuid = b''
+        if len(raw_uuid) != 16 or raw_uuid.hex() != item.uuid:
+            flags |= UUID_IS_STRING
+            raw_uuid = struct.pack('<i', string(item.uuid)).ljust(16, b'\0')
+        nodes += NODE.pack(string(item.item_id), string(item.recipe_id), len(item.ingredients),
+                           rate, extra_rate, raw_uuid, flags)
+        node_count += 1
+        stack.extend(reversed(item.ingredients))
+
+    payload = bytearray(STRING_SIZE.pack(len(strings)))
+    for value in strings:
+        encoded = value.encode('utf-8')
+        payload += STRING_SIZE.pack(len(encoded))
+        payload += encoded
+    payload += COUNTS.pack(name_idx, len(project.items), node_count, project.version)
+    payload += nodes
+    header = HEADER.pack(MAGIC, VERSION, PROJECT_DIRTY if project.dirty else 0,
+                         len(payload), zlib.crc32(payload))
+    return header + bytes(payload)
+
+
+def loads(data):
+    """Decode bytes written by dumps() into a Project (checks the version and checksum)."""
+    if len(data) < HEADER.size:
+        raise BinaryFormatError("Truncated binary project (no header)")
+    magic, version, header_flags, size, checksum = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise BinaryFormatError("Not a binary project (bad magic bytes)")
+    if version not in (1, VERSION):
+        raise BinaryFormatError(f"Unsupported binary project version {version} (expected {VERSION})")
+    payload = memoryview(data)[HEADER.size:]
+    if len(payload) != size:
+        raise BinaryFormatError(f"Truncated binary project ({len(payload)} of {size} bytes)")
+    if zlib.crc32(payload) != checksum:
+        raise BinaryFormatError("Corrupt binary project (checksum mismatch)")
+
+    try:
+        (string_count,) = STRING_SIZE.unpack_from(payload, 0)
+        offset = STRING_SIZE.size
+        strings = []
+        for _ in range(string_count):
+            (length,) = STRING_SIZE.unpack_from(payload, offset)
+            offset += STRING_SIZE.size
+            strings.append(str(payload[offset:offset + length], 'utf-8'))
+            offset += length
+        if version == 1:
+            name_idx, root_count, node_count = COUNTS_V1.unpack_from(payload, offset)
+            project_version = 0
+            offset += COUNTS_V1.size
+        else:
+            name_idx, root_count, node_count, project_version = COUNTS.unpack_from(payload, offset)
+            offset += COUNTS.size
+        table = payload[offset:]
+        if len(table) != node_count * NODE.size:
+            raise BinaryFormatError("Corrupt binary project (bad node table size)")
+
+        roots = []
+        stack = []  # [item, remaining children] of the nodes being filled
+        for item_idx, recipe_idx, child_count, rate, extra_rate, raw_uuid, flags in NODE.iter_unpack(table):
+            if flags & UUID_IS_STRING:
+                uuid_str = strings[struct.unpack_from('<i', raw_uuid)[0]]
+            else:
+                uuid_str = raw_uuid.hex()
+            item = Item(
+                strings[item_idx],
+                int(rate) if flags & RATE_IS_INT else rate,
+                strings[recipe_idx] if recipe_idx >= 0 else None,
+                bool(flags & OUTSOURCED),
+                None,
+                uuid_str,
+                int(extra_rate) if flags & EXTRA_RATE_IS_INT else extra_rate,
+                bool(flags & USE_EXTRA_RATE)
+            )
+            if stack:
+                parent = stack[-1]
+                parent[0].ingredients.append(item)
+                parent[1] -= 1
+            else:
+                roots.append(item)
+            if child_count:
+                stack.append([item, child_count])
+            else:
+                # Close the nodes whose children are all read
+                while stack and not stack[-1][1]:
+                    stack.pop()
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise BinaryFormatError(f"Corrupt binary project ({e})")
+    if stack or len(roots) != root_count:
+        raise BinaryFormatError("Corrupt binary project (inconsistent tree)")
+    return Project(name=strings[name_idx], items=roots, dirty=bool(header_flags & PROJECT_DIRTY),
+                   version=project_version)
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from models.catalog_artifact import ARTIFACT_PATH, CatalogArtifact
+from models.metrics import metrics
+
+RAW_DATA_DIR = os.path.join(os.path.dirname(__file__), '../raw_data')
+DATA_PATH = os.path.join(RAW_DATA_DIR, 'data.json')
+RECIPES_PATH = os.path.join(RAW_DATA_DIR, 'enhanced_recipes.json')
+
+
+class GameCatalog:
+    """
+    Read-only view of the game data (data.json + enhanced_recipes.json).
+    One instance is shared by the whole process (see get_catalog()); the files are
+    parsed once and only re-parsed when their mtime/size changes AND their content
+    hash differs from the one already loaded.
+    The returned mappings are shared: callers must never mutate them.
+
+    When an up-to-date compiled artifact exists (see models/catalog_artifact.py and
+    compile_catalog.py; CATALOG_ARTIFACT overrides its path, empty to disable), the
+    lookups and recipes are served from it (memory-mapped, shared by the worker
+    processes) and the JSON files are only parsed if the raw data (data, items,
+    resources, machines) is requested.
+    """
+    # Minimum delay (seconds) between two stat() checks of the source files
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, data_path=DATA_PATH, recipes_path=RECIPES_PATH, artifact_path=None):
+        self.data_path = data_path
+        self.recipes_path = recipes_path
+        self.artifact_path = os.environ.get('CATALOG_ARTIFACT', ARTIFACT_PATH) if artifact_path is None else artifact_path
+        self._artifact = None
+        self.generation = 0  # Incremented on every (re)load
+        self._lock = threading.Lock()
+        self._stats = {}  # path -> (mtime_ns, size)
+        self._hashes = {}  # path -> sha256 hex digest
+        self._last_check = 0.0
+        self._reload()
+
+    # --- Loading ---------------------------------------------------------
+
+    def _read(self, path):
+        metrics.count('catalog_file_opens')
+        with open(path, 'rb') as f:
+            raw = f.read()
+        st = os.stat(path)
+        return raw, (st.st_mtime_ns, st.st_size), hashlib.sha256(raw).hexdigest()
+
+    def _reload(self, preread=None):
+        preread = preread or {}
+        sources = {}
+        for path in (self.data_path, self.recipes_path):
+            sources[path] = preread.get(path) or self._read(path)
+        artifact = None
+        if self.artifact_path:
+            artifact = CatalogArtifact.open(self.artifact_path, sources[self.data_path][2], sources[self.recipes_path][2])
+        if artifact is not None:
+            self._set_artifact_state(artifact)
+        else:
+            data = json.loads(sources[self.data_path][0])
+            recipes = json.loads(sources[self.recipes_path][0])
+            self._set_state(data, recipes)
+        for path, (_raw, stat, digest) in sources.items():
+            self._stats[path] = stat
+            self._hashes[path] = digest
+        self.generation += 1
+
+    def _set_state(self, data, recipes):
+        self._artifact = None
+        self._data = MappingProxyType(data)
+        self._items = MappingProxyType(data.get('items', {}))
+        self._resources = MappingProxyType(data.get('resources', {}))
+        self._machines = MappingProxyType(data.get('machines', {}))
+        self._recipes = MappingProxyType(recipes)
+        self._item_names = MappingProxyType({item_id: item['name'] for item_id, item in data.get('items', {}).items()})
+        self._resource_names = MappingProxyType({item_id: res['name'] for item_id, res in data.get('resources', {}).items()})
+        self._build_indexes(recipes)
+
+    def _set_artifact_state(self, artifact):
+        self._artifact = artifact
+        self._data = None  # Parsed on demand, see _raw_data()
+        self._recipes = artifact.recipes
+        self._item_names = artifact.item_names
+        self._resource_names = artifact.resource_names
+
+    def _raw_data(self):
+        if self._data is None:
+            metrics.count('catalog_file_opens')
+            with open(self.data_path, 'rb') as f:
+                data = json.load(f)
+            self._items = MappingProxyType(data.get('items', {}))
+            self._resources = MappingProxyType(data.get('resources', {}))
+            self._machines = MappingProxyType(data.get('machines', {}))
+            self._data = MappingProxyType(data)  # Last: other threads may be reading it
+        return self._data
+
+    def _build_indexes(self, recipes):
+        """
+        Build the lookup tables used on the rate propagation / recipe selection paths:
+            - producers: item_id -> (recipe_id, ...) of the recipes producing it
+            - consumers: item_id -> (recipe_id, ...) of the recipes consuming it
+            - products: recipe_id -> {item_id: product dict}
+            - ratios: recipe_id -> {product_id: {ingredient_id: ingredient_rate / product_rate}}
+        """
+        producers = {}
+        consumers = {}
+        products = {}
+        ratios = {}
+        for recipe_id, recipe in recipes.items():
+            recipe_products = {}
+            for prod in recipe.get('products', []):
+                recipe_products.setdefault(prod['item'], prod)
+            products[recipe_id] = MappingProxyType(recipe_products)
+            for item_id in recipe_products:
+                producers.setdefault(item_id, []).append(recipe_id)
+            ingredient_rates = {}
+            for ing in recipe.get('ingredients', []):
+                ingredient_rates.setdefault(ing['item'], ing.get('rate'))
+                if recipe_id not in consumers.get(ing['item'], ()):
+                    consumers.setdefault(ing['item'], []).append(recipe_id)
+            recipe_ratios = {}
+            for item_id, prod in recipe_products.items():
+                prod_rate = prod.get('rate')
+                if not prod_rate:
+                    continue
+                recipe_ratios[item_id] = MappingProxyType({
+                    ing_id: ing_rate / prod_rate
+                    for ing_id, ing_rate in ingredient_rates.items()
+                    if ing_rate is not None
+                })
+            ratios[recipe_id] = recipe_ratios
+        self._producers = {item_id: tuple(ids) for item_id, ids in producers.items()}
+        self._consumers = {item_id: tuple(ids) for item_id, ids in consumers.items()}
+        self._products = products
+        self._ratios = ratios
+
+    def refresh(self, force=False):
+        """
+        Reload the catalog if one of the source files changed on disk.
+        Returns True if a reload happened.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.CHECK_INTERVAL:
+            return False
+        with self._lock:
+            self._last_check = now
+            changed = {}
+            for path in (self.data_path, self.recipes_path):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # Keep serving the last good copy
+                if (st.st_mtime_ns, st.st_size) == self._stats.get(path):
+                    continue
+                raw, stat, digest = self._read(path)
+                if digest == self._hashes.get(path):
+                    # Touched but identical content: just remember the new stat
+                    self._stats[path] = stat
+                    continue
+                changed[path] = (raw, stat, digest)
+            if not changed:
+                return False
+            self._reload(changed)
+            return True
+
+    # --- Accessors -------------------------------------------------------
+
+    @property
+    def data(self):
+        """The raw content of data.json."""
+        return self._raw_data()
+
+    @property
+    def items(self):
+        self._raw_data()
+        return self._items
+
+    @property
+    def resources(self):
+        self._raw_data()
+        return self._resources
+
+    @property
+    def machines(self):
+        self._raw_data()
+        return self._machines
+
+    @property
+    def recipes(self):
+        """Recipes from enhanced_recipes.json (with per-minute rates)."""
+        return self._recipes
+
+    @property
+    def item_names(self):
+        """item_id -> display name, for items only (same as Item.all_items())."""
+        return self._item_names
+
+    @property
+    def resource_names(self):
+        """resource item_id -> display name."""
+        return self._resource_names
+
+    @property
+    def resource_ids(self):
+        return self._resource_names.keys()
+
+    def get_recipe(self, recipe_id):
+        return self._recipes.get(recipe_id)
+
+    def producers(self, item_id):
+        """Return the ids of the recipes producing item_id (in catalog order)."""
+        if self._artifact is not None:
+            return self._artifact.producers(item_id)
+        return self._producers.get(item_id, ())
+
+    def consumers(self, item_id):
+        """Return the ids of the recipes using item_id as an ingredient."""
+        if self._artifact is not None:
+            return self._artifact.consumers(item_id)
+        return self._consumers.get(item_id, ())
+
+    def recipe_product(self, recipe_id, item_id):
+        """Return the product entry of item_id in recipe_id, or None."""
+        if self._artifact is not None:
+            return self._artifact.recipe_product(recipe_id, item_id)
+        return self._products.get(recipe_id, {}).get(item_id)
+
+    def product_rate(self, recipe_id, item_id):
+        """Return the per-minute rate of item_id produced by one recipe_id machine, or None."""
+        if self._artifact is not None:
+            return self._artifact.product_rate(recipe_id, item_id)
+        prod = self.recipe_product(recipe_id, item_id)
+        return prod.get('rate') if prod else None
+
+    def ingredient_ratios(self, recipe_id, product_id):
+        """
+        Return {ingredient_id: ingredient_rate / product_rate} for product_id made with
+        recipe_id, or None if the recipe does not produce it (or at a null rate).
+        """
+        if self._artifact is not None:
+            return self._artifact.ingredient_ratios(recipe_id, product_id)
+        return self._ratios.get(recipe_id, {}).get(product_id)
+
+    def machine_name(self, machine_id):
+        if self._artifact is not None:
+            return self._artifact.machine_name(machine_id)
+        if machine_id in self._machines:
+            return self._machines[machine_id].get('name', machine_id)
+        return machine_id or 'Unknown'
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the process-wide GameCatalog, reloading it if the files changed."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = GameCatalog()
+                return _catalog
+    _catalog.refresh()
+    return _catalog
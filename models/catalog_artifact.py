@@ -0,0 +1,356 @@
+"""
+Precompiled form of the game catalog (data.json + enhanced_recipes.json), memory-mapped
+read-only so that several worker processes share the same pages instead of each
+parsing the JSON files into their own dicts.
+
+The artifact holds:
+    - a string table (every id and name is an integer index into it)
+    - the items, resources and machines (id, name)
+    - one fixed-width row per recipe (id, name, machine, time, power_use)
+    - CSR arrays (start offsets per recipe) of the products and ingredients, with
+      their per-minute rates
+    - CSR arrays of the producers / consumers of each item, and of the precomputed
+      ingredient ratios of each product (see GameCatalog.ingredient_ratios)
+It is keyed on the SHA-256 of both source files: CatalogArtifact.open() returns None
+when the artifact is missing, stale or unreadable, and the catalog then falls back to
+the JSON files.
+
+    python compile_catalog.py   # (re)build raw_data/catalog.bin
+"""
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from types import MappingProxyType
+
+RAW_DATA_DIR = os.path.join(os.path.dirname(__file__), '../raw_data')
+ARTIFACT_PATH = os.path.join(RAW_DATA_DIR, 'catalog.bin')
+
+MAGIC = b'SPCA'
+VERSION = 1
+# magic, version, section count, sha256 of data.json, sha256 of enhanced_recipes.json
+HEADER = struct.Struct('<4sHH32s32s')
+# offset, size (bytes) of each section, in SECTIONS order
+SECTION = struct.Struct('<QQ')
+# id, name, machine (string indices, -1 for None), time, power_use (NaN for None)
+RECIPE_ROW = struct.Struct('<iiidd')
+SECTIONS = (
+    ('strings', 'B'), ('string_starts', 'i'),
+    ('item_ids', 'i'), ('item_names', 'i'),
+    ('resource_ids', 'i'), ('resource_names', 'i'),
+    ('machine_ids', 'i'), ('machine_names', 'i'),
+    ('recipe_rows', 'B'),
+    ('product_starts', 'i'), ('product_items', 'i'), ('product_amounts', 'd'),
+    ('product_rates', 'd'), ('product_flags', 'B'),
+    ('ingredient_starts', 'i'), ('ingredient_items', 'i'), ('ingredient_amounts', 'd'),
+    ('ingredient_rates', 'd'), ('ingredient_flags', 'B'),
+    ('producer_starts', 'i'), ('producers', 'i'),
+    ('consumer_starts', 'i'), ('consumers', 'i'),
+    ('ratio_starts', 'i'), ('ratio_items', 'i'), ('ratio_values', 'd'),
+)
+# Product / ingredient flags
+AMOUNT_IS_INT = 1
+HAS_RATE = 2
+HAS_RESOURCE = 4
+IS_RESOURCE = 8
+
+
+def _none_to_nan(value):
+    return float('nan') if value is None else value
+
+
+def _nan_to_none(value):
+    return None if math.isnan(value) else value
+
+
+def build_artifact(data, recipes, data_digest, recipes_digest):
+    """Compile the parsed data.json / enhanced_recipes.json into artifact bytes."""
+    strings = []
+    string_index = {}
+
+    def string(value):
+        if value is None:
+            return -1
+        idx = string_index.get(value)
+        if idx is None:
+            idx = string_index[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    sections = {name: array(typecode) for name, typecode in SECTIONS}
+    for kind in ('item', 'resource', 'machine'):
+        for entity_id, entity in data.get(kind + 's', {}).items():
+            sections[kind + '_ids'].append(string(entity_id))
+            sections[kind + '_names'].append(string(entity.get('name', entity_id)))
+
+    rows = bytearray()
+    producers = {}  # string index -> [recipe row]
+    consumers = {}
+    sections['product_starts'].append(0)
+    sections['ingredient_starts'].append(0)
+    sections['ratio_starts'].append(0)
+    for row, (recipe_id, recipe) in enumerate(recipes.items()):
+        rows += RECIPE_ROW.pack(string(recipe_id), string(recipe.get('name', recipe_id)), string(recipe.get('machine')),
+                                _none_to_nan(recipe.get('time')), _none_to_nan(recipe.get('power_use')))
+        for kind in ('product', 'ingredient'):
+            for entry in recipe.get(kind + 's', []):
+                flags = AMOUNT_IS_INT if isinstance(entry.get('amount'), int) else 0
+                if entry.get('rate') is not None:
+                    flags |= HAS_RATE
+                if 'resource' in entry:
+                    flags |= HAS_RESOURCE | (IS_RESOURCE if entry['resource'] else 0)
+                sections[kind + '_items'].append(string(entry['item']))
+                sections[kind + '_amounts'].append(_none_to_nan(entry.get('amount')))
+                sections[kind + '_rates'].append(_none_to_nan(entry.get('rate')))
+                sections[kind + '_flags'].append(flags)
+            sections[kind + '_starts'].append(len(sections[kind + '_items']))
+
+        # Same rules as GameCatalog._build_indexes: first entry per item wins
+        recipe_products = {}
+        for prod in recipe.get('products', []):
+            recipe_products.setdefault(prod['item'], prod)
+        for item_id in recipe_products:
+            producers.setdefault(string(item_id), []).append(row)
+        ingredient_rates = {}
+        for ing in recipe.get('ingredients', []):
+            ingredient_rates.setdefault(ing['item'], ing.get('rate'))
+            if row not in consumers.get(string(ing['item']), ()):
+                consumers.setdefault(string(ing['item']), []).append(row)
+        # One ratio list per product entry (empty for duplicated products, never looked up)
+        seen = set()
+        for prod in recipe.get('products', []):
+            if prod['item'] not in seen and prod.get('rate'):
+                for ing_id, ing_rate in ingredient_rates.items():
+                    if ing_rate is not None:
+                        sections['ratio_items'].append(string(ing_id))
+                        sections['ratio_values'].append(ing_rate / prod['rate'])
+            seen.add(prod['item'])
+            sections['ratio_starts'].append(len(sections['ratio_items']))
+    sections['recipe_rows'] = array('B', rows)
+
+    for name, table in (('producer', producers), ('consumer', consumers)):
+        starts = sections[name + '_starts']
+        starts.append(0)
+        for idx in range(len(strings)):
+            sections[name + 's'].extend(table.get(idx, ()))
+            starts.append(len(sections[name + 's']))
+
+    blob = bytearray()
+    starts = sections['string_starts']
+    starts.append(0)
+    for value in strings:
+        blob += value.encode('utf-8')
+        starts.append(len(blob))
+    sections['strings'] = array('B', blob)
+
+    # Sections are 8-byte aligned so that they can be cast in place
+    offset = HEADER.size + SECTION.size * len(SECTIONS)
+    table = bytearray()
+    body = bytearray()
+    for name, _typecode in SECTIONS:
+        raw = sections[name].tobytes()
+        padding = -(offset + len(body)) % 8
+        body += bytes(padding)
+        table += SECTION.pack(offset + len(body), len(raw))
+        body += raw
+    header = HEADER.pack(MAGIC, VERSION, len(SECTIONS), bytes.fromhex(data_digest), bytes.fromhex(recipes_digest))
+    return header + table + body
+
+
+def write_artifact(data_path, recipes_path, path=ARTIFACT_PATH):
+    """Build the artifact of the given source files and write it atomically. Returns its size."""
+    with open(data_path, 'rb') as f:
+        data_raw = f.read()
+    with open(recipes_path, 'rb') as f:
+        recipes_raw = f.read()
+    content = build_artifact(json.loads(data_raw), json.loads(recipes_raw),
+                             hashlib.sha256(data_raw).hexdigest(), hashlib.sha256(recipes_raw).hexdigest())
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    # Workers that mapped the old file keep their (unlinked) copy until they reload
+    os.replace(tmp_path, path)
+    return len(content)
+
+
+class CatalogArtifact:
+    """
+    Read-only, memory-mapped catalog tables. Offers the same lookups as GameCatalog
+    (producers, consumers, recipe_product, product_rate, ingredient_ratios,
+    machine_name, recipes); values are decoded from the shared arrays on access.
+    Recipes are rebuilt as plain dicts (name, time, machine, power_use, recipe_id,
+    products, ingredients) the first time they are used, without the per-ingredient
+    alternates list ('recipes') of enhanced_recipes.json.
+    """
+
+    def __init__(self, mapped, sections):
+        self._mmap = mapped
+        for name, view in sections.items():
+            setattr(self, '_' + name, view)
+        self.strings = [
+            str(self._strings[start:end], 'utf-8')
+            for start, end in zip(self._string_starts, self._string_starts[1:])
+        ]
+        self._string_index = {value: idx for idx, value in enumerate(self.strings)}
+        strings = self.strings
+        self.item_names = MappingProxyType({
+            strings[item]: strings[name] for item, name in zip(self._item_ids, self._item_names)})
+        self.resource_names = MappingProxyType({
+            strings[item]: strings[name] for item, name in zip(self._resource_ids, self._resource_names)})
+        self._machine_name = {strings[m]: strings[name] for m, name in zip(self._machine_ids, self._machine_names)}
+        self._recipe_count = len(self._product_starts) - 1
+        self._recipe_rows = {}  # recipe_id -> row
+        for row in range(self._recipe_count):
+            self._recipe_rows[strings[RECIPE_ROW.unpack_from(self._recipe_rows_raw, row * RECIPE_ROW.size)[0]]] = row
+        self._recipes = {}  # recipe_id -> decoded recipe dict (lazily filled)
+        self.recipes = _RecipesView(self)
+
+    @classmethod
+    def open(cls, path, data_digest, recipes_digest):
+        """Map the artifact at path, or return None if it is missing, stale or unusable."""
+        if sys.byteorder != 'little':
+            return None  # Arrays are cast in place (little-endian build)
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        views = []
+        try:
+            magic, version, count, data_hash, recipes_hash = HEADER.unpack_from(mapped, 0)
+            if (magic, version, count) != (MAGIC, VERSION, len(SECTIONS)):
+                raise ValueError('unsupported artifact')
+            if (data_hash.hex(), recipes_hash.hex()) != (data_digest, recipes_digest):
+                raise ValueError('stale artifact')
+            views.append(memoryview(mapped))
+            sections = {}
+            for n, (name, typecode) in enumerate(SECTIONS):
+                offset, size = SECTION.unpack_from(mapped, HEADER.size + n * SECTION.size)
+                if offset + size > len(mapped):
+                    raise ValueError('truncated artifact')
+                views.append(views[0][offset:offset + size].cast(typecode))
+                sections[name + '_raw' if name == 'recipe_rows' else name] = views[-1]
+            return cls(mapped, sections)
+        except (ValueError, TypeError, struct.error, IndexError, UnicodeDecodeError):
+            # The map can only be closed once no view of it is left
+            for view in reversed(views):
+                view.release()
+            mapped.close()
+            return None
+
+    def _id(self, value):
+        return self._string_index.get(value, -1)
+
+    def _entries(self, kind, row):
+        starts = getattr(self, f'_{kind}_starts')
+        return range(starts[row], starts[row + 1])
+
+    def _entry(self, kind, idx):
+        flags = getattr(self, f'_{kind}_flags')[idx]
+        amount = _nan_to_none(getattr(self, f'_{kind}_amounts')[idx])
+        entry = {
+            'item': self.strings[getattr(self, f'_{kind}_items')[idx]],
+            'amount': int(amount) if flags & AMOUNT_IS_INT and amount is not None else amount,
+        }
+        if flags & HAS_RATE:
+            entry['rate'] = getattr(self, f'_{kind}_rates')[idx]
+        if flags & HAS_RESOURCE:
+            entry['resource'] = bool(flags & IS_RESOURCE)
+        return entry
+
+    def _recipe_ids(self, starts, values, item_id):
+        idx = self._id(item_id)
+        if idx < 0:
+            return ()
+        return tuple(self.recipe_id(row) for row in values[starts[idx]:starts[idx + 1]])
+
+    def recipe_id(self, row):
+        return self.strings[RECIPE_ROW.unpack_from(self._recipe_rows_raw, row * RECIPE_ROW.size)[0]]
+
+    def get_recipe(self, recipe_id):
+        recipe = self._recipes.get(recipe_id)
+        if recipe is None:
+            row = self._recipe_rows.get(recipe_id)
+            if row is None:
+                return None
+            _id, name, machine, time, power_use = RECIPE_ROW.unpack_from(self._recipe_rows_raw, row * RECIPE_ROW.size)
+            recipe = self._recipes[recipe_id] = {
+                'name': self.strings[name],
+                'time': _nan_to_none(time),
+                'ingredients': [self._entry('ingredient', idx) for idx in self._entries('ingredient', row)],
+                'products': [self._entry('product', idx) for idx in self._entries('product', row)],
+                'machine': self.strings[machine] if machine >= 0 else None,
+                'power_use': _nan_to_none(power_use),
+                'recipe_id': recipe_id,
+            }
+        return recipe
+
+    def producers(self, item_id):
+        return self._recipe_ids(self._producer_starts, self._producers, item_id)
+
+    def consumers(self, item_id):
+        return self._recipe_ids(self._consumer_starts, self._consumers, item_id)
+
+    def _product_index(self, recipe_id, item_id):
+        row = self._recipe_rows.get(recipe_id)
+        item = self._id(item_id)
+        if row is None or item < 0:
+            return None
+        for idx in self._entries('product', row):
+            if self._product_items[idx] == item:
+                return idx
+        return None
+
+    def recipe_product(self, recipe_id, item_id):
+        idx = self._product_index(recipe_id, item_id)
+        return None if idx is None else self._entry('product', idx)
+
+    def product_rate(self, recipe_id, item_id):
+        idx = self._product_index(recipe_id, item_id)
+        if idx is None or not self._product_flags[idx] & HAS_RATE:
+            return None
+        return self._product_rates[idx]
+
+    def ingredient_ratios(self, recipe_id, product_id):
+        idx = self._product_index(recipe_id, product_id)
+        if idx is None or not (self._product_flags[idx] & HAS_RATE and self._product_rates[idx]):
+            return None
+        start, end = self._ratio_starts[idx], self._ratio_starts[idx + 1]
+        strings = self.strings
+        return MappingProxyType({
+            strings[item]: value for item, value in zip(self._ratio_items[start:end], self._ratio_values[start:end])
+        })
+
+    def machine_name(self, machine_id):
+        if machine_id in self._machine_name:
+            return self._machine_name[machine_id]
+        return machine_id or 'Unknown'
+
+
+class _RecipesView(Mapping):
+    """Read-only mapping recipe_id -> recipe dict over a CatalogArtifact (in catalog order)."""
+
+    def __init__(self, artifact):
+        self._artifact = artifact
+
+    def __getitem__(self, recipe_id):
+        recipe = self._artifact.get_recipe(recipe_id)
+        if recipe is None:
+            raise KeyError(recipe_id)
+        return recipe
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self._artifact._recipe_rows
+
+    def __iter__(self):
+        return iter(self._artifact._recipe_rows)
+
+    def __len__(self):
+        return len(self._artifact._recipe_rows)
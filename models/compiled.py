@@ -0,0 +1,168 @@
+from bisect import bisect_left
+from models.catalog import get_catalog
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: fall back to plain Python lists
+    np = None
+
+
+class CompiledTree:
+    """
+    Flat, array-based form of an Item tree used for rate propagation.
+
+    Nodes are stored in depth-first pre-order, so the sub-tree of node i is the
+    contiguous range [i, i + size[i]). For every node we keep:
+        - parent: index of the parent node (-1 for the root)
+        - ratio: ingredient_rate / product_rate of the parent's recipe for this node,
+                 or None if the parent does not propagate its rate to it
+        - extra_rate / use_extra_rate: copied from the Item
+        - level: depth in the tree (the root is level 0)
+    Propagation then runs one pass per tree level (vectorized with NumPy when it is
+    installed) and the new rates are written back to the Item objects.
+
+    The compiled form only depends on the tree structure (item_id, recipe_id and
+    ingredients of every node) and must be rebuilt when that changes;
+    extra_rate / use_extra_rate are re-read from the Items on every update.
+    """
+
+    def __init__(self, root, catalog=None):
+        catalog = catalog or get_catalog()
+        self.generation = catalog.generation
+        self.nodes = []
+        self.parent = []
+        self.ratio = []
+        self.extra_rate = []
+        self.use_extra_rate = []
+        self.level = []
+        self.size = []
+        self.prod_rate = []
+        self.power_use = []
+        self.index = {}  # uuid -> node index
+        # Iterative pre-order walk (no recursion limit on deep trees)
+        stack = [(root, -1, None, 0)]
+        while stack:
+            item, parent_idx, ratio, level = stack.pop()
+            idx = len(self.nodes)
+            self.nodes.append(item)
+            self.parent.append(parent_idx)
+            self.ratio.append(ratio)
+            self.extra_rate.append(float(item.extra_rate or 0.0))
+            self.use_extra_rate.append(bool(item.use_extra_rate))
+            self.level.append(level)
+            self.size.append(1)
+            self.index.setdefault(item.uuid, idx)  # First node wins on duplicated uuids
+            recipe = catalog.get_recipe(item.recipe_id) if item.recipe_id else None
+            self.prod_rate.append(catalog.product_rate(item.recipe_id, item.item_id) if recipe else None)
+            self.power_use.append(recipe.get('power_use') if recipe else None)
+            ratios = catalog.ingredient_ratios(item.recipe_id, item.item_id) if item.recipe_id and item.ingredients else None
+            for ing in reversed(item.ingredients):
+                stack.append((ing, idx, ratios.get(ing.item_id) if ratios else None, level + 1))
+        # Sub-tree sizes: children always come after their parent in pre-order
+        for idx in range(len(self.nodes) - 1, 0, -1):
+            self.size[self.parent[idx]] += self.size[idx]
+        # Node indices grouped by level (each group is sorted, see _level_slice)
+        self.levels = []
+        for idx, level in enumerate(self.level):
+            if level == len(self.levels):
+                self.levels.append([])
+            self.levels[level].append(idx)
+        if np is not None:
+            self._np_parent = np.array(self.parent, dtype=np.int64)
+            self._np_ratio = np.array([r if r is not None else 0.0 for r in self.ratio], dtype=np.float64)
+            self._np_has_ratio = np.array([r is not None for r in self.ratio], dtype=bool)
+            self._np_extra = np.array(self._extra_values(), dtype=np.float64)
+            self._np_levels = [np.array(indices, dtype=np.int64) for indices in self.levels]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _extra_values(self, start=0, end=None):
+        """Extra rate actually added to each node of [start, end) (0.0 when not used)."""
+        return [
+            extra if use else 0.0
+            for extra, use in zip(self.extra_rate[start:end], self.use_extra_rate[start:end])
+        ]
+
+    def _sync_extra(self, start, end):
+        """Re-read extra_rate / use_extra_rate of the nodes in [start, end) from the Items."""
+        for idx in range(start, end):
+            item = self.nodes[idx]
+            self.extra_rate[idx] = float(item.extra_rate or 0.0)
+            self.use_extra_rate[idx] = bool(item.use_extra_rate)
+        if np is not None:
+            self._np_extra[start:end] = self._extra_values(start, end)
+
+    def update_rate(self, new_rate, uuid_str=None):
+        """
+        Same result as Item.update_rate(new_rate) on the node uuid_str (the root by
+        default): set its rate, then propagate it down its sub-tree.
+        Returns the list of Items whose rate changed.
+        """
+        start = self.index[uuid_str] if uuid_str is not None else 0
+        self._sync_extra(start, start + self.size[start])
+        root_rate = new_rate + self.extra_rate[start] if self.use_extra_rate[start] else new_rate
+        if np is not None:
+            updated, rates = self._propagate_numpy(start, root_rate)
+        else:
+            updated, rates = self._propagate_python(start, root_rate)
+        for idx, rate in zip(updated, rates):
+            self.nodes[idx].rate = rate
+        return [self.nodes[idx] for idx in updated]
+
+    def _level_slice(self, level, start, end):
+        """Return the node indices of the given level inside the range [start, end)."""
+        indices = self.levels[level]
+        return bisect_left(indices, start), bisect_left(indices, end)
+
+    def _propagate_python(self, start, root_rate):
+        end = start + self.size[start]
+        rates = {start: root_rate}
+        for idx in range(start + 1, end):
+            # Pre-order: the parent of idx is always computed before idx
+            parent_rate = rates.get(self.parent[idx])
+            ratio = self.ratio[idx]
+            if parent_rate is None or ratio is None:
+                continue
+            rate = parent_rate * ratio
+            rates[idx] = rate + self.extra_rate[idx] if self.use_extra_rate[idx] else rate
+        updated = sorted(rates)
+        return updated, [rates[idx] for idx in updated]
+
+    def _propagate_numpy(self, start, root_rate):
+        end = start + self.size[start]
+        rates = np.zeros(len(self.nodes), dtype=np.float64)
+        done = np.zeros(len(self.nodes), dtype=bool)
+        rates[start] = root_rate
+        done[start] = True
+        for level in range(self.level[start] + 1, len(self.levels)):
+            lo, hi = self._level_slice(level, start, end)
+            if lo == hi:
+                break
+            indices = self._np_levels[level][lo:hi]
+            parents = self._np_parent[indices]
+            rates[indices] = rates[parents] * self._np_ratio[indices] + self._np_extra[indices]
+            done[indices] = done[parents] & self._np_has_ratio[indices]
+        # The root rate is written back as given (it may be a plain Python number)
+        done[start] = False
+        updated = np.flatnonzero(done).tolist()
+        return [start] + updated, [root_rate] + rates[updated].tolist()
+
+    def machines(self):
+        """
+        Return (num_machines, total_power) lists, one entry per node, computed from the
+        current Item rates with the same rounding as Item.to_card_dict (None when the node
+        has no machine).
+        """
+        num_machines = []
+        total_power = []
+        for item, prod_rate, power_use in zip(self.nodes, self.prod_rate, self.power_use):
+            if prod_rate and power_use:
+                count = round(item.rate / prod_rate, 2)
+                num_machines.append(count)
+                total_power.append(round(count * power_use, 2))
+            else:
+                num_machines.append(None)
+                total_power.append(None)
+        return num_machines, total_power
+
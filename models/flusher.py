@@ -0,0 +1,105 @@
+import atexit
+import threading
+import time
+
+
+class WriteBehindFlusher:
+    """
+    Background thread saving projects after the request that changed them.
+
+    schedule() only records the project: edits made in a burst are coalesced and each
+    project is written at most once per `interval` seconds. Pending projects are also
+    flushed on shutdown (atexit) and can be flushed on demand with flush(), e.g. before
+    reading a project back from disk.
+
+    Each write holds lock_for(project_id): by default one lock for all the writes, or
+    e.g. the project's writer lock, so that a project is not written while a request
+    is editing it (see ProjectLocks).
+    """
+
+    def __init__(self, save_func, interval=2.0, lock_for=None):
+        self.save_func = save_func  # (project, project_id) -> None
+        self.interval = interval
+        self._pending = {}  # project_id -> Project
+        self._last_flush = {}  # project_id -> time.monotonic() of the last write
+        self._lock = threading.Lock()
+        self._save_lock = threading.RLock()  # Default lock of the writes (thread vs flush())
+        self.lock_for = lock_for or (lambda project_id: self._save_lock)
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='project-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def schedule(self, project_id, project):
+        """Save project later (at most once per interval)."""
+        with self._lock:
+            self._pending[project_id] = project
+        self._wakeup.set()
+
+    def discard(self, project_id):
+        """Drop a pending save (e.g. the project was deleted or just saved)."""
+        with self._lock:
+            self._pending.pop(project_id, None)
+
+    def is_pending(self, project_id):
+        with self._lock:
+            return project_id in self._pending
+
+    def _due(self, now):
+        """Ids of the pending projects that may be written at `now`."""
+        with self._lock:
+            return [
+                project_id for project_id in self._pending
+                if now - self._last_flush.get(project_id, float('-inf')) >= self.interval
+            ]
+
+    def _next_due(self, now):
+        """Seconds until the next pending project may be written (None if nothing is pending)."""
+        with self._lock:
+            if not self._pending:
+                return None
+            return max(0.0, min(
+                self._last_flush.get(project_id, float('-inf')) + self.interval - now
+                for project_id in self._pending
+            ))
+
+    def _write(self, project_ids):
+        for project_id in project_ids:
+            with self.lock_for(project_id):
+                # Popped under the lock: a flush() waiting for it then finds nothing to write
+                with self._lock:
+                    project = self._pending.pop(project_id, None)
+                if project is None:
+                    continue
+                try:
+                    self.save_func(project, project_id)
+                except Exception as e:
+                    print(f"Error saving project {project_id}: {e}")
+                    # Keep it pending unless a newer version was scheduled meanwhile
+                    with self._lock:
+                        self._pending.setdefault(project_id, project)
+                with self._lock:
+                    self._last_flush[project_id] = time.monotonic()
+
+    def _run(self):
+        while not self._stopped:
+            timeout = self._next_due(time.monotonic())
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            if self._stopped:
+                break
+            self._write(self._due(time.monotonic()))
+
+    def flush(self, project_id=None):
+        """Write pending projects now (all of them, or only project_id)."""
+        with self._lock:
+            project_ids = list(self._pending) if project_id is None else [project_id]
+        self._write(project_ids)
+
+    def stop(self):
+        """Stop the thread and write everything still pending."""
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """
+    Rendered HTML of the project cards, per node: (project_id, uuid, is_root) -> (card, html).
+    Item.to_card_dict returns the same card dict as long as a node and its sub-tree are
+    unchanged (and a new one otherwise), so the card itself is the content version of the
+    fragment: an entry is only reused for the very same card dict. A page view after an
+    edit thus only re-renders the edited node and its ancestors; the other fragments
+    (whole sub-trees) are reused as is.
+
+    Bounded in (approximate) bytes of HTML, least recently used first, and counts hits,
+    misses and evictions (see stats()).
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (card, html), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_render(self, key, card, render):
+        """Return the cached HTML of card, or render() it (and cache it)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is card:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # Rendered outside the lock: fragments render their ingredients through the cache
+        html = render()
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (card, html)
+            self._bytes += len(html)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _key, (_card, old_html) = self._entries.popitem(last=False)
+                self._bytes -= len(old_html)
+                self.evictions += 1
+        return html
+
+    def discard(self, project_id):
+        """Drop the fragments of a project (e.g. deleted)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == project_id]:
+                self._bytes -= len(self._entries.pop(key)[1])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+            }
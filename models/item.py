@@ -1,46 +1,52 @@
+import sys
 import uuid
-import json
-import os
+from models.catalog import get_catalog
+from models.compiled import CompiledTree
+from models.metrics import request_counts
+from types import MappingProxyType
+
+# Shared empty mapping, so that cards built without resource names can be cached
+_NO_NAMES = MappingProxyType({})
+
+
+def intern_id(value):
+    """Intern an item/recipe id, so that all the nodes using it share one string."""
+    return sys.intern(value) if type(value) is str else value
+
 
 class Item:
+    # No per-instance __dict__: large projects have tens of thousands of nodes
+    __slots__ = ('item_id', 'rate', 'recipe_id', 'outsourced', 'ingredients', 'uuid',
+                 'extra_rate', 'use_extra_rate', '_card')
+
     def __init__(self, item_id, rate, recipe_id=None, outsourced=False, ingredients=None, uuid_str=None, extra_rate=0.0, use_extra_rate=False):
-        self.item_id = item_id
+        self.item_id = intern_id(item_id)
         self.rate = rate
-        self.recipe_id = recipe_id
+        self.recipe_id = intern_id(recipe_id)
         self.outsourced = outsourced
         self.ingredients = ingredients or []  # List of Item instances
         self.uuid = uuid_str or uuid.uuid4().hex
         self.extra_rate = extra_rate  # float, default 0.0
         self.use_extra_rate = use_extra_rate  # boolean, default False
+        self._card = None  # Cached card (see to_card_dict)
+
+    def __getstate__(self):
+        # Copies and pickles leave the cached card behind (it holds shared catalog mappings)
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_card' and hasattr(self, name)}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._card = None
 
     def update_rate(self, new_rate):
-        # If use_extra_rate is True, add extra_rate to the calculated rate
-        effective_rate = new_rate + self.extra_rate if self.use_extra_rate else new_rate
-        self.rate = effective_rate
-        # Propagate to ingredients based on recipe ratios
-        if self.recipe_id and self.ingredients:
-            recipes_path = os.path.join(os.path.dirname(__file__), '../raw_data/enhanced_recipes.json')
-            with open(recipes_path, 'r', encoding='utf-8') as f:
-                recipes = json.load(f)
-            recipe = recipes.get(self.recipe_id)
-            if recipe and 'ingredients' in recipe and 'products' in recipe:
-                # Find the product rate for this item
-                prod_rate = None
-                for prod in recipe['products']:
-                    if prod['item'] == self.item_id:
-                        prod_rate = prod.get('rate')
-                        break
-                if prod_rate:
-                    for ing_obj in self.ingredients:
-                        # Find the matching ingredient in the recipe
-                        for ing in recipe['ingredients']:
-                            if ing['item'] == ing_obj.item_id:
-                                # Set child rate proportionally
-                                ing_obj.update_rate(self.rate * (ing['rate'] / prod_rate))
-                                break
+        # If use_extra_rate is True, add extra_rate to the calculated rate, then
+        # propagate to ingredients based on recipe ratios (see CompiledTree).
+        # Projects keep their compiled trees around: prefer Project.change_rate.
+        CompiledTree(self).update_rate(new_rate)
 
     def select_recipe(self, recipe_id):
-        self.recipe_id = recipe_id
+        self.recipe_id = intern_id(recipe_id)
         # Optionally update ingredients based on recipe
 
     def set_extra_rate(self, value):
@@ -75,6 +81,21 @@ class Item:
         )
         return item
 
+    def walk(self):
+        """Yield this item and all its ingredients, recursively (pre-order)."""
+        stack = [self]
+        walked = 0
+        try:
+            while stack:
+                item = stack.pop()
+                walked += 1
+                yield item
+                stack.extend(reversed(item.ingredients))
+        finally:
+            counts = request_counts()
+            if counts is not None:
+                counts['nodes_walked'] += walked
+
     def find_by_uuid(self, uuid_str):
         if self.uuid == uuid_str:
             return self
@@ -86,26 +107,19 @@ class Item:
 
     @classmethod
     def all_items(cls):
-        """Load all items from data.json and return a dict of item_id to item name."""
-        data_path = os.path.join(os.path.dirname(__file__), '../raw_data/data.json')
-        with open(data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        items = data.get('items', {})
-        return {item_id: item_data['name'] for item_id, item_data in items.items()}
+        """Return a read-only mapping of item_id to item name (from data.json)."""
+        return get_catalog().item_names
 
     def get_recipes(self):
         """
         Return a list of (recipe_id, recipe, product) for all recipes that produce this item.
         Ensures only one outsourced entry.
         """
-        recipes_path = os.path.join(os.path.dirname(__file__), '../raw_data/enhanced_recipes.json')
-        with open(recipes_path, 'r', encoding='utf-8') as f:
-            recipes = json.load(f)
-        result = []
-        for recipe_id, recipe in recipes.items():
-            for prod in recipe.get('products', []):
-                if prod['item'] == self.item_id:
-                    result.append((recipe_id, recipe, prod))
+        catalog = get_catalog()
+        result = [
+            (recipe_id, catalog.recipes[recipe_id], catalog.recipe_product(recipe_id, self.item_id))
+            for recipe_id in catalog.producers(self.item_id)
+        ]
         # Remove all outsourced entries, then add one at the end
         result = [r for r in result if r[0] != '__outsourced__']
         result.append(('__outsourced__', {}, {'item': self.item_id, 'rate': self.rate}))
@@ -113,35 +127,42 @@ class Item:
 
     @staticmethod
     def get_machine_name(machine_id):
-        data_path = os.path.join(os.path.dirname(__file__), '../raw_data/data.json')
-        with open(data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        machines = data.get('machines', {})
-        if machine_id in machines:
-            return machines[machine_id].get('name', machine_id)
-        return machine_id or 'Unknown'
+        return get_catalog().machine_name(machine_id)
 
     def to_card_dict(self, item_names=None, ingredient_ids=None, resource_names=None, include_extra_products=False):
         """
         Return a dict with all info needed for card rendering, including children and recipe info.
         item_names: dict of item_id to name (optional, for display)
-        ingredient_ids: set of item_ids used as ingredients in the current tree (for byproduct detection)
+        ingredient_ids: unused, kept for compatibility
         include_extra_products: only True for the root card, False for all children
+        Cards are cached per item and only rebuilt when the item (rate, recipe, extras...)
+        or the card of one of its ingredients changed, so the returned dict is shared:
+        callers must not modify it.
         """
         if item_names is None:
             item_names = Item.all_items()
-        if ingredient_ids is None:
-            # Build a set of all ingredient item_ids in this subtree (excluding self)
-            ingredient_ids = set()
-            def collect_ingredient_ids(item):
-                for ing in item.ingredients:
-                    ingredient_ids.add(ing.item_id)
-                    collect_ingredient_ids(ing)
-            collect_ingredient_ids(self)
-        if resource_names is None and hasattr(self, 'resource_names'):
-            resource_names = getattr(self, 'resource_names', {})
-        elif resource_names is None:
-            resource_names = {}
+        if resource_names is None:
+            resource_names = _NO_NAMES
+        counts = request_counts()
+        if counts is not None:
+            counts['card_calls'] += 1
+        ingredients = [ing.to_card_dict(item_names, None, resource_names, include_extra_products=False) for ing in self.ingredients]
+        key = (
+            self.item_id, self.rate, self.recipe_id, self.outsourced, self.uuid,
+            self.extra_rate, self.use_extra_rate, get_catalog().generation
+        )
+        if self._card is not None:
+            card_key, card_item_names, card_resource_names, card_ingredients, card = self._card
+            # Ingredient cards are compared by identity: an unchanged sub-tree returns the same dict
+            if (card_key == key and card_item_names is item_names and card_resource_names is resource_names
+                    and len(card_ingredients) == len(ingredients)
+                    and all(a is b for a, b in zip(card_ingredients, ingredients))):
+                return card
+        card = self._build_card(item_names, resource_names, ingredients)
+        self._card = (key, item_names, resource_names, ingredients, card)
+        return card
+
+    def _build_card(self, item_names, resource_names, ingredients):
         card = {
             'item_id': self.item_id,
             'name': item_names.get(self.item_id, self.item_id) if self.item_id else 'Unknown Item',
@@ -149,7 +170,7 @@ class Item:
             'recipe_id': self.recipe_id,
             'outsourced': self.outsourced,
             'uuid': self.uuid,
-            'ingredients': [ing.to_card_dict(item_names, None, resource_names, include_extra_products=False) for ing in self.ingredients],
+            'ingredients': ingredients,
             'recipe_name': None,
             'machine': None,
             'machine_name': None,
@@ -163,10 +184,7 @@ class Item:
         }
         # Add recipe info if recipe_id is set
         if self.recipe_id:
-            recipes_path = os.path.join(os.path.dirname(__file__), '../raw_data/enhanced_recipes.json')
-            with open(recipes_path, 'r', encoding='utf-8') as f:
-                recipes = json.load(f)
-            recipe = recipes.get(self.recipe_id)
+            recipe = get_catalog().get_recipe(self.recipe_id)
             if recipe:
                 card['recipe_name'] = recipe.get('name', self.recipe_id)
                 card['machine'] = recipe.get('machine')
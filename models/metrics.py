@@ -0,0 +1,200 @@
+import cProfile
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Counts of the request handled by the current thread (see request_counts)
+_request = threading.local()
+
+
+def request_counts():
+    """
+    Counter of the request being handled by this thread (None outside a tracked request).
+    Used by the hot paths (tree walks, card builds), which only count inside requests:
+        counts = request_counts()
+        if counts is not None:
+            counts['card_calls'] += 1
+    """
+    return getattr(_request, 'counts', None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    Process-wide request metrics, exposed in the Prometheus text format (see render()):
+        - latency histogram of every route (route pattern and method)
+        - per-route totals of the request counts (tree nodes walked, to_card_dict calls...,
+          see request_counts): divided by the request count, the average per request
+        - process-wide counters (count(): catalog file opens, project loads and saves...)
+        - values of the collectors (add_collector(): cache sizes, hit ratios...)
+
+    The request counts are kept in a thread-local Counter while the request runs and only
+    added to the totals (under the lock) when it ends, so counting is a dict increment.
+    """
+
+    def __init__(self, prefix='satisfactory', buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)  # name -> total
+        self._requests = {}  # (route, method) -> [count per bucket..., count, sum]
+        self._request_counts = defaultdict(Counter)  # (route, method) -> Counter of the request counts
+        self._collectors = []  # (name, help, type, func)
+        self.started = time.time()
+
+    def count(self, name, amount=1):
+        """Add to a process-wide counter (thread-safe)."""
+        with self._lock:
+            self._counters[name] += amount
+
+    def start_request(self):
+        """Start tracking the request of this thread. Returns its start time (perf_counter)."""
+        _request.counts = Counter()
+        return time.perf_counter()
+
+    def end_request(self, route, method, start):
+        """Record the request of this thread. Returns (duration in seconds, its counts)."""
+        seconds = time.perf_counter() - start
+        counts = getattr(_request, 'counts', None) or Counter()
+        _request.counts = None
+        key = (route, method)
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+            self._request_counts[key].update(counts)
+        return seconds, counts
+
+    def add_collector(self, name, help_text, func, metric_type='gauge'):
+        """
+        Add a metric read when rendering: func() returns a number, or a dict of
+        {label value: number} for a metric with a 'name' label (e.g. one per cache).
+        """
+        self._collectors.append((name, help_text, metric_type, func))
+
+    def render(self):
+        """All the metrics, in the Prometheus text exposition format."""
+        prefix = self.prefix
+        lines = []
+
+        def header(name, help_text, metric_type):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {metric_type}')
+
+        with self._lock:
+            requests = {key: list(histogram) for key, histogram in self._requests.items()}
+            request_counts = {key: Counter(counts) for key, counts in self._request_counts.items()}
+            counters = dict(self._counters)
+
+        header('request_duration_seconds', 'Request latency, per route.', 'histogram')
+        for (route, method), histogram in sorted(requests.items()):
+            labels = [('route', route), ('method', method)]
+            # Bucket counts are cumulative (a request counts in every bucket above its duration)
+            for bound, count in zip(self.buckets + (float('inf'),), histogram[:-1]):
+                lines.append(f'{prefix}_request_duration_seconds_bucket{_labels(labels + [("le", _number(bound))])} {count}')
+            lines.append(f'{prefix}_request_duration_seconds_sum{_labels(labels)} {_number(histogram[-1])}')
+            lines.append(f'{prefix}_request_duration_seconds_count{_labels(labels)} {histogram[-2]}')
+
+        names = sorted({name for counts in request_counts.values() for name in counts})
+        for name in names:
+            header(f'request_{name}_total', f'Total {name.replace("_", " ")} of the requests, per route.', 'counter')
+            for (route, method), counts in sorted(request_counts.items()):
+                lines.append(f'{prefix}_request_{name}_total{_labels([("route", route), ("method", method)])} {counts[name]}')
+
+        for name, value in sorted(counters.items()):
+            header(f'{name}_total', f'Total {name.replace("_", " ")}.', 'counter')
+            lines.append(f'{prefix}_{name}_total {_number(value)}')
+
+        for name, help_text, metric_type, func in self._collectors:
+            value = func()
+            header(name, help_text, metric_type)
+            if isinstance(value, dict):
+                for label, sample in value.items():
+                    if sample is not None:
+                        lines.append(f'{prefix}_{name}{_labels([("name", label)])} {_number(sample)}')
+            elif value is not None:
+                lines.append(f'{prefix}_{name} {_number(value)}')
+
+        header('uptime_seconds', 'Seconds since the process started.', 'gauge')
+        lines.append(f'{prefix}_uptime_seconds {_number(round(time.time() - self.started, 3))}')
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiles:
+    """
+    Keeps the cProfile stats (pstats files, see the pstats module or snakeviz) of the
+    slowest profiled requests in a directory: at most `keep` files, named
+    <milliseconds>ms-<method>-<route>-<time>-<pid>.pstats (faster profiles are dropped).
+    """
+
+    def __init__(self, directory, keep=10):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._kept = None  # [(seconds, path)], read from the directory on first use
+
+    def start(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile, route, method, seconds):
+        """Stop the profile, and save it if it is one of the `keep` slowest. Returns the path or None."""
+        profile.disable()
+        with self._lock:
+            if self._kept is None:
+                self._kept = self._read_kept()
+            if len(self._kept) >= self.keep and seconds <= self._kept[0][0]:
+                return None
+            slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+            path = os.path.join(self.directory, f'{seconds * 1000:09.1f}ms-{method}-{slug}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}.pstats')
+            os.makedirs(self.directory, exist_ok=True)
+            profile.dump_stats(path)
+            self._kept.append((seconds, path))
+            self._kept.sort()
+            while len(self._kept) > self.keep:
+                _seconds, old_path = self._kept.pop(0)
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+            return path
+
+    def _read_kept(self):
+        kept = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                match = re.match(r'(\d+(?:\.\d+)?)ms-.*\.pstats$', name)
+                if match:
+                    kept.append((float(match.group(1)) / 1000, os.path.join(self.directory, name)))
+        kept.sort()
+        return kept
+
+
+# The process-wide metrics
+metrics = Metrics()
@@ -1,21 +1,46 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+import itertools
 import math
+import time
 from models.item import Item
+from models.compiled import CompiledTree
+from models.catalog import get_catalog
+from models.report import ProductionReport, reports_match
+
+# Process-wide, so that a revision number identifies one state of one Project object
+_revisions = itertools.count(1)
+
+# Read-only view of a project at one revision, what the project page shows (see Project.snapshot)
+ProjectSnapshot = namedtuple('ProjectSnapshot', 'name dirty revision modified generation cards report')
 
 class Project:
-    def __init__(self, name="Untitled Project", items=None, dirty=False):
+    # When True, every production report is cross-checked against a full recompute
+    debug_report = False
+
+    def __init__(self, name="Untitled Project", items=None, dirty=False, version=0):
         self.name = name
         self.items = items or []  # List of top-level Item instances
         self.dirty = dirty  # True if unsaved changes exist
+        self.version = version  # Saved version, incremented by the storage on every save (0: never saved)
+        self.revision = next(_revisions)  # Changes with every edit and save (see touch)
+        self.modified = time.time()  # Time of the last edit or save
+        self._compiled = {}  # root item uuid -> CompiledTree
+        self._report = None  # ProductionReport, built on the first get_production_report()
+        self._snapshot = None  # Last ProjectSnapshot
+        self._nodes = {}  # uuid -> Item, for every node of the project
+        self._parents = {}  # uuid -> parent Item (None for top-level items)
+        for item in self.items:
+            self._index_tree(item, None)
 
     @staticmethod
     def load(project_id, project_cache, load_func):
-        if project_id in project_cache:
-            return project_cache[project_id]
+        project = project_cache.get(project_id)  # One lookup: the entry may be evicted meanwhile
+        if project is not None:
+            return project
         project = load_func(project_id)
         project.mark_clean()
-        project_cache[project_id] = project
-        return project
+        # A request that loaded the project meanwhile (and maybe edited it) wins over this copy
+        return project_cache.setdefault(project_id, project)
 
     def save(self, project_id, project_cache, save_func):
         save_func(self, project_id)
@@ -24,60 +49,318 @@ class Project:
 
     def add_item(self, item: Item):
         self.items.append(item)
+        self._index_tree(item, None)
+        self._update_report(added=item.walk())
         self.mark_dirty()
 
     def remove_item(self, item_uuid):
+        removed = [item for item in self.items if getattr(item, 'uuid', None) == item_uuid]
         self.items = [item for item in self.items if getattr(item, 'uuid', None) != item_uuid]
+        self._compiled.pop(item_uuid, None)
+        for item in removed:
+            self._unindex_tree(item)
+        self._update_report(removed=[node for item in removed for node in item.walk()])
         self.mark_dirty()
 
+    def _index_tree(self, item, parent):
+        # Add a sub-tree to the uuid maps (on duplicated uuids, the first node in tree order wins)
+        stack = [(item, parent)]
+        while stack:
+            node, node_parent = stack.pop()
+            if node.uuid not in self._nodes:
+                self._nodes[node.uuid] = node
+                self._parents[node.uuid] = node_parent
+            stack.extend((ing, node) for ing in reversed(node.ingredients))
+
+    def _unindex_tree(self, item):
+        for node in item.walk():
+            if self._nodes.get(node.uuid) is node:
+                del self._nodes[node.uuid]
+                del self._parents[node.uuid]
+
+    @property
+    def node_count(self):
+        """Number of nodes (all levels) of the project."""
+        return len(self._nodes)
+
+    def find_parent(self, uuid_str):
+        """Return the parent Item of a node (None for top-level items and unknown uuids)."""
+        return self._parents.get(uuid_str)
+
+    def root_of(self, uuid_str):
+        """Return the top-level Item containing a node, or None."""
+        item = self._nodes.get(uuid_str)
+        while item is not None:
+            parent = self._parents.get(item.uuid)
+            if parent is None:
+                return item
+            item = parent
+        return None
+
+    def check_consistency(self):
+        """
+        Compare the uuid maps with the actual trees and return the list of problems found
+        (empty if consistent): duplicated uuids, nodes missing from the maps, wrong
+        parents and entries of nodes that are no longer in the project.
+        """
+        problems = []
+        seen = set()
+        stack = [(item, None) for item in reversed(self.items)]
+        while stack:
+            node, parent = stack.pop()
+            if node.uuid in seen:
+                problems.append(f"Duplicate UUID {node.uuid} ({node.item_id})")
+            else:
+                seen.add(node.uuid)
+                if self._nodes.get(node.uuid) is not node:
+                    problems.append(f"UUID {node.uuid} ({node.item_id}) is not indexed")
+                elif self._parents.get(node.uuid) is not parent:
+                    problems.append(f"UUID {node.uuid} ({node.item_id}) has a wrong parent")
+            stack.extend((ing, node) for ing in reversed(node.ingredients))
+        for uuid_str in self._nodes:
+            if uuid_str not in seen:
+                problems.append(f"UUID {uuid_str} is indexed but not in the project")
+        return problems
+
+    def _update_report(self, removed=(), added=()):
+        # Apply the changes of some nodes to the running report (if already built)
+        if self._report is not None:
+            self._report.update(removed, added)
+
+    def compiled(self, root: Item):
+        """Return the (cached) CompiledTree of a top-level item."""
+        tree = self._compiled.get(root.uuid)
+        if tree is None or tree.nodes[0] is not root or tree.generation != get_catalog().generation:
+            tree = CompiledTree(root)
+            self._compiled[root.uuid] = tree
+        return tree
+
+    def invalidate_compiled(self, item_uuid=None):
+        """
+        Drop the compiled tree containing item_uuid (all of them if None).
+        Must be called after changing the structure of a tree (recipe, ingredients).
+        """
+        if item_uuid is None:
+            self._compiled.clear()
+            return
+        root = self.root_of(item_uuid)
+        if root is not None:
+            self._compiled.pop(root.uuid, None)
+
+    def touch(self):
+        """Record a change (new revision and modification time, used for the page ETag)."""
+        self.revision = next(_revisions)
+        self.modified = time.time()
+
     def mark_dirty(self):
         self.dirty = True
+        self.touch()
 
     def mark_clean(self):
         self.dirty = False
+        self.touch()
 
     def to_dict(self):
         return {
             "name": self.name,
             "items": [item.to_dict() for item in self.items],
-            "dirty": self.dirty
+            "dirty": self.dirty,
+            "version": self.version
         }
 
     @classmethod
     def from_dict(cls, data):
         items = [Item.from_dict(d) for d in data.get("items", [])]
-        return cls(name=data.get("name", "Untitled Project"), items=items, dirty=data.get("dirty", False))
+        return cls(name=data.get("name", "Untitled Project"), items=items, dirty=data.get("dirty", False),
+                   version=data.get("version", 0))
+
+    def copy(self):
+        """
+        Independent copy of the project (same uuids), e.g. to apply edits that may be
+        rejected. Its compiled trees and report are rebuilt on demand.
+        """
+        return Project.from_dict(self.to_dict())
 
     def rename(self, new_name):
         self.name = new_name
         self.mark_dirty()
 
     def change_rate(self, item_uuid, new_rate):
-        for item in self.items:
-            if getattr(item, 'uuid', None) == item_uuid:
-                item.update_rate(new_rate)  # propagate to children
-                self.mark_dirty()
-                break
+        """Set the rate of any item of the project and propagate it to its ingredients."""
+        tree, _idx = self._find_compiled(item_uuid)
+        if tree is None:
+            return
+        updated = tree.update_rate(new_rate, item_uuid)  # propagate to children
+        self._update_report(updated, updated)
+        self.mark_dirty()
+
+    def _find_compiled(self, item_uuid):
+        """Return (compiled tree, node index) of any item of the project, or (None, None)."""
+        root = self.root_of(item_uuid)
+        if root is None:
+            return None, None
+        tree = self.compiled(root)
+        return tree, tree.index[item_uuid]
+
+    def _recompute_extra(self, tree, idx):
+        # Base rate given by the parent (excluding extra_rate), or the current rate for a root
+        item = tree.nodes[idx]
+        parent_idx = tree.parent[idx]
+        ratio = tree.ratio[idx]
+        if parent_idx < 0 or ratio is None:
+            base_rate = item.rate
+        else:
+            base_rate = tree.nodes[parent_idx].rate * ratio
+        updated = tree.update_rate(base_rate, item.uuid)
+        self._update_report(updated, updated)
+
+    def set_extra_rate(self, item_uuid, value):
+        """Set the extra_rate of an item and recalculate the rates of its sub-tree."""
+        tree, idx = self._find_compiled(item_uuid)
+        if tree is None:
+            return None
+        item = tree.nodes[idx]
+        item.set_extra_rate(value)
+        self._recompute_extra(tree, idx)
+        self.mark_dirty()
+        return item
+
+    def set_use_extra_rate(self, item_uuid, value):
+        """Enable/disable the extra_rate of an item and recalculate the rates of its sub-tree."""
+        tree, idx = self._find_compiled(item_uuid)
+        if tree is None:
+            return None
+        item = tree.nodes[idx]
+        item.set_use_extra_rate(value)
+        self._recompute_extra(tree, idx)
+        self.mark_dirty()
+        return item
+
+    def item_changed(self, item: Item):
+        """
+        Call after modifying the fields of an item directly (rate, recipe...): drops its
+        compiled tree and updates its contribution to the production report.
+        """
+        self.invalidate_compiled(item.uuid)
+        self._update_report([item], [item])
+        self.mark_dirty()
+
+    def select_recipe(self, item_uuid, recipe_id):
+        """
+        Produce an item with another recipe ('__outsourced__' to outsource it).
+        Its ingredients are replaced by new outsourced items at the recipe rates.
+        """
+        item = self.find_item_by_uuid(item_uuid)
+        if not item:
+            return None
+        removed = list(item.walk())
+        for ing in item.ingredients:
+            self._unindex_tree(ing)
+        if recipe_id == '__outsourced__':
+            item.recipe_id = None
+            item.outsourced = True
+            item.ingredients = []
+        else:
+            item.select_recipe(recipe_id)
+            item.outsourced = False
+            # Populate ingredients from recipe
+            catalog = get_catalog()
+            recipe = catalog.get_recipe(recipe_id)
+            item.ingredients = []
+            if recipe:
+                # Parent rate * (ingredient rate / product rate)
+                main_rate = catalog.product_rate(recipe_id, item.item_id)
+                factor = item.rate / main_rate if main_rate else 1
+                for ing in recipe.get('ingredients', []):
+                    ing_rate = ing.get('rate', ing.get('amount', 1)) * factor
+                    # Create new Item for ingredient, default to outsourced
+                    new_ing = Item(
+                        item_id=ing['item'],
+                        rate=ing_rate,
+                        recipe_id=None,
+                        outsourced=True,
+                        ingredients=[]
+                    )
+                    item.ingredients.append(new_ing)
+        for ing in item.ingredients:
+            self._index_tree(ing, item)
+        self.invalidate_compiled(item_uuid)
+        self._update_report(removed, item.walk())
+        self.mark_dirty()
+        return item
 
     def find_item_by_uuid(self, uuid_str):
-        for item in self.items:
-            found = item.find_by_uuid(uuid_str)
-            if found:
-                return found
+        return self._nodes.get(uuid_str)
+
+    def snapshot(self):
+        """
+        Return the top-level cards and the production report of the project at its
+        current revision, as a ProjectSnapshot (built once per revision).
+        Card dicts are never modified (an edit builds new cards for the changed nodes, see
+        Item.to_card_dict), so a snapshot stays consistent while the project is edited and
+        can be rendered without holding the project lock. Building one walks the tree:
+        the caller must hold the project lock (see ProjectLocks).
+        """
+        snapshot = self.current_snapshot()
+        if snapshot is None:
+            catalog = get_catalog()
+            item_names = catalog.item_names
+            resource_names = catalog.resource_names
+            cards = tuple(item.to_card_dict(item_names, None, resource_names, include_extra_products=True) for item in self.items)
+            report = self.get_production_report(item_names=item_names, resource_ids=set(catalog.resource_ids), resource_names=resource_names)
+            snapshot = self._snapshot = ProjectSnapshot(
+                self.name, self.dirty, self.revision, self.modified, catalog.generation, cards, report
+            )
+        return snapshot
+
+    def current_snapshot(self):
+        """The last snapshot if the project did not change since, else None (no lock needed)."""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.revision == self.revision and snapshot.generation == get_catalog().generation:
+            return snapshot
         return None
 
-    def get_production_report(self, item_names=None, resource_ids=None):
+    def get_production_report(self, item_names=None, resource_ids=None, resource_names=None):
         """
         Returns a dict with:
             - total_power: float
             - machines: {machine_name: {count, power}}
             - items: {item_id: {name, rate, type}}
+        The totals are kept up to date by the project's mutation methods (see
+        ProductionReport), so this does not walk the tree. Only the first call (or a
+        call with other resource_ids / after a catalog reload) builds them.
+        """
+        if item_names is None:
+            item_names = Item.all_items()
+        if resource_ids is None:
+            resource_ids = set()
+        if resource_names is None:
+            resource_names = getattr(self, 'resource_names', {})
+        catalog = get_catalog()
+        report = self._report
+        if report is None or report.generation != catalog.generation or report.resource_ids != resource_ids:
+            report = self._report = ProductionReport(resource_ids, catalog)
+            report.update(added=[node for item in self.items for node in item.walk()], catalog=catalog)
+        result = report.to_dict({item.item_id for item in self.items}, item_names, resource_names)
+        if self.debug_report:
+            expected = self.compute_production_report(item_names, resource_ids, resource_names)
+            if not reports_match(expected, result):
+                print(f"Warning: production report of '{self.name}' is out of sync with its items, rebuilding it")
+                self._report = None
+                return expected
+        return result
+
+    def compute_production_report(self, item_names=None, resource_ids=None, resource_names=None):
+        """
+        Build the production report with a full walk of the project (same result as
+        get_production_report, used to cross-check the running totals).
         """
         if item_names is None:
             item_names = Item.all_items()
         if resource_ids is None:
             resource_ids = set()
-        resource_names = getattr(self, 'resource_names', {})
+        if resource_names is None:
+            resource_names = getattr(self, 'resource_names', {})
         total_power = 0.0
         machines = defaultdict(lambda: {'count': 0.0, 'power': 0.0})
         items = {}
@@ -91,7 +374,7 @@ class Project:
             if item_type == 'resource':
                 return (item_id, 'resource')
             return (item_id, item_type)
-        def walk(item, parent_type=None, is_root=False):
+        def walk(item, card, parent_type=None):
             nonlocal total_power
             if item.item_id in project_root_ids:
                 item_type = 'project'
@@ -116,7 +399,6 @@ class Project:
                     'type': item_type
                 }
             items[key]['rate'] += item.rate
-            card = item.to_card_dict(item_names, None, resource_names, include_extra_products=is_root)
             if card.get('machine_name') and card.get('num_machines') and card.get('total_power'):
                 mname = card['machine_name']
                 n_machines = math.ceil(card['num_machines'])
@@ -135,10 +417,11 @@ class Project:
                         'type': 'byproduct'
                     }
                 items[byp_key]['rate'] += byp['rate']
-            for ing in getattr(item, 'ingredients', []):
-                walk(ing, parent_type=item_type, is_root=False)
+            # The card of a node already holds the cards of its ingredients (built once per sub-tree)
+            for ing, ing_card in zip(getattr(item, 'ingredients', []), card['ingredients']):
+                walk(ing, ing_card, parent_type=item_type)
         for item in self.items:
-            walk(item, is_root=True)
+            walk(item, item.to_card_dict(item_names, None, resource_names, include_extra_products=True))
         # Flatten items for output
         flat_items = {}
         for (iid, typ), val in items.items():
@@ -0,0 +1,157 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+def estimate_project_size(project):
+    """
+    Approximate memory used by a project, in bytes: its Item objects (attributes,
+    ingredient lists, uuids) and their cached cards. Strings shared with the game data
+    (item and recipe ids) are not counted.
+    """
+    size = sys.getsizeof(project) + sys.getsizeof(project.items)
+    for root in project.items:
+        for item in root.walk():
+            size += sys.getsizeof(item) + sys.getsizeof(item.ingredients) + sys.getsizeof(item.uuid)
+            if hasattr(item, '__dict__'):
+                size += sys.getsizeof(item.__dict__)
+            card = getattr(item, '_card', None)
+            if card is not None:
+                size += sys.getsizeof(card[4])
+    return size
+
+
+class ProjectCache:
+    """
+    In-memory cache of the open projects (keyed by project_id), bounded both in number
+    of entries and in (approximate) bytes. When over a limit, clean projects are evicted
+    in least-recently-used order: they can be loaded again from disk. Dirty projects
+    (unsaved changes) are pinned and never evicted, so the cache may temporarily exceed
+    its limits if they are all dirty.
+
+    Supports the dict operations used by Project.load / Project.save (get, setdefault,
+    []=) plus in / [] / pop, and counts hits, misses and evictions (see stats()).
+
+    The size of a project is estimated (a walk of its tree) when it is added. When the
+    same project is stored again after an edit (every Project.save), its size is only
+    scaled to its new node count (project.node_count): single edits stay O(1).
+
+    With several worker processes, validate(project_id, project) is called on every
+    lookup of a clean project: if it returns False (saved since by another worker), the
+    copy is dropped and the lookup misses, so that the project is loaded again. Dirty
+    projects are kept: saving them fails with a version conflict instead.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=64 * 1024 * 1024, size_func=estimate_project_size, validate=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_func = size_func
+        self.validate = validate
+        self._entries = OrderedDict()  # project_id -> (project, size, node count), least recently used first
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, project_id):
+        with self._lock:
+            found = project_id in self._entries and self._is_valid(project_id)
+            if not found:
+                self.misses += 1
+            return found
+
+    def _is_valid(self, project_id):
+        project, size, _nodes = self._entries[project_id]
+        if self.validate is None or getattr(project, 'dirty', False) or self.validate(project_id, project):
+            return True
+        del self._entries[project_id]
+        self._bytes -= size
+        self.stale += 1
+        return False
+
+    def __getitem__(self, project_id):
+        with self._lock:
+            project, _size, _nodes = self._entries[project_id]
+            self._entries.move_to_end(project_id)
+            self.hits += 1
+            return project
+
+    def get(self, project_id, default=None):
+        with self._lock:
+            if project_id not in self._entries or not self._is_valid(project_id):
+                self.misses += 1
+                return default
+            return self[project_id]
+
+    def __setitem__(self, project_id, project):
+        """Add or refresh a project, then evict if needed."""
+        nodes = getattr(project, 'node_count', None)
+        with self._lock:
+            entry = self._entries.get(project_id)
+        if entry is not None and entry[0] is project and nodes is not None and entry[2]:
+            # Same project, edited: scale its size with the node count instead of walking it
+            size = entry[1] if nodes == entry[2] else entry[1] * nodes // entry[2]
+        else:
+            size = self.size_func(project)
+        with self._lock:
+            if project_id in self._entries:
+                self._bytes -= self._entries[project_id][1]
+            self._entries[project_id] = (project, size, nodes)
+            self._entries.move_to_end(project_id)
+            self._bytes += size
+            self._evict()
+
+    def setdefault(self, project_id, project):
+        """
+        Add a project just loaded unless project_id is already cached (loaded, and maybe
+        edited, by another request meanwhile), then evict if needed. Returns the cached project.
+        """
+        size = self.size_func(project)
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is not None:
+                self._entries.move_to_end(project_id)
+                return entry[0]
+            self._entries[project_id] = (project, size, getattr(project, 'node_count', None))
+            self._bytes += size
+            self._evict()
+            return project
+
+    def pop(self, project_id, default=None):
+        with self._lock:
+            entry = self._entries.pop(project_id, None)
+            if entry is None:
+                return default
+            self._bytes -= entry[1]
+            return entry[0]
+
+    def _evict(self):
+        # Oldest clean projects first; dirty ones are skipped (pinned)
+        for project_id in list(self._entries):
+            if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            project, size, _nodes = self._entries[project_id]
+            if getattr(project, 'dirty', False):
+                continue
+            del self._entries[project_id]
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'dirty': sum(1 for project, _size, _nodes in self._entries.values() if getattr(project, 'dirty', False)),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'stale': self.stale,
+            }
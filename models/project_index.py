@@ -0,0 +1,168 @@
+import atexit
+import json
+import os
+import threading
+import time
+from models.catalog import get_catalog
+
+PROJECTS_DIR = os.path.join(os.path.dirname(__file__), '../projects')
+INDEX_FILENAME = 'index.json'
+# Number of machines (by power) kept in the summary of a project
+TOP_MACHINES = 3
+# Page ETags reconcile the entries with the storage at most this often (seconds)
+RECONCILE_INTERVAL = 2.0
+# index.json is rewritten at most this often (seconds) after saves (see _changed)
+WRITE_INTERVAL = 5.0
+
+
+class ProjectIndex:
+    """
+    Small catalog of the saved projects, stored as projects/index.json:
+        project_id -> {name, mtime_ns, size, nodes, total_power, top_machines}
+    so that listing projects does not parse every project.
+    Entries are updated when the app saves or deletes a project, and reconciled with
+    the storage (by mtime/size, see JsonStorage.stat) on every listing, so that projects
+    added, edited or removed outside the app are picked up. The entries describe the
+    saved projects: unsaved changes (e.g. a rename not saved yet) show up once saved.
+
+    index.json is only a cache of the entries between runs: it is rewritten at most
+    once per write_interval (and when listing, and at exit). A lost write only costs a
+    new summary of the projects whose stamps changed since.
+    """
+
+    def __init__(self, storage, path=None, reconcile_interval=RECONCILE_INTERVAL, write_interval=WRITE_INTERVAL):
+        self.storage = storage  # JsonStorage or SqliteStorage (see models/storage.py)
+        self.path = path or os.path.join(PROJECTS_DIR, INDEX_FILENAME)
+        self.reconcile_interval = reconcile_interval
+        self.write_interval = write_interval
+        self._lock = threading.Lock()
+        self._entries = self._read()
+        self._reconciled = float('-inf')  # time.monotonic() of the last reconcile
+        self._written = float('-inf')  # time.monotonic() of the last write of index.json
+        self._unwritten = False  # Entries changed since the last write
+        self.revision = 0  # Incremented whenever the entries change
+        atexit.register(self.flush)
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        self._written = time.monotonic()
+        self._unwritten = False
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'  # Workers may share the index
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def _changed(self):
+        """The entries changed: new revision, index.json written unless written recently."""
+        self.revision += 1
+        self._unwritten = True
+        if time.monotonic() - self._written >= self.write_interval:
+            self._write()
+
+    def flush(self):
+        """Write index.json if the entries changed since it was last written."""
+        with self._lock:
+            if self._unwritten:
+                self._write()
+
+    @staticmethod
+    def summarize(project):
+        """Return the cached summary of a project: node count, total MW and top machines."""
+        catalog = get_catalog()
+        report = project.get_production_report(item_names=catalog.item_names, resource_ids=set(catalog.resource_ids))
+        machines = sorted(report['machines'].items(), key=lambda m: m[1]['power'], reverse=True)
+        return {
+            'name': project.name,
+            'nodes': project.node_count,
+            'total_power': report['total_power'],
+            'top_machines': [[name, m['count'], m['power']] for name, m in machines[:TOP_MACHINES]],
+        }
+
+    def _entry(self, project_id, stamp, project=None):
+        entry = {'mtime_ns': stamp[0], 'size': stamp[1]}
+        try:
+            entry.update(self.summarize(project or self.storage.load(project_id)))
+        except Exception:
+            entry['corrupt'] = True
+        return entry
+
+    def _reconcile(self):
+        self._reconciled = time.monotonic()
+        changed = False
+        seen = set()
+        for project_id in self.storage.project_ids():
+            stamp = self.storage.stat(project_id)
+            if stamp is None:
+                continue
+            seen.add(project_id)
+            entry = self._entries.get(project_id)
+            if entry and (entry.get('mtime_ns'), entry.get('size')) == tuple(stamp):
+                continue
+            self._entries[project_id] = self._entry(project_id, stamp)
+            changed = True
+        for project_id in list(self._entries):
+            if project_id not in seen:
+                del self._entries[project_id]
+                changed = True
+        return changed
+
+    def list_projects(self):
+        """
+        Return [{id, name, nodes, total_power, top_machines}] for every saved project,
+        in directory order (corrupt files get a placeholder name).
+        """
+        with self._lock:
+            if self._reconcile():
+                self._changed()
+            if self._unwritten:
+                self._write()
+            projects = []
+            for project_id in self.storage.project_ids():
+                entry = self._entries.get(project_id)
+                if entry is None:
+                    continue
+                if entry.get('corrupt'):
+                    projects.append({'id': project_id, 'name': f"(corrupt or missing) {project_id}"})
+                else:
+                    projects.append({
+                        'id': project_id,
+                        'name': entry['name'],
+                        'nodes': entry.get('nodes'),
+                        'total_power': entry.get('total_power'),
+                        'top_machines': entry.get('top_machines', []),
+                    })
+            return projects
+
+    def current_revision(self):
+        """
+        Revision of the entries, for the page ETags. The app's own saves and deletes bump
+        it right away; changes made outside the app (other workers, files copied in) are
+        picked up by reconciling with the storage, which stats every project: done at most
+        once per reconcile_interval, so that a page view doesn't cost O(projects).
+        """
+        with self._lock:
+            if time.monotonic() - self._reconciled >= self.reconcile_interval and self._reconcile():
+                self._changed()
+            return self.revision
+
+    def update(self, project_id, project):
+        """Record a project that was just saved to disk."""
+        with self._lock:
+            stamp = self.storage.stat(project_id)
+            if stamp is None:
+                return
+            self._entries[project_id] = self._entry(project_id, stamp, project)
+            self._changed()
+
+    def remove(self, project_id):
+        """Forget a deleted project."""
+        with self._lock:
+            if self._entries.pop(project_id, None) is not None:
+                self._changed()
@@ -0,0 +1,43 @@
+import threading
+from contextlib import contextmanager
+
+
+class ProjectLocks:
+    """
+    One writer lock per project (keyed by project_id).
+
+    Requests that edit a project (and the write-behind saves) hold its lock, so edits
+    of one project are serialized while other projects are edited in parallel. Readers
+    don't take it: they render the project's last snapshot (see Project.snapshot),
+    and only wait for the lock to build a new snapshot after an edit.
+    The locks are reentrant: a request holding one can save the project.
+
+    A lock exists only while it is held or waited for (hold() counts its users): it is
+    dropped when the last one leaves. Deleting a project needs no cleanup, and a request
+    still waiting on the lock of a project being deleted shares that lock with the
+    requests arriving meanwhile.
+    """
+
+    def __init__(self):
+        self._locks = {}  # project_id -> [RLock, holders and waiters]
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, project_id):
+        """Hold the lock of project_id (with project_locks.hold(project_id): ...)."""
+        with self._guard:
+            entry = self._locks.get(project_id)
+            if entry is None:
+                entry = self._locks[project_id] = [threading.RLock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[project_id]
+
+    def __len__(self):
+        return len(self._locks)
@@ -0,0 +1,160 @@
+import math
+from models.catalog import get_catalog
+from models.item import Item
+
+
+class ProductionReport:
+    """
+    Running aggregates of a project's production report.
+
+    Every node of the project contributes to the report independently of the rest of
+    the tree (rate of its item, machines and byproducts), so the totals are kept as sums
+    of per-node contributions: editing a sub-tree only removes the old contributions of
+    the affected nodes and adds the new ones (signed deltas) instead of walking the
+    whole project again.
+
+    Items are aggregated per (item_id, kind) with kind in resource / outsourced /
+    intermediate / byproduct; the 'project' type depends on the current top-level
+    items and is resolved when the report is read.
+    """
+
+    def __init__(self, resource_ids, catalog=None):
+        catalog = catalog or get_catalog()
+        self.generation = catalog.generation
+        self.resource_ids = frozenset(resource_ids)
+        self.total_power = 0.0
+        self.machines = {}  # machine name -> [count, power, number of nodes]
+        self.items = {}  # (item_id, kind) -> [rate, number of contributions]
+        self._contributions = {}  # Item -> contribution (see _contribution)
+
+    def __contains__(self, item):
+        return item in self._contributions
+
+    def _contribution(self, item, catalog):
+        """
+        Return (kind, rate, machine, byproducts) for one node, with the same rules as
+        Item.to_card_dict: machine is (name, count, power) or None, byproducts is a
+        tuple of (item_id, rate).
+        """
+        if item.item_id in self.resource_ids:
+            kind = 'resource'
+        elif getattr(item, 'outsourced', False):
+            kind = 'outsourced'
+        else:
+            kind = 'intermediate'
+        machine = None
+        byproducts = ()
+        recipe = catalog.get_recipe(item.recipe_id) if item.recipe_id else None
+        if recipe:
+            power_use = recipe.get('power_use')
+            prod_rate = catalog.product_rate(item.recipe_id, item.item_id)
+            num_machines = None
+            if prod_rate and power_use:
+                num_machines = round(item.rate / prod_rate, 2)
+                machine_name = Item.get_machine_name(recipe.get('machine')) if recipe.get('machine') else None
+                if machine_name and num_machines and round(num_machines * power_use, 2):
+                    count = math.ceil(num_machines)
+                    machine = (machine_name, count, count * power_use)
+            byproducts = tuple(
+                (prod['item'], (round(prod['rate'] * num_machines, 2) if num_machines else prod.get('rate')) or 0.0)
+                for prod in recipe.get('products', [])
+                if prod['item'] != item.item_id
+            )
+        return kind, item.rate, machine, byproducts
+
+    def _add_item_rate(self, key, rate, sign):
+        entry = self.items.get(key)
+        if entry is None:
+            entry = self.items[key] = [0.0, 0]
+        entry[0] += sign * rate
+        entry[1] += sign
+
+    def _apply(self, item_id, contribution, sign):
+        kind, rate, machine, byproducts = contribution
+        self._add_item_rate((item_id, kind), rate, sign)
+        if machine:
+            name, count, power = machine
+            entry = self.machines.get(name)
+            if entry is None:
+                entry = self.machines[name] = [0, 0.0, 0]
+            entry[0] += sign * count
+            entry[1] += sign * power
+            entry[2] += sign
+            self.total_power += sign * power
+        for byp_id, byp_rate in byproducts:
+            self._add_item_rate((byp_id, 'byproduct'), byp_rate, sign)
+
+    def _purge(self):
+        # Entries are only dropped once all deltas are applied, so that an entry
+        # which is removed then added back keeps its place in the report.
+        for key in [key for key, entry in self.items.items() if not entry[1]]:
+            del self.items[key]
+        for name in [name for name, entry in self.machines.items() if not entry[2]]:
+            del self.machines[name]
+
+    def update(self, removed=(), added=(), catalog=None):
+        """
+        Remove the contributions of the nodes in removed, then add the ones of the nodes
+        in added (ingredients are not included: pass every affected node).
+        """
+        catalog = catalog or get_catalog()
+        for item in removed:
+            contribution = self._contributions.pop(item, None)
+            if contribution is not None:
+                self._apply(item.item_id, contribution, -1)
+        for item in added:
+            contribution = self._contribution(item, catalog)
+            self._contributions[item] = contribution
+            self._apply(item.item_id, contribution, 1)
+        self._purge()
+
+    def refresh(self, items, catalog=None):
+        """Replace the contributions of nodes whose rate, recipe or flags changed."""
+        items = list(items)
+        self.update(items, items, catalog)
+
+    def to_dict(self, root_ids, item_names, resource_names):
+        """Return the report in the format of Project.get_production_report."""
+        items = {}
+        for (item_id, kind), (rate, _count) in self.items.items():
+            if kind != 'byproduct' and item_id in root_ids:
+                kind = 'project'
+            key = f'{item_id}__{kind}'
+            if key in items:
+                items[key]['rate'] += rate
+                continue
+            name = item_names.get(item_id, item_id)
+            if kind == 'resource' and item_id in resource_names:
+                name = resource_names[item_id]
+            elif kind == 'byproduct' and item_id in resource_names:
+                name = resource_names[item_id] + ' (byproduct)'
+            items[key] = {'name': name, 'rate': rate, 'type': kind}
+        return {
+            'total_power': round(self.total_power, 2),
+            'machines': {k: {'count': int(v[0]), 'power': round(v[1], 2)} for k, v in self.machines.items()},
+            'items': items
+        }
+
+
+def reports_match(expected, actual, tolerance=1e-6):
+    """
+    Compare two production reports, allowing for float rounding differences (power
+    figures are rounded to 2 decimals, so they may differ by one unit in the last place).
+    """
+    def close(a, b, slack=0.0):
+        return abs(a - b) <= tolerance * max(1.0, abs(a), abs(b)) + slack
+    if not close(expected['total_power'], actual['total_power'], 0.01):
+        return False
+    if expected['machines'].keys() != actual['machines'].keys():
+        return False
+    for name, machine in expected['machines'].items():
+        other = actual['machines'][name]
+        if machine['count'] != other['count'] or not close(machine['power'], other['power'], 0.01):
+            return False
+    if expected['items'].keys() != actual['items'].keys():
+        return False
+    for key, entry in expected['items'].items():
+        other = actual['items'][key]
+        if entry['name'] != other['name'] or entry['type'] != other['type'] or not close(entry['rate'], other['rate']):
+            return False
+    return True
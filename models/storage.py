@@ -0,0 +1,389 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from models import binary_format
+from models.item import Item
+from models.project import Project
+
+try:
+    import fcntl  # File locks (POSIX only)
+except ImportError:
+    fcntl = None
+
+PROJECTS_DIR = os.path.join(os.path.dirname(__file__), '../projects')
+DEFAULT_DB_PATH = os.path.join(PROJECTS_DIR, 'projects.db')
+
+
+def _fsync_dir(path):
+    # Make a rename durable (not supported on Windows, where it is not needed)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class VersionConflict(Exception):
+    """
+    A project was saved by someone else (another worker) since it was loaded: saving
+    it would overwrite their edits. The copy being saved must be dropped and reloaded.
+    """
+
+    def __init__(self, project_id, expected, stored):
+        super().__init__(f"Project {project_id} was changed by another session "
+                         f"(version {stored} saved, {expected} expected)")
+        self.project_id = project_id
+        self.expected = expected
+        self.stored = stored
+
+
+def read_project_file(path):
+    """Load a project file, either JSON or binary (detected by its magic bytes)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if binary_format.is_binary(data):
+        return binary_format.loads(data)
+    return Project.from_dict(json.loads(data.decode('utf-8')))
+
+
+class JsonStorage:
+    """
+    Projects stored as projects/project_<id>.json (one file per project).
+    Files are written as indented JSON, or with file_format='binary' in the compact
+    binary encoding of models/binary_format.py (same file name). Both are read back
+    whatever the file_format, so a directory can mix the two.
+
+    Saves are checked against the version stored in the file (optimistic concurrency,
+    see VersionConflict). The version of the files this storage loaded or saved is
+    remembered with their identity (inode, mtime, size), so the check only parses the
+    file when it was replaced by someone else. With lock=True, the check and the write
+    are done under an exclusive lock on project_<id>.json.lock, so that two processes
+    can't both pass the check before either writes.
+    """
+    name = 'json'
+    FILE_FORMATS = ('json', 'binary')
+
+    def __init__(self, projects_dir=PROJECTS_DIR, file_format='json', lock=False):
+        if file_format not in self.FILE_FORMATS:
+            raise ValueError(f"Unknown project file format '{file_format}' (expected 'json' or 'binary')")
+        if lock and fcntl is None:
+            raise ValueError("Project file locks are not supported on this platform")
+        self.projects_dir = projects_dir
+        self.file_format = file_format
+        self.lock = lock
+        self._save_lock = threading.Lock()  # Check + write of the threads of this process
+        self._known = {}  # project_id -> (file identity, version) as last loaded / saved here
+        os.makedirs(projects_dir, exist_ok=True)
+
+    def __reduce__(self):
+        # Pickled as its settings (e.g. sent to worker processes), not its locks and state
+        return (JsonStorage, (self.projects_dir, self.file_format, self.lock))
+
+    def path(self, project_id):
+        return os.path.join(self.projects_dir, f'project_{project_id}.json')
+
+    def project_ids(self):
+        for fname in os.listdir(self.projects_dir):
+            if fname.startswith('project_') and fname.endswith('.json'):
+                yield fname[len('project_'):-len('.json')]
+
+    def stat(self, project_id):
+        """Return (mtime_ns, size) of a saved project, or None if it does not exist."""
+        try:
+            st = os.stat(self.path(project_id))
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _identity(self, project_id):
+        # Every save replaces the file (new inode), so this changes on each save
+        try:
+            st = os.stat(self.path(project_id))
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def exists(self, project_id):
+        return os.path.exists(self.path(project_id))
+
+    def load(self, project_id):
+        identity = self._identity(project_id)
+        project = read_project_file(self.path(project_id))
+        self._known[project_id] = (identity, project.version)
+        return project
+
+    def is_current(self, project_id, project):
+        """True if project is the latest saved version (the file was not replaced since)."""
+        known = self._known.get(project_id)
+        return known is not None and known[1] == project.version and known[0] == self._identity(project_id)
+
+    def stored_version(self, project_id):
+        """Version of the saved project (None if it does not exist)."""
+        identity = self._identity(project_id)
+        if identity is None:
+            return None
+        known = self._known.get(project_id)
+        if known is not None and known[0] == identity:
+            return known[1]
+        return read_project_file(self.path(project_id)).version
+
+    @contextlib.contextmanager
+    def _locked(self, project_id):
+        with self._save_lock:
+            if not self.lock:
+                yield
+                return
+            with open(self.path(project_id) + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def save(self, project, project_id):
+        """Write the project as its next version (raises VersionConflict if it is outdated)."""
+        with self._locked(project_id):
+            stored = self.stored_version(project_id)
+            if stored is not None and stored != project.version:
+                raise VersionConflict(project_id, project.version, stored)
+            project.version += 1
+            try:
+                self._write(project, project_id)
+            except BaseException:
+                project.version -= 1
+                raise
+            self._known[project_id] = (self._identity(project_id), project.version)
+
+    def _write(self, project, project_id):
+        # Write a temp file then rename it over the project: a crash never leaves a
+        # truncated project behind
+        path = self.path(project_id)
+        tmp_path = f'{path}.{os.getpid()}.tmp'  # Per process: other workers may save it too
+        if self.file_format == 'binary':
+            with open(tmp_path, 'wb') as f:
+                f.write(binary_format.dumps(project))
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(project.to_dict(), f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(self.projects_dir)
+
+    def delete(self, project_id):
+        """Delete a saved project. Returns False if it did not exist."""
+        if not self.exists(project_id):
+            return False
+        os.remove(self.path(project_id))
+        self._known.pop(project_id, None)
+        return True
+
+
+class SqliteStorage:
+    """
+    Projects stored in one SQLite database (WAL mode), one row per Item node with a
+    link to its parent node. Saving a project only writes the nodes that changed since
+    it was last loaded/saved (compared with a snapshot of the persisted rows), in a
+    single transaction. The version of the project is checked and incremented in the
+    same transaction (see VersionConflict).
+    """
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS projects (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            updated_ns INTEGER NOT NULL,
+            node_count INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        -- rate / extra_rate are declared without a type so that ints stay ints
+        -- (the JSON export then matches the original files)
+        CREATE TABLE IF NOT EXISTS nodes (
+            project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+            node_key TEXT NOT NULL,
+            parent_key TEXT,
+            position INTEGER NOT NULL,
+            item_id TEXT,
+            rate,
+            recipe_id TEXT,
+            outsourced INTEGER NOT NULL,
+            uuid TEXT,
+            extra_rate,
+            use_extra_rate INTEGER NOT NULL,
+            PRIMARY KEY (project_id, node_key)
+        );
+        CREATE INDEX IF NOT EXISTS nodes_by_parent ON nodes (project_id, parent_key, position);
+    """
+    NODE_COLUMNS = ('parent_key', 'position', 'item_id', 'rate', 'recipe_id', 'outsourced',
+                    'uuid', 'extra_rate', 'use_extra_rate')
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._snapshots = {}  # project_id -> (version, {node_key: row}) as last persisted
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(projects)')]
+            if 'version' not in columns:  # Database created before project versions
+                conn.execute('ALTER TABLE projects ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+    def __reduce__(self):
+        # Pickled as its database path (e.g. sent to worker processes), not its connections
+        return (SqliteStorage, (self.db_path,))
+
+    def _connect(self):
+        # One connection per thread (sqlite3 connections can't be shared by default)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _rows(project):
+        """Return {node_key: row} for all nodes of a project (row as in NODE_COLUMNS)."""
+        rows = {}
+        stack = [(item, None, position) for position, item in reversed(list(enumerate(project.items)))]
+        while stack:
+            item, parent_key, position = stack.pop()
+            node_key = item.uuid
+            # Keys must be unique: duplicated uuids get a suffix (in tree order)
+            n = 1
+            while node_key in rows:
+                n += 1
+                node_key = f'{item.uuid}#{n}'
+            rows[node_key] = (
+                parent_key, position, item.item_id, item.rate, item.recipe_id, int(bool(item.outsourced)),
+                item.uuid, item.extra_rate, int(bool(item.use_extra_rate))
+            )
+            for child_position in range(len(item.ingredients) - 1, -1, -1):
+                stack.append((item.ingredients[child_position], node_key, child_position))
+        return rows
+
+    def project_ids(self):
+        return [row[0] for row in self._connect().execute('SELECT id FROM projects ORDER BY rowid')]
+
+    def stat(self, project_id):
+        row = self._connect().execute(
+            'SELECT updated_ns, node_count FROM projects WHERE id = ?', (project_id,)).fetchone()
+        return tuple(row) if row else None
+
+    def exists(self, project_id):
+        return self.stat(project_id) is not None
+
+    def stored_version(self, project_id):
+        """Version of the saved project (None if it does not exist)."""
+        row = self._connect().execute('SELECT version FROM projects WHERE id = ?', (project_id,)).fetchone()
+        return row[0] if row else None
+
+    def is_current(self, project_id, project):
+        """True if project is the latest saved version."""
+        return self.stored_version(project_id) == project.version
+
+    def load(self, project_id):
+        conn = self._connect()
+        project_row = conn.execute('SELECT name, version FROM projects WHERE id = ?', (project_id,)).fetchone()
+        if project_row is None:
+            raise FileNotFoundError(f'Project {project_id} not found in {self.db_path}')
+        columns = ', '.join(('node_key',) + self.NODE_COLUMNS)
+        rows = {}
+        children = {}
+        for row in conn.execute(f'SELECT {columns} FROM nodes WHERE project_id = ? ORDER BY position', (project_id,)):
+            node_key, row = row[0], tuple(row[1:])
+            rows[node_key] = row
+            children.setdefault(row[0], []).append(node_key)
+        items = {}
+        for node_key, (_parent, _position, item_id, rate, recipe_id, outsourced, uuid_str, extra_rate, use_extra_rate) in rows.items():
+            items[node_key] = Item(item_id, rate, recipe_id, bool(outsourced), None, uuid_str,
+                                   extra_rate, bool(use_extra_rate))
+        for parent_key, keys in children.items():
+            if parent_key is not None and parent_key in items:
+                items[parent_key].ingredients = [items[key] for key in keys]
+        project = Project(name=project_row[0], items=[items[key] for key in children.get(None, [])],
+                          version=project_row[1])
+        with self._lock:
+            self._snapshots[project_id] = (project_row[1], rows)
+        return project
+
+    def save(self, project, project_id):
+        """
+        Write the project as its next version, touching only the node rows that changed
+        (raises VersionConflict if it is outdated).
+        """
+        rows = self._rows(project)
+        with self._lock:
+            snapshot_version, old_rows = self._snapshots.get(project_id, (None, None))
+        updated_ns = time.time_ns()
+        version = project.version + 1
+        conn = self._connect()
+        with conn:  # One transaction
+            # Conditional update first: it takes the write lock, so the version can't
+            # change before the transaction commits
+            updated = conn.execute(
+                'UPDATE projects SET name = ?, updated_ns = ?, node_count = ?, version = ? '
+                'WHERE id = ? AND version = ?',
+                (project.name, updated_ns, len(rows), version, project_id, project.version)).rowcount
+            if not updated:
+                stored = conn.execute('SELECT version FROM projects WHERE id = ?', (project_id,)).fetchone()
+                if stored is not None:
+                    raise VersionConflict(project_id, project.version, stored[0])
+                conn.execute(
+                    'INSERT INTO projects (id, name, updated_ns, node_count, version) VALUES (?, ?, ?, ?, ?)',
+                    (project_id, project.name, updated_ns, len(rows), version))
+            if old_rows is None or not updated or snapshot_version != project.version:
+                # Unknown rows in the database (first save, or loaded another version): rewrite
+                conn.execute('DELETE FROM nodes WHERE project_id = ?', (project_id,))
+                old_rows = {}
+            removed = [(project_id, key) for key in old_rows if key not in rows]
+            if removed:
+                conn.executemany('DELETE FROM nodes WHERE project_id = ? AND node_key = ?', removed)
+            changed = [(project_id, key) + row for key, row in rows.items() if old_rows.get(key) != row]
+            if changed:
+                placeholders = ', '.join('?' * (len(self.NODE_COLUMNS) + 2))
+                columns = ', '.join(('project_id', 'node_key') + self.NODE_COLUMNS)
+                conn.executemany(f'INSERT OR REPLACE INTO nodes ({columns}) VALUES ({placeholders})', changed)
+        with self._lock:
+            self._snapshots[project_id] = (version, rows)
+        project.version = version
+        return len(changed) + len(removed)
+
+    def delete(self, project_id):
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM nodes WHERE project_id = ?', (project_id,))
+            deleted = conn.execute('DELETE FROM projects WHERE id = ?', (project_id,)).rowcount
+        with self._lock:
+            self._snapshots.pop(project_id, None)
+        return bool(deleted)
+
+
+def get_storage():
+    """
+    Return the storage backend selected by the PROJECT_STORAGE environment variable:
+    'json' (default) or 'sqlite' (database path in PROJECT_DB, default projects/projects.db).
+    With 'json', PROJECT_FILE_FORMAT selects how project files are written: 'json'
+    (default) or 'binary', and PROJECT_FILE_LOCK=1 locks the project files while saving
+    (for several worker processes, see JsonStorage).
+    """
+    backend = os.environ.get('PROJECT_STORAGE', 'json').lower()
+    if backend == 'sqlite':
+        return SqliteStorage(os.environ.get('PROJECT_DB', DEFAULT_DB_PATH))
+    if backend != 'json':
+        raise ValueError(f"Unknown PROJECT_STORAGE '{backend}' (expected 'json' or 'sqlite')")
+    return JsonStorage(file_format=os.environ.get('PROJECT_FILE_FORMAT', 'json').lower(),
+                       lock=os.environ.get('PROJECT_FILE_LOCK') == '1')
@@ -1,14 +1,34 @@
-import json
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from itertools import islice, product
 import math
+from models.catalog import get_catalog
+from recipe_optimizer import optimize, format_optimization, OptimizationError, OBJECTIVES
 
 # Global constants
 MAX_RECURSION_DEPTH = 5  # Default max recursion depth
 
 def load_data():
-    """Load the Satisfactory data from the JSON file."""
-    with open("raw_data/data.json", 'r', encoding='utf-8') as file:
-        return json.load(file)
+    """Return the Satisfactory data (data.json), shared through the game catalog."""
+    return get_catalog().data
+
+# Reverse index of the last data passed in: (data, {item_id: [recipe ids producing it]})
+_producer_index = (None, {})
+
+def recipe_producers(data, item_id):
+    """
+    Ids of the recipes of data['recipes'] producing item_id, in data order. The reverse
+    index is built once per data object (load_data() returns the same object until the
+    game data is reloaded).
+    """
+    global _producer_index
+    if _producer_index[0] is not data:
+        index = defaultdict(dict)
+        for recipe_id, recipe_data in data['recipes'].items():
+            for product in recipe_data.get('products') or []:
+                if isinstance(product, dict) and product.get('item'):
+                    index[product['item']][recipe_id] = None
+        _producer_index = (data, {item_id: list(recipe_ids) for item_id, recipe_ids in index.items()})
+    return _producer_index[1].get(item_id, ())
 
 def get_recipes_for_item(data, item_id):
     """Find all recipes that produce the given item."""
@@ -20,20 +40,10 @@ def get_recipes_for_item(data, item_id):
         print(f"Warning: Item '{item_id}' does not exist in the data!")
         return []
 
-    # Find recipes that produce this item
-    for recipe_id, recipe_data in data['recipes'].items():
-        if not recipe_data.get('products'):
-            continue
-
-        for product in recipe_data.get('products', []):
-            if not isinstance(product, dict):
-                continue
-
-            product_item = product.get('item')
-            if product_item == item_id:
-                recipes.append(recipe_id)
-                print(f"  Found recipe: {recipe_data.get('name', recipe_id)}")
-                break
+    # Find recipes that produce this item (reverse index built once per data)
+    for recipe_id in recipe_producers(data, item_id):
+        recipes.append(recipe_id)
+        print(f"  Found recipe: {data['recipes'][recipe_id].get('name', recipe_id)}")
 
     if not recipes:
         print(f"No recipes found that produce {item_name} ({item_id})")
@@ -55,8 +65,7 @@ def is_resource(data, item_id):
 
     # If it's not defined as a resource, but there are no recipes that produce it
     # then we'll consider it a terminal resource as well
-    recipes = get_recipes_for_item(data, item_id)
-    return len(recipes) == 0
+    return not recipe_producers(data, item_id)
 
 def get_item_name(data, item_id):
     """Get the human-readable name of an item."""
@@ -84,17 +93,284 @@ def calculate_production_rate(recipe_data):
 
     return items_per_minute
 
-def find_all_crafting_paths(data, target_item_id, desired_rate=None, path=None, visited=None, depth=0):
+# --- Recipe cycles and steady state ------------------------------------------
+
+# Machine counts / rates closer to zero than this are treated as zero
+STEADY_STATE_EPS = 1e-9
+
+# Steady state of a chosen recipe set, per unit of net output (see solve_steady_state)
+SteadyState = namedtuple('SteadyState', ['machines', 'rates', 'inputs', 'byproducts'])
+
+
+def _strongly_connected_components(graph):
+    """
+    Tarjan's algorithm (iterative, no recursion limit): the strongly connected
+    components of graph ({node: successors}) as frozensets, in reverse topological
+    order (a component comes before the components that lead to it).
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in list(graph):
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph.get(root, ())))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    break
+                if successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(frozenset(component))
+    return components
+
+
+class RecipeCycles:
+    """
+    Strongly connected components of the recipe graph (an item points to the
+    ingredients of every recipe making it, as product or byproduct). Only the items of
+    a cyclic component can be crafted, directly or not, from themselves: Recycled
+    Rubber <-> Recycled Plastic, packaging / unpackaging, converter recipes...
+    """
+
+    def __init__(self, recipes):
+        graph = defaultdict(set)
+        for recipe in recipes.values():
+            ingredients = [ing.get('item') for ing in recipe.get('ingredients', []) if ing.get('item')]
+            for product in recipe.get('products', []):
+                if product.get('item'):
+                    graph[product['item']].update(ingredients)
+        self.cycles = []
+        self._components = {}  # item_id -> cyclic component
+        for component in _strongly_connected_components(graph):
+            item_id = next(iter(component))
+            if len(component) > 1 or item_id in graph[item_id]:
+                self.cycles.append(component)
+                for member in component:
+                    self._components[member] = component
+
+    def component(self, item_id):
+        """Cyclic component of item_id (frozenset of item ids), None if the item is in no cycle."""
+        return self._components.get(item_id)
+
+    def in_cycle(self, item_id):
+        return item_id in self._components
+
+
+_recipe_cycles = (None, None)  # (data, RecipeCycles)
+_steady_states = (None, {})  # (data, {(recipe set, target): SteadyState or None})
+
+
+def recipe_cycles(data=None):
+    """The RecipeCycles of data (default: the game data), computed once per data object."""
+    global _recipe_cycles
+    data = data or load_data()
+    if _recipe_cycles[0] is not data:
+        _recipe_cycles = (data, RecipeCycles(data['recipes']))
+    return _recipe_cycles[1]
+
+
+def _net_rates(recipe_data):
+    """{item_id: net items per minute of one machine}: products positive, ingredients negative."""
+    time_seconds = recipe_data.get('time', 1.0)
+    rates = defaultdict(float)
+    for product in recipe_data.get('products', []):
+        if product.get('item'):
+            rates[product['item']] += product.get('amount', 0) * 60 / time_seconds
+    for ingredient in recipe_data.get('ingredients', []):
+        if ingredient.get('item'):
+            rates[ingredient['item']] -= ingredient.get('amount', 0) * 60 / time_seconds
+    return rates
+
+
+def _solve_linear_system(matrix, rhs):
+    """Solve matrix . x = rhs (Gaussian elimination, partial pivoting). None if singular."""
+    n = len(rhs)
+    rows = [list(row) + [value] for row, value in zip(matrix, rhs)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        if abs(rows[pivot][col]) < STEADY_STATE_EPS:
+            return None
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            factor = rows[r][col] / rows[col][col]
+            if r != col and factor:
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+def _unit_steady_state(data, recipes, target_item_id):
+    """solve_steady_state for 1/min of target_item_id (not cached)."""
+    net = {}
+    for item_id, recipe_id in recipes.items():
+        recipe_data = data['recipes'].get(recipe_id)
+        if recipe_data is None:
+            return None
+        net[item_id] = _net_rates(recipe_data)
+    # The machines of item i's recipe change the demand of item j if the recipe uses or makes j
+    graph = {item_id: [other for other in rates if other in net and other != item_id] for item_id, rates in net.items()}
+    demand = defaultdict(float)
+    demand[target_item_id] = 1.0
+    machines = {}
+    byproducts = defaultdict(float)
+    # Components in topological order: a component's demand is known once those leading to it are solved
+    for component in reversed(_strongly_connected_components(graph)):
+        members = sorted(component)
+        if len(members) == 1 and demand[members[0]] <= STEADY_STATE_EPS:
+            # Nothing left to make (byproducts of other recipes cover the demand)
+            counts = [0.0]
+            byproducts[members[0]] -= demand[members[0]]
+        else:
+            # Each item of a loop is made by its recipe and consumed by the others: net = demand
+            counts = _solve_linear_system(
+                [[net[maker].get(item_id, 0.0) for maker in members] for item_id in members],
+                [demand[item_id] for item_id in members]
+            )
+            if counts is None or any(count < -STEADY_STATE_EPS for count in counts):
+                return None  # The loop consumes more than it makes
+        for maker, count in zip(members, counts):
+            count = max(count, 0.0)
+            machines[recipes[maker]] = machines.get(recipes[maker], 0.0) + count
+            for item_id, rate in net[maker].items():
+                if item_id not in component:
+                    demand[item_id] -= rate * count
+    rates = {item_id: machines[recipes[item_id]] * max(net[item_id].get(item_id, 0.0), 0.0) for item_id in net}
+    inputs = {}
+    for item_id, value in demand.items():
+        if item_id in net:
+            continue
+        if value > STEADY_STATE_EPS:
+            inputs[item_id] = value
+        elif value < -STEADY_STATE_EPS:
+            byproducts[item_id] -= value
+    return SteadyState(
+        {recipe_id: count for recipe_id, count in machines.items() if count > STEADY_STATE_EPS},
+        rates,
+        inputs,
+        {item_id: rate for item_id, rate in byproducts.items() if rate > STEADY_STATE_EPS}
+    )
+
+
+def solve_steady_state(data, recipes, target_item_id, rate=1.0):
+    """
+    Steady state of a chosen recipe set ({item_id: recipe_id}, one recipe per crafted
+    item) making `rate`/min net of target_item_id, loops and byproducts included:
+        machines {recipe_id: machine count (fractional)}
+        rates {item_id: gross rate made by its recipe} (more than the net rate in a loop)
+        inputs {item_id: rate} items without a chosen recipe (resources, outsourced), net
+            of the byproducts of the recipes (e.g. recycled water)
+        byproducts {item_id: rate} surplus
+    The chosen recipes are split in strongly connected components: each loop is solved
+    as a small linear system, the other recipes directly. Solutions are cached per
+    recipe set (at 1/min, then scaled) and data object. Returns None if a loop can't
+    sustain itself.
+    """
+    global _steady_states
+    if _steady_states[0] is not data:
+        _steady_states = (data, {})
+    key = (frozenset(recipes.items()), target_item_id)
+    cache = _steady_states[1]
+    if key not in cache:
+        cache[key] = _unit_steady_state(data, dict(recipes), target_item_id)
+    unit = cache[key]
+    if unit is None:
+        return None
+    return SteadyState(*({item_id: value * rate for item_id, value in values.items()} for values in unit))
+
+
+def _loop_variants(ingredient_paths):
+    """
+    Split the alternatives of the ingredients of one recipe node by the loops they leave
+    open ('loops': {loop top item: recipe set of the loop}, see find_all_crafting_paths).
+    Returns [(loops, ingredient_paths)], one per combination; without loops, the one
+    combination is ingredient_paths itself.
+    """
+    if not any('loops' in path for ingredient in ingredient_paths for path in ingredient['paths']):
+        return [({}, ingredient_paths)]
+    groups = []
+    for ingredient in ingredient_paths:
+        by_loops = {}
+        for path in ingredient['paths']:
+            by_loops.setdefault(frozenset(path.get('loops', {}).items()), []).append(path)
+        if len(by_loops) == 1:
+            groups.append([(next(iter(by_loops)), ingredient)])
+        else:
+            groups.append([(key, {**ingredient, 'paths': paths}) for key, paths in by_loops.items()])
+    variants = []
+    for combination in product(*groups):
+        loops = {}
+        for key, _ingredient in combination:
+            for top_item_id, loop in key:
+                loops[top_item_id] = loops.get(top_item_id, frozenset()) | loop
+        variants.append((loops, [ingredient for _key, ingredient in combination]))
+    return variants
+
+
+def _scale_path(path, factor):
+    """Copy of a crafting path with every rate (and machine count) multiplied by factor."""
+    scaled = dict(path)
+    if 'recipe_name' not in path:
+        if path.get('rate') is not None:
+            scaled['rate'] = path['rate'] * factor
+        return scaled
+    multiplier = path['desired_rate'] / path['base_rate'] if path['desired_rate'] is not None and path['base_rate'] > 0 else 1.0
+    multiplier *= path.get('loop_factor', 1.0) * factor
+    power_use = path['power_usage'] / path['machine_count'] if path['machine_count'] else 0
+    if path['desired_rate'] is not None:
+        scaled['desired_rate'] = path['desired_rate'] * factor
+    if path.get('loop_rate') is not None:
+        scaled['loop_rate'] = path['loop_rate'] * factor
+    scaled['machine_count'] = math.ceil(multiplier) if multiplier > 0 else 1
+    scaled['power_usage'] = power_use * scaled['machine_count']
+    scaled['ingredients'] = [
+        {**ingredient, 'paths': [_scale_path(sub_path, factor) for sub_path in ingredient['paths']]}
+        for ingredient in path['ingredients']
+    ]
+    return scaled
+
+def find_all_crafting_paths(data, target_item_id, desired_rate=None, path=None, visited=None, depth=0, max_depth=None, chain=()):
     """
     Find all possible ways to craft an item recursively.
 
+    An ingredient already crafted higher on the path closes a loop (e.g. Recycled Rubber
+    <-> Recycled Plastic): it ends in a loop node ('is_loop') fed back by the item above,
+    and that item's recipe node ('loop_rate', 'loop_factor') and sub-tree are scaled to
+    the loop's steady state (see solve_steady_state), solved once per recipe set. Loops
+    that can't sustain themselves are dropped. Recipe nodes whose ingredient alternatives
+    close different loops are split, one per loop.
+
     Args:
         data: The loaded game data
         target_item_id: The ID of the item to craft
         desired_rate: Desired items per minute (None for recipe default)
         path: Current crafting path (for recursion)
-        visited: Set of visited items (to prevent cycles)
+        visited: Set of visited items (to detect loops)
         depth: Current recursion depth for debugging
+        max_depth: Max recursion depth (None for MAX_RECURSION_DEPTH)
+        chain: (item_id, recipe_id) of the nodes above, for recursion
 
     Returns:
         List of all possible crafting paths
@@ -105,9 +381,10 @@ def find_all_crafting_paths(data, target_item_id, desired_rate=None, path=None,
         return []
 
     # Set recursion depth limit to prevent infinite loops
-    global MAX_RECURSION_DEPTH
-    if depth > MAX_RECURSION_DEPTH:
-        print(f"WARNING: Max recursion depth ({MAX_RECURSION_DEPTH}) reached for {target_item_id}. Stopping this branch.")
+    if max_depth is None:
+        max_depth = MAX_RECURSION_DEPTH
+    if depth > max_depth:
+        print(f"WARNING: Max recursion depth ({max_depth}) reached for {target_item_id}. Stopping this branch.")
         return []
 
     if path is None:
@@ -119,10 +396,23 @@ def find_all_crafting_paths(data, target_item_id, desired_rate=None, path=None,
     indent = '  ' * depth
     print(f"{indent}Exploring {get_item_name(data, target_item_id)} (depth: {depth}, path: {path})")
 
-    # Prevent cycles in the recursion
+    # Loop: the item is fed back by the same item higher on the path
     if target_item_id in visited:
-        print(f"{indent}Cycle detected! {target_item_id} already visited in path: {visited}")
-        return []
+        top = next((i for i, (item_id, _recipe_id) in enumerate(chain) if item_id == target_item_id), None)
+        if top is None:
+            print(f"{indent}Cycle detected! {target_item_id} already visited in path: {visited}")
+            return []
+        item_name = get_item_name(data, target_item_id)
+        print(f"{indent}Loop: {item_name} is fed back by the {item_name} above")
+        return [{
+            'item_id': target_item_id,
+            'item_name': item_name,
+            'is_resource': False,
+            'is_loop': True,
+            'rate': desired_rate,
+            'children': [],
+            'loops': {target_item_id: frozenset(chain[top:])}
+        }]
 
     # Add the current item to the visited set
     visited = visited.copy()
@@ -155,6 +445,7 @@ def find_all_crafting_paths(data, target_item_id, desired_rate=None, path=None,
         }]
 
     all_paths = []
+    cycles = recipe_cycles(data)
 
     # Process each recipe
     for recipe_id in recipe_ids:
@@ -211,7 +502,9 @@ def find_all_crafting_paths(data, target_item_id, desired_rate=None, path=None,
                 ingredient_rate,
                 path + [recipe_id],
                 visited,
-                depth + 1
+                depth + 1,
+                max_depth,
+                chain + ((target_item_id, recipe_id),)
             )
 
             if sub_paths:
@@ -222,23 +515,246 @@ def find_all_crafting_paths(data, target_item_id, desired_rate=None, path=None,
             else:
                 print(f"{indent}  WARNING: No valid paths found for ingredient {ingredient_name}")
 
-        # Add this recipe as a possible path
-        all_paths.append({
-            'item_id': target_item_id,
-            'item_name': get_item_name(data, target_item_id),
-            'recipe_id': recipe_id,
-            'recipe_name': recipe_name,
-            'machine': recipe_data.get('machine', 'Unknown'),
-            'machine_count': math.ceil(multiplier) if multiplier > 0 else 1,
-            'power_usage': recipe_data.get('power_use', 0) * math.ceil(multiplier) if multiplier > 0 else recipe_data.get('power_use', 0),
-            'base_rate': base_rate,
-            'desired_rate': desired_rate,
-            'is_resource': False,
-            'ingredients': ingredient_paths
-        })
+        # Add this recipe as a possible path (only items in a recipe cycle can close loops)
+        variants = _loop_variants(ingredient_paths) if cycles.in_cycle(target_item_id) else [({}, ingredient_paths)]
+        for loops, ingredients in variants:
+            loop_factor = 1.0
+            loop = loops.pop(target_item_id, None)
+            if loop is not None:
+                # Steady state of the loop: this recipe makes more than desired, the rest is fed back
+                state = solve_steady_state(data, dict(loop), target_item_id)
+                if state is None:
+                    print(f"{indent}  WARNING: The loop through {recipe_name} can't sustain itself, skipping")
+                    continue
+                loop_factor = state.rates[target_item_id]
+                print(f"{indent}  Loop steady state: {recipe_name} runs x{loop_factor:.3f}")
+                ingredients = [
+                    {**ingredient, 'paths': [_scale_path(sub_path, loop_factor) for sub_path in ingredient['paths']]}
+                    for ingredient in ingredients
+                ]
+            machines = multiplier * loop_factor
+            node = {
+                'item_id': target_item_id,
+                'item_name': get_item_name(data, target_item_id),
+                'recipe_id': recipe_id,
+                'recipe_name': recipe_name,
+                'machine': recipe_data.get('machine', 'Unknown'),
+                'machine_count': math.ceil(machines) if machines > 0 else 1,
+                'power_usage': recipe_data.get('power_use', 0) * math.ceil(machines) if machines > 0 else recipe_data.get('power_use', 0),
+                'base_rate': base_rate,
+                'desired_rate': desired_rate,
+                'is_resource': False,
+                'ingredients': ingredients
+            }
+            if loop is not None:
+                node['loop_factor'] = loop_factor
+                node['loop_rate'] = (desired_rate if desired_rate is not None else base_rate) * loop_factor
+            if loops:
+                node['loops'] = loops
+            all_paths.append(node)
 
     return all_paths
 
+# --- Memoized, lazy enumeration ----------------------------------------------
+
+# One node of a crafting solution, at a rate of 1 item/min. `children` is a tuple of
+# (ratio, CraftingNode): the ingredient rate needed per unit of this node's rate.
+# Nodes are shared between every solution (and every parent) that uses them, so
+# they must be scaled by rate (see expand_crafting_path) rather than modified.
+CraftingNode = namedtuple('CraftingNode', ['item_id', 'recipe_id', 'base_rate', 'is_resource', 'truncated', 'children', 'items'])
+
+
+class _CachedSolutions:
+    """
+    Solutions of one (item_id, depth budget) sub-problem. They are generated on
+    demand and cached, so every parent iterating them gets the very same nodes.
+    """
+
+    def __init__(self, generator):
+        self._generator = generator
+        self._cache = []
+        self._done = False
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i < len(self._cache):
+                yield self._cache[i]
+                i += 1
+                continue
+            if self._done:
+                return
+            try:
+                self._cache.append(next(self._generator))
+            except StopIteration:
+                self._done = True
+                return
+
+
+def _combinations(sequences):
+    """Lazy cartesian product of re-iterable sequences (itertools.product would consume them all upfront)."""
+    if not sequences:
+        yield ()
+        return
+    for first in sequences[0]:
+        for rest in _combinations(sequences[1:]):
+            yield (first,) + rest
+
+
+class _FilteredSolutions:
+    """Re-iterable view of cached solutions that do not contain a given item."""
+
+    def __init__(self, solutions, excluded_item_id):
+        self._solutions = solutions
+        self._excluded = excluded_item_id
+
+    def __iter__(self):
+        return (node for node in self._solutions if self._excluded not in node.items)
+
+
+class CraftingPathEnumerator:
+    """
+    Enumerate complete crafting solutions (one recipe chosen per node) lazily.
+
+    Sub-trees are memoized per (item_id, depth budget) at a rate of 1/min and shared
+    between all the solutions using them; rates are applied when a solution is
+    expanded. A solution never crafts an item from itself (no item appears twice on
+    a path); branches deeper than the budget end in a `truncated` node.
+
+    This is not the same output as find_all_crafting_paths, which returns one compact
+    tree of alternatives (every recipe of every ingredient side by side): here each
+    solution is one full recipe combination, and their number is the product of the
+    alternatives (26,550 for Reinforced Iron Plate at depth 3). Listing them all costs
+    far more than building the alternatives tree; the enumerator is for taking the
+    first solutions lazily (max_solutions) or walking them one at a time.
+    """
+
+    def __init__(self, data=None):
+        self.data = data or load_data()
+        self._memo = {}
+
+    def solutions(self, item_id, max_depth=None):
+        """Generator of CraftingNode roots for item_id, at most max_depth recipes deep."""
+        if max_depth is None:
+            max_depth = MAX_RECURSION_DEPTH
+        return iter(self._solutions(item_id, max_depth))
+
+    def _solutions(self, item_id, budget):
+        key = (item_id, budget)
+        cached = self._memo.get(key)
+        if cached is None:
+            cached = self._memo[key] = _CachedSolutions(self._generate(item_id, budget))
+        return cached
+
+    def _generate(self, item_id, budget):
+        data = self.data
+        items = frozenset((item_id,))
+        if budget < 0:
+            yield CraftingNode(item_id, None, None, False, True, (), items)
+            return
+        if is_resource(data, item_id):
+            yield CraftingNode(item_id, None, None, True, False, (), items)
+            return
+        for recipe_id in recipe_producers(data, item_id):
+            recipe_data = data['recipes'][recipe_id]
+            time_seconds = recipe_data.get('time', 1.0)
+            amount = next((p.get('amount', 0) for p in recipe_data.get('products', []) if p.get('item') == item_id), 0)
+            if not amount:
+                continue
+            base_rate = (amount * 60) / time_seconds
+            ingredients = [ing for ing in recipe_data.get('ingredients', []) if ing.get('item')]
+            ratios = [ing.get('amount', 0) / amount for ing in ingredients]
+            # Drop the sub-solutions that go through this item again (cycles)
+            sub_solutions = [
+                _FilteredSolutions(self._solutions(ing['item'], budget - 1), item_id)
+                for ing in ingredients
+            ]
+            for combination in _combinations(sub_solutions):
+                children = tuple(zip(ratios, combination))
+                yield CraftingNode(
+                    item_id, recipe_id, base_rate, False, False, children,
+                    items.union(*(child.items for child in combination))
+                )
+
+
+def iter_crafting_paths(data, target_item_id, max_depth=None, enumerator=None):
+    """
+    Memoized counterpart of find_all_crafting_paths: a generator of complete
+    solutions (CraftingNode trees at 1/min) sharing their sub-trees, one per recipe
+    combination rather than one tree of alternatives (see CraftingPathEnumerator).
+    Pass the same enumerator to reuse its memo across queries.
+    """
+    if target_item_id not in data.get('items', {}) and target_item_id not in data.get('resources', {}):
+        return iter(())
+    enumerator = enumerator or CraftingPathEnumerator(data)
+    return enumerator.solutions(target_item_id, max_depth)
+
+
+def solution_recipes(node):
+    """
+    The recipe set ({item_id: recipe_id}) of a solution, for solve_steady_state.
+    None if the solution crafts one item with two different recipes.
+    """
+    recipes = {}
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.recipe_id is None:
+            continue
+        if recipes.setdefault(node.item_id, node.recipe_id) != node.recipe_id:
+            return None
+        stack.extend(child for _ratio, child in node.children)
+    return recipes
+
+
+def format_steady_state(data, state, rate_precision=2):
+    """Format the net inputs and byproducts of a SteadyState for display."""
+    result = []
+    for title, rates in (("Net inputs", state.inputs), ("Byproducts", state.byproducts)):
+        if rates:
+            result.append(f"{title}:")
+            for item_id, rate in sorted(rates.items(), key=lambda entry: -entry[1]):
+                result.append(f"  • {get_item_name(data, item_id)} - {rate:.{rate_precision}f}/min")
+    return result
+
+
+def expand_crafting_path(data, node, rate=None):
+    """
+    Build the display dict of one solution at the given rate (same shape as the
+    entries returned by find_all_crafting_paths, one path per ingredient).
+    """
+    if node.recipe_id is None:
+        return {
+            'item_id': node.item_id,
+            'item_name': get_item_name(data, node.item_id),
+            'is_resource': node.is_resource,
+            'truncated': node.truncated,
+            'rate': rate,
+            'children': []
+        }
+    recipe_data = data['recipes'][node.recipe_id]
+    multiplier = rate / node.base_rate if rate is not None and node.base_rate > 0 else 1.0
+    effective_rate = rate if rate is not None else node.base_rate
+    return {
+        'item_id': node.item_id,
+        'item_name': get_item_name(data, node.item_id),
+        'recipe_id': node.recipe_id,
+        'recipe_name': recipe_data.get('name', node.recipe_id),
+        'machine': recipe_data.get('machine', 'Unknown'),
+        'machine_count': math.ceil(multiplier) if multiplier > 0 else 1,
+        'power_usage': recipe_data.get('power_use', 0) * math.ceil(multiplier) if multiplier > 0 else recipe_data.get('power_use', 0),
+        'base_rate': node.base_rate,
+        'desired_rate': rate,
+        'is_resource': False,
+        'ingredients': [
+            {
+                'ingredient_id': child.item_id,
+                'paths': [expand_crafting_path(data, child, effective_rate * ratio)]
+            }
+            for ratio, child in node.children
+        ]
+    }
+
 def format_crafting_tree(tree, indent=0, rate_precision=2):
     """Format a crafting tree for display."""
     result = []
@@ -258,6 +774,8 @@ def format_crafting_tree(tree, indent=0, rate_precision=2):
             power_usage = path.get('power_usage', 0)
 
             result.append(f"{' ' * indent}• {path['item_name']} - {rate_str}")
+            if path.get('loop_rate') is not None:
+                result.append(f"{' ' * (indent+2)}Loop: makes {path['loop_rate']:.{rate_precision}f}/min, the surplus is fed back")
             result.append(f"{' ' * (indent+2)}Recipe: {path['recipe_name']}")
             result.append(f"{' ' * (indent+2)}Machine: {path['machine']} x{machine_count} ({power_usage:.1f} MW total)")
 
@@ -271,12 +789,20 @@ def format_crafting_tree(tree, indent=0, rate_precision=2):
         else:
             # Simple item node
             rate_str = f"{path.get('rate', 0):.{rate_precision}f}/min" if path.get('rate') else "as needed"
+            if path.get('truncated'):
+                rate_str += " (max depth reached)"
+            if path.get('is_loop'):
+                rate_str += " (fed back by the loop)"
             result.append(f"{' ' * indent}• {path['item_name']} - {rate_str}")
 
     return result
 
-def analyze_recipe(item_id, desired_rate=None, max_depth=None):
-    """Analyze all possible ways to craft an item at the desired rate."""
+def analyze_recipe(item_id, desired_rate=None, max_depth=None, memoized=False, max_solutions=None):
+    """
+    Analyze all possible ways to craft an item at the desired rate.
+    With memoized=True, complete solutions are enumerated lazily with shared
+    sub-trees (see CraftingPathEnumerator); max_solutions limits how many are shown.
+    """
     data = load_data()
 
     # Check if the item exists
@@ -289,20 +815,32 @@ def analyze_recipe(item_id, desired_rate=None, max_depth=None):
     if desired_rate:
         print(f"Desired production rate: {desired_rate}/min")
 
-    # Override max_depth in the find_all_crafting_paths function
-    global MAX_RECURSION_DEPTH
     if max_depth is not None:
-        old_depth = MAX_RECURSION_DEPTH
-        MAX_RECURSION_DEPTH = max_depth
-        print(f"Setting max recursion depth to {MAX_RECURSION_DEPTH}")
+        print(f"Using max recursion depth {max_depth}")
+
+    if memoized:
+        solutions = iter_crafting_paths(data, item_id, max_depth)
+        if max_solutions:
+            solutions = islice(solutions, max_solutions)
+        print("\nCrafting solutions:")
+        print("=" * 80)
+        count = 0
+        for count, node in enumerate(solutions, 1):
+            print(f"\nSolution {count}:")
+            print("-" * 40)
+            print("\n".join(format_crafting_tree([expand_crafting_path(data, node, desired_rate)])))
+            # Totals with the byproducts netted (e.g. water recycled by a later step)
+            recipes = solution_recipes(node)
+            state = solve_steady_state(data, recipes, item_id, desired_rate or node.base_rate) if recipes else None
+            if state is not None:
+                print("\n".join(format_steady_state(data, state)))
+        if not count:
+            print(f"No recipes found for {item_name}.")
+        return
 
     # Find all crafting paths
     print(f"Finding all crafting paths for {item_name}...")
-    crafting_paths = find_all_crafting_paths(data, item_id, desired_rate)
-
-    # Restore original max depth
-    if max_depth is not None:
-        MAX_RECURSION_DEPTH = old_depth
+    crafting_paths = find_all_crafting_paths(data, item_id, desired_rate, max_depth=max_depth)
 
     if not crafting_paths:
         print(f"No recipes found for {item_name}.")
@@ -319,6 +857,21 @@ def analyze_recipe(item_id, desired_rate=None, max_depth=None):
         print("\n".join(formatted_tree))
         print()
 
+def optimize_recipe(item_id, desired_rate=None, objective='power', caps=None):
+    """Find the best recipe selection for an item with the LP optimizer (see recipe_optimizer)."""
+    data = load_data()
+    item_name = get_item_name(data, item_id)
+    print(f"Optimizing {item_name} ({item_id}) for objective '{objective}'")
+    try:
+        result = optimize(item_id, desired_rate, objective, caps=caps)
+    except OptimizationError as e:
+        print(f"Error: {e}")
+        return None
+    print("\nBest recipe selection:")
+    print("=" * 80)
+    print("\n".join(format_optimization(result, data)))
+    return result
+
 def list_all_items():
     """List all items available in the game data."""
     data = load_data()
@@ -350,9 +903,11 @@ def main():
         print("1. Analyze a specific item")
         print("2. Quick analysis (limited depth)")
         print("3. List all available items")
-        print("4. Exit")
+        print("4. Optimize recipe selection (min power / min resources / max output)")
+        print("5. Enumerate complete solutions (memoized, lazy)")
+        print("6. Exit")
 
-        choice = input("\nEnter your choice (1-4): ")
+        choice = input("\nEnter your choice (1-6): ")
 
         if choice == '1':
             default_item_id = "Desc_SteelPipe_C"
@@ -405,6 +960,66 @@ def main():
             list_all_items()
 
         elif choice == '4':
+            default_item_id = "Desc_SteelPipe_C"
+            item_id = input(f"Enter the item ID (e.g., {default_item_id}): ").strip()
+            if not item_id:
+                item_id = default_item_id
+            objective = input(f"Enter the objective {OBJECTIVES} (or press Enter for power): ").strip() or 'power'
+
+            rate = None
+            caps = None
+            if objective == 'max_output':
+                caps = {}
+                print("Enter resource caps as <item ID>=<rate per minute>, empty line to finish:")
+                while True:
+                    cap_input = input("  cap: ").strip()
+                    if not cap_input:
+                        break
+                    try:
+                        cap_item, cap_rate = cap_input.split('=', 1)
+                        caps[cap_item.strip()] = float(cap_rate)
+                    except ValueError:
+                        print("Invalid cap. Expected e.g. Desc_OreIron_C=120")
+            else:
+                rate_input = input("Enter desired production rate per minute (or press Enter for default, e.g., 30): ")
+                if not rate_input.strip():
+                    rate_input = "30"
+                try:
+                    rate = float(rate_input)
+                except ValueError:
+                    print("Invalid rate. Using default.")
+                    rate = 30.0
+
+            optimize_recipe(item_id, rate, objective, caps)
+
+        elif choice == '5':
+            default_item_id = "Desc_SteelPipe_C"
+            item_id = input(f"Enter the item ID (e.g., {default_item_id}): ").strip()
+            if not item_id:
+                item_id = default_item_id
+            rate_input = input("Enter desired production rate per minute (or press Enter for default, e.g., 30): ")
+            depth_input = input(f"Enter max recursion depth (or press Enter for default, e.g., {MAX_RECURSION_DEPTH}): ")
+            count_input = input("Enter how many solutions to show (or press Enter for default, e.g., 10): ")
+
+            try:
+                rate = float(rate_input) if rate_input.strip() else 30.0
+            except ValueError:
+                print("Invalid rate. Using default.")
+                rate = 30.0
+            try:
+                depth = int(depth_input) if depth_input.strip() else MAX_RECURSION_DEPTH
+            except ValueError:
+                print("Invalid depth. Using default.")
+                depth = MAX_RECURSION_DEPTH
+            try:
+                count = int(count_input) if count_input.strip() else 10
+            except ValueError:
+                print("Invalid count. Using default.")
+                count = 10
+
+            analyze_recipe(item_id, rate, depth, memoized=True, max_solutions=count)
+
+        elif choice == '6':
             print("Exiting...")
             break
 
@@ -0,0 +1,422 @@
+"""
+Linear-programming optimizer for recipe selection.
+
+Instead of enumerating every crafting combination (see recipe_analyzer), the
+recipe/item graph from enhanced_recipes.json is turned into a linear program:
+
+    variables   x_r >= 0   number of machines running recipe r (100% clock)
+                s_i >= 0   extraction rate of raw item i (resources, or items no recipe makes)
+    per item i  sum_r net_rate(r, i) * x_r + s_i >= demand_i
+
+Surplus on any row is a byproduct (left over), so byproducts and alternate
+recipes are handled globally by the solver. Three objectives are supported:
+
+    'power'      minimize total MW for a target item and rate
+    'resources'  minimize the weighted raw-resource draw for a target item and rate
+    'max_output' maximize the target rate, given caps on resource extraction
+
+The solver is a small sparse two-phase simplex written in pure Python, so it
+runs offline without NumPy/SciPy.
+"""
+import math
+import random
+from models.catalog import get_catalog
+
+OBJECTIVES = ('power', 'resources', 'max_output')
+
+EPS = 1e-9
+# Smallest acceptable pivot element (smaller ones are rounding noise)
+PIVOT_EPS = 1e-7
+# Infeasibility tolerated on a basic variable by the ratio test
+FEASIBILITY_TOL = 1e-9
+# Small secondary cost so ties are broken towards fewer machines / less extraction
+TIE_BREAK = 1e-6
+# Switch from Dantzig's rule to Bland's rule after this many degenerate pivots
+DEGENERATE_PIVOTS_BEFORE_BLAND = 50
+# Right-hand side perturbation against degeneracy (almost every row is `net = 0`)
+PERTURBATION = 1e-7
+# Values below this are perturbation noise and reported as zero
+RESULT_EPS = 1e-5
+MAX_PIVOTS = 20000
+
+
+class OptimizationError(Exception):
+    """Raised when the problem is infeasible, unbounded or badly specified."""
+
+
+# --- Simplex -----------------------------------------------------------------
+
+class _Simplex:
+    """
+    Sparse tableau for: minimize c.x subject to rows (dict col -> coef) . x = rhs, x >= 0, rhs >= 0.
+    The caller provides an initial feasible basis (one basic column per row, coefficient 1).
+    """
+
+    def __init__(self, rows, rhs, basis, n_cols):
+        self.rows = rows
+        # The initial basis columns are the identity, so the tableau keeps B^-1 in
+        # them: used to recover the exact (unperturbed) solution at the end
+        self.b = list(rhs)
+        self.initial_basis = list(basis)
+        # Distinct tiny offsets make ties in the ratio test (and cycling) unlikely;
+        # seeded so that a given problem always gets the same solution
+        rng = random.Random(len(rhs))
+        self.rhs = [b + PERTURBATION * rng.uniform(1.0, 10.0) for b in rhs]
+        self.basis = basis
+        self.n_cols = n_cols
+        self.pivots = 0
+
+    def _objective_row(self, costs):
+        # Reduced costs: c - c_B * B^-1 * A (the tableau rows already are B^-1 * A)
+        z = dict(costs)
+        z_rhs = 0.0
+        for r, col in enumerate(self.basis):
+            c_b = costs.get(col, 0.0)
+            if c_b:
+                for j, a in self.rows[r].items():
+                    z[j] = z.get(j, 0.0) - c_b * a
+                z_rhs -= c_b * self.rhs[r]
+        return z, z_rhs
+
+    def _pivot(self, r, col, z):
+        row = self.rows[r]
+        inv = 1.0 / row[col]
+        for j in row:
+            row[j] *= inv
+        row[col] = 1.0
+        self.rhs[r] *= inv
+        for i, other in enumerate(self.rows):
+            if i == r:
+                continue
+            a = other.get(col)
+            if a is None:
+                continue
+            for j, v in row.items():
+                nv = other.get(j, 0.0) - a * v
+                if abs(nv) > EPS:
+                    other[j] = nv
+                else:
+                    other.pop(j, None)
+            other.pop(col, None)
+            self.rhs[i] -= a * self.rhs[r]
+            if self.rhs[i] < 0 and self.rhs[i] > -EPS:
+                self.rhs[i] = 0.0
+        a = z.get(col)
+        if a is not None:
+            for j, v in row.items():
+                nv = z.get(j, 0.0) - a * v
+                if abs(nv) > EPS:
+                    z[j] = nv
+                else:
+                    z.pop(j, None)
+            z.pop(col, None)
+            z['rhs'] = z.get('rhs', 0.0) - a * self.rhs[r]
+        self.basis[r] = col
+        self.pivots += 1
+
+    def minimize(self, costs, allowed=None):
+        """Run the simplex for the given costs. Returns the objective value."""
+        z, z_rhs = self._objective_row(costs)
+        z['rhs'] = z_rhs
+        degenerate = 0
+        use_bland = False
+        while True:
+            if self.pivots > MAX_PIVOTS:
+                raise OptimizationError('Simplex did not converge')
+            use_bland = use_bland or degenerate >= DEGENERATE_PIVOTS_BEFORE_BLAND
+            col = None
+            best = -EPS
+            for j, d in z.items():
+                if j == 'rhs' or d >= -EPS or (allowed is not None and j not in allowed):
+                    continue
+                if use_bland:
+                    if col is None or j < col:
+                        col = j
+                elif d < best:
+                    best = d
+                    col = j
+            if col is None:
+                return -z['rhs']
+            # Harris ratio test: find the largest step allowed with a small feasibility
+            # tolerance, then among the rows blocking within that step pick the largest
+            # pivot element (numerical stability), or the smallest basic column (Bland)
+            theta_max = math.inf
+            for r, row in enumerate(self.rows):
+                a = row.get(col, 0.0)
+                if a > PIVOT_EPS:
+                    theta_max = min(theta_max, (max(self.rhs[r], 0.0) + FEASIBILITY_TOL) / a)
+            r_best = None
+            ratio_best = 0.0
+            for r, row in enumerate(self.rows):
+                a = row.get(col, 0.0)
+                if a > PIVOT_EPS and max(self.rhs[r], 0.0) / a <= theta_max:
+                    if r_best is None:
+                        better = True
+                    elif use_bland:
+                        better = self.basis[r] < self.basis[r_best]
+                    else:
+                        better = a > self.rows[r_best][col]
+                    if better:
+                        r_best = r
+                        ratio_best = max(self.rhs[r], 0.0) / a
+            if r_best is None:
+                raise OptimizationError('Problem is unbounded')
+            degenerate = degenerate + 1 if ratio_best <= EPS else 0
+            self._pivot(r_best, col, z)
+
+    def values(self):
+        """Return the basic solution of the unperturbed problem (B^-1 * b)."""
+        x = [0.0] * self.n_cols
+        b = [(col, v) for col, v in zip(self.initial_basis, self.b) if v]
+        for r, col in enumerate(self.basis):
+            row = self.rows[r]
+            x[col] = max(sum(row.get(c, 0.0) * v for c, v in b), 0.0)
+        return x
+
+
+# --- Model -------------------------------------------------------------------
+
+def _recipe_rates(recipe, key):
+    """Return {item_id: per-minute rate} for the recipe's products or ingredients."""
+    rates = {}
+    time_seconds = recipe.get('time') or 1.0
+    for entry in recipe.get(key, []):
+        rate = entry.get('rate')
+        if rate is None:
+            rate = entry.get('amount', 0) * 60 / time_seconds
+        rates[entry['item']] = rates.get(entry['item'], 0.0) + rate
+    return rates
+
+
+def _upstream(catalog, target_item_id, excluded_recipes):
+    """Collect the recipes and items reachable upstream from the target item."""
+    recipe_ids = []
+    seen_recipes = set()
+    seen_items = {target_item_id}
+    stack = [target_item_id]
+    while stack:
+        item_id = stack.pop()
+        for recipe_id in catalog.producers(item_id):
+            if recipe_id in seen_recipes or recipe_id in excluded_recipes:
+                continue
+            seen_recipes.add(recipe_id)
+            recipe_ids.append(recipe_id)
+            for ing in catalog.recipes[recipe_id].get('ingredients', []):
+                if ing['item'] not in seen_items:
+                    seen_items.add(ing['item'])
+                    stack.append(ing['item'])
+    return recipe_ids
+
+
+def optimize(target_item_id, rate=None, objective='power', resource_weights=None, caps=None,
+             excluded_recipes=None, allow_alternates=True, catalog=None):
+    """
+    Find the best recipe selection for a target item.
+
+    Args:
+        target_item_id: The ID of the item to produce
+        rate: Desired items per minute (required for 'power' and 'resources')
+        objective: 'power', 'resources' or 'max_output'
+        resource_weights: {item_id: weight} for the 'resources' objective (default 1 each)
+        caps: {item_id: max extraction per minute}. For 'max_output', raw items missing
+              from caps are unavailable; for the other objectives caps are optional limits
+        excluded_recipes: Recipe ids the solver may not use (e.g. locked alternates)
+        allow_alternates: If False, every 'Recipe_Alternate_*' recipe is excluded
+
+    Returns:
+        A dict with the chosen recipes (machines, power), raw resource draw,
+        byproducts, total power and the achieved output rate.
+    """
+    if objective not in OBJECTIVES:
+        raise OptimizationError(f"Unknown objective '{objective}', expected one of {OBJECTIVES}")
+    if objective != 'max_output' and (rate is None or rate <= 0):
+        raise OptimizationError(f"Objective '{objective}' needs a positive target rate")
+    catalog = catalog or get_catalog()
+    if target_item_id not in catalog.items and target_item_id not in catalog.resources:
+        raise OptimizationError(f"Item '{target_item_id}' does not exist in the data")
+    caps = dict(caps or {})
+    resource_weights = resource_weights or {}
+    excluded = set(excluded_recipes or ())
+    if not allow_alternates:
+        excluded.update(r for r in catalog.recipes if r.startswith('Recipe_Alternate_'))
+
+    recipe_ids = _upstream(catalog, target_item_id, excluded)
+    produced = {}
+    consumed = {}
+    for recipe_id in recipe_ids:
+        produced[recipe_id] = _recipe_rates(catalog.recipes[recipe_id], 'products')
+        consumed[recipe_id] = _recipe_rates(catalog.recipes[recipe_id], 'ingredients')
+    # Only items that are consumed (or the target) need a balance row: anything
+    # that is only produced is a byproduct and its row is always satisfied.
+    row_items = [target_item_id]
+    for recipe_id in recipe_ids:
+        for item_id in consumed[recipe_id]:
+            if item_id not in row_items:
+                row_items.append(item_id)
+    raw_items = [i for i in row_items if i in catalog.resources or not any(r not in excluded for r in catalog.producers(i))]
+    if objective == 'max_output':
+        # Raw items missing from caps are unavailable
+        raw_items = [i for i in raw_items if i in caps]
+
+    # Columns: recipes | raw extraction | surplus per row | target output (max_output) | cap slacks | artificial
+    n_recipes = len(recipe_ids)
+    col_raw = {item_id: n_recipes + k for k, item_id in enumerate(raw_items)}
+    col_surplus_start = n_recipes + len(raw_items)
+    n_cols = col_surplus_start + len(row_items)
+    col_output = None
+    if objective == 'max_output':
+        col_output = n_cols
+        n_cols += 1
+    row_index = {item_id: k for k, item_id in enumerate(row_items)}
+
+    # Net rate of every recipe on each row. Rates range from fractions to
+    # thousands per minute, so columns (recipes) then rows (items) are scaled to
+    # a max |coefficient| of 1 to keep the tableau well conditioned.
+    rows = [dict() for _ in row_items]
+    col_scale = [1.0] * n_recipes
+    for k, recipe_id in enumerate(recipe_ids):
+        net = {}
+        for item_id, r in produced[recipe_id].items():
+            if item_id in row_index:
+                net[row_index[item_id]] = net.get(row_index[item_id], 0.0) + r
+        for item_id, r in consumed[recipe_id].items():
+            net[row_index[item_id]] = net.get(row_index[item_id], 0.0) - r
+        net = {i: a for i, a in net.items() if a}
+        if net:
+            col_scale[k] = 1.0 / max(abs(a) for a in net.values())
+        for i, a in net.items():
+            rows[i][k] = a * col_scale[k]
+    row_scale = [1.0 / max([abs(a) for a in row.values()] + [1.0]) for row in rows]
+    for item_id, col in col_raw.items():
+        rows[row_index[item_id]][col] = 1.0
+    rhs = [0.0] * len(row_items)
+    basis = []
+    artificial = None
+    for k, item_id in enumerate(row_items):
+        rows[k] = {j: a * row_scale[k] for j, a in rows[k].items()}
+        surplus = col_surplus_start + k
+        rows[k][surplus] = -1.0
+        if item_id == target_item_id and col_output is not None:
+            rows[k][col_output] = -row_scale[k]
+        if item_id == target_item_id and col_output is None:
+            # net - surplus = rate: needs an artificial start column
+            rhs[k] = float(rate) * row_scale[k]
+            artificial = n_cols
+            n_cols += 1
+            rows[k][artificial] = 1.0
+            basis.append(artificial)
+        else:
+            # net - surplus = 0  <=>  surplus - net = 0: the surplus is a feasible start column
+            rows[k] = {j: -a for j, a in rows[k].items()}
+            basis.append(surplus)
+    # Extraction caps: s_i + slack = cap
+    for item_id, cap in caps.items():
+        if item_id not in col_raw or cap is None or cap == math.inf:
+            continue
+        slack = n_cols
+        n_cols += 1
+        rows.append({col_raw[item_id]: 1.0, slack: 1.0})
+        rhs.append(float(cap))
+        basis.append(slack)
+
+    simplex = _Simplex(rows, rhs, basis, n_cols)
+    if artificial is not None:
+        if simplex.minimize({artificial: 1.0}) > RESULT_EPS:
+            raise OptimizationError(f"No way to produce {target_item_id} at {rate}/min with the given constraints")
+        # Drive the artificial out of the basis; it is then never allowed to enter
+        # again (its column stays in the tableau as part of B^-1)
+        for r, col in enumerate(simplex.basis):
+            if col == artificial:
+                for j, a in simplex.rows[r].items():
+                    if j != artificial and abs(a) > PIVOT_EPS:
+                        simplex._pivot(r, j, {})
+                        break
+
+    power = {k: catalog.recipes[recipe_id].get('power_use', 0.0) or 0.0 for k, recipe_id in enumerate(recipe_ids)}
+    weights = {col: resource_weights.get(item_id, 1.0) for item_id, col in col_raw.items()}
+    # Recipe costs are expressed per scaled column
+    costs = {}
+    if objective == 'power':
+        costs.update({k: p * col_scale[k] for k, p in power.items() if p})
+        costs.update({col: TIE_BREAK * w for col, w in weights.items()})
+    elif objective == 'resources':
+        costs.update(weights)
+        costs.update({k: TIE_BREAK * p * col_scale[k] for k, p in power.items() if p})
+    else:
+        costs[col_output] = -1.0
+        costs.update({k: TIE_BREAK * p * col_scale[k] for k, p in power.items() if p})
+    allowed = set(range(n_cols)) - {artificial}
+    simplex.minimize(costs, allowed)
+    x = simplex.values()
+    for k in range(n_recipes):
+        x[k] *= col_scale[k]
+
+    result_recipes = {}
+    total_power = 0.0
+    for k, recipe_id in enumerate(recipe_ids):
+        if x[k] <= RESULT_EPS:
+            continue
+        recipe = catalog.recipes[recipe_id]
+        machine_power = power[k] * x[k]
+        total_power += machine_power
+        result_recipes[recipe_id] = {
+            'name': recipe.get('name', recipe_id),
+            'machine': recipe.get('machine'),
+            'machine_name': catalog.machine_name(recipe.get('machine')),
+            'machines': x[k],
+            'power': machine_power,
+        }
+    resources = {item_id: x[col] for item_id, col in col_raw.items() if x[col] > RESULT_EPS}
+    # Byproducts: net surplus of every item that is not the target
+    net = {}
+    for k, recipe_id in enumerate(recipe_ids):
+        if x[k] <= RESULT_EPS:
+            continue
+        for item_id, r in produced[recipe_id].items():
+            net[item_id] = net.get(item_id, 0.0) + r * x[k]
+        for item_id, r in consumed[recipe_id].items():
+            net[item_id] = net.get(item_id, 0.0) - r * x[k]
+    for item_id, s in resources.items():
+        net[item_id] = net.get(item_id, 0.0) + s
+    output = net.pop(target_item_id, 0.0)
+    byproducts = {item_id: v for item_id, v in net.items() if v > RESULT_EPS * 100}
+    return {
+        'item_id': target_item_id,
+        'objective': objective,
+        'rate': output,
+        'recipes': result_recipes,
+        'resources': resources,
+        'byproducts': byproducts,
+        'total_power': total_power,
+        'pivots': simplex.pivots,
+    }
+
+
+def format_optimization(result, data=None, rate_precision=2):
+    """Format an optimize() result for display."""
+    catalog = get_catalog()
+    data = data or catalog.data
+
+    def name(item_id):
+        if item_id in data.get('items', {}):
+            return data['items'][item_id].get('name', item_id)
+        if item_id in data.get('resources', {}):
+            return data['resources'][item_id].get('name', item_id)
+        return item_id
+
+    lines = [
+        f"• {name(result['item_id'])} - {result['rate']:.{rate_precision}f}/min ({result['objective']})",
+        f"  Total power: {result['total_power']:.1f} MW",
+        "  Recipes:",
+    ]
+    for recipe in sorted(result['recipes'].values(), key=lambda r: r['name']):
+        lines.append(f"    • {recipe['name']}: {recipe['machine_name']} x{recipe['machines']:.{rate_precision}f} ({recipe['power']:.1f} MW)")
+    if result['resources']:
+        lines.append("  Raw resources:")
+        for item_id, r in sorted(result['resources'].items(), key=lambda kv: name(kv[0])):
+            lines.append(f"    • {name(item_id)} - {r:.{rate_precision}f}/min")
+    if result['byproducts']:
+        lines.append("  Byproducts:")
+        for item_id, r in sorted(result['byproducts'].items(), key=lambda kv: name(kv[0])):
+            lines.append(f"    • {name(item_id)} - {r:.{rate_precision}f}/min")
+    return lines
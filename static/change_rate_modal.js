@@ -11,11 +11,28 @@
         var projectId = document.querySelector('.text-muted.mb-2')?.textContent.trim();
         if (form && input && itemUuid && projectId) {
           form.action = '/project/' + encodeURIComponent(projectId) + '/item/' + encodeURIComponent(itemUuid) + '/change_rate';
+          form.setAttribute('data-item-uuid', itemUuid);
           input.value = rate;
-          var modal = new bootstrap.Modal(modalEl);
+          var modal = bootstrap.Modal.getOrCreateInstance(modalEl);
           modal.show();
         }
       }
     });
+    // Submit through the JSON API and patch the page (the form action is the fallback)
+    var modalEl = document.getElementById('changeRateModal');
+    var form = modalEl && modalEl.querySelector('form');
+    if (form && window.ProjectApi) {
+      form.addEventListener('submit', function(e) {
+        var itemUuid = form.getAttribute('data-item-uuid');
+        if (!itemUuid) {
+          return;
+        }
+        e.preventDefault();
+        var rate = form.querySelector('#changeRateInput').value;
+        ProjectApi.mutate(itemUuid, 'change_rate', {rate: rate}).then(function() {
+          bootstrap.Modal.getOrCreateInstance(modalEl).hide();
+        });
+      });
+    }
   });
 })();
@@ -0,0 +1,113 @@
+// project_api.js - Calls the JSON mutation API (/api/project/...) and patches the page
+// in place with the returned deltas, instead of reloading the whole project.
+var ProjectApi = (function() {
+    // Same display as the templates ({{ value|round(2) }})
+    function fmt(value) {
+        var rounded = Math.round(value * 100) / 100;
+        return Number.isInteger(rounded) ? rounded.toFixed(1) : String(rounded);
+    }
+
+    function projectId() {
+        return window.location.pathname.split('/')[2];
+    }
+
+    // Element of a card itself (not of the cards of its ingredients)
+    function own(cardEl, selector) {
+        return cardEl.querySelector(':scope > ' + selector);
+    }
+
+    function setText(el, value) {
+        if (el) {
+            el.textContent = fmt(value);
+        }
+        // Shown / hidden value: the card layout changed, it can't be patched
+        return Boolean(el) === (value !== null && value !== undefined && value !== 0);
+    }
+
+    function patchNode(node) {
+        var cardEl = document.querySelector('.card[data-uuid="' + node.uuid + '"]');
+        if (!cardEl) {
+            return false;
+        }
+        var ok = true;
+        var rateEl = own(cardEl, '.card-header .card-rate');
+        if (rateEl) {
+            rateEl.textContent = fmt(node.rate);
+        }
+        if (cardEl.classList.contains('recipe-card')) {
+            ok = setText(own(cardEl, '.card-body > .mb-2 .card-num-machines'), node.num_machines) && ok;
+            ok = setText(own(cardEl, '.card-body > .mb-2 .card-total-power'), node.num_machines ? node.total_power : null) && ok;
+            node.byproducts.forEach(function(bp) {
+                var bpEl = own(cardEl, '.card-body > .byproduct-bar .card-byproduct-rate[data-item-id="' + bp.item_id + '"]');
+                if (bpEl) {
+                    bpEl.textContent = fmt(bp.rate);
+                } else {
+                    ok = false;
+                }
+            });
+            var extraEl = own(cardEl, '.card-body > .extra-product-bar .extra-product-rate-input');
+            if (extraEl && document.activeElement !== extraEl) {
+                extraEl.value = fmt(node.extra_rate);
+            }
+        }
+        // Rate badge of the top-level items in the sidebar
+        document.querySelectorAll('.change-rate-btn[data-uuid="' + node.uuid + '"]').forEach(function(badge) {
+            badge.setAttribute('data-rate', node.rate);
+            badge.textContent = node.rate + '/min';
+        });
+        return ok;
+    }
+
+    function apply(payload) {
+        var replaced = [];
+        Object.keys(payload.html || {}).forEach(function(uuid) {
+            var cardEl = document.querySelector('.card[data-uuid="' + uuid + '"]');
+            if (cardEl) {
+                cardEl.outerHTML = payload.html[uuid];
+                replaced.push(uuid);
+            }
+        });
+        var ok = payload.nodes.every(function(node) {
+            // Nodes of a replaced card are already up to date
+            return replaced.indexOf(node.uuid) >= 0 || patchNode(node);
+        });
+        var report = document.getElementById('production-report');
+        if (report && payload.report_html !== undefined) {
+            report.innerHTML = payload.report_html;
+        }
+        var dot = document.querySelector('.project-status-dot');
+        if (dot && payload.dirty) {
+            dot.style.background = '#d00';
+            dot.title = 'Unsaved changes';
+        }
+        return ok;
+    }
+
+    // POST a mutation and patch the page (reload it if the change can't be applied in place)
+    function mutate(itemUuid, action, params) {
+        var formData = new FormData();
+        Object.keys(params).forEach(function(key) {
+            formData.append(key, params[key]);
+        });
+        var url = '/api/project/' + encodeURIComponent(projectId()) + '/item/' + encodeURIComponent(itemUuid) + '/' + action;
+        return fetch(url, {method: 'POST', body: formData})
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error('HTTP ' + response.status);
+                }
+                return response.json();
+            })
+            .then(function(payload) {
+                if (!apply(payload)) {
+                    window.location.reload();
+                }
+                return payload;
+            })
+            .catch(function(error) {
+                console.error('[ProjectApi] ' + action + ' failed:', error);
+                window.location.reload();
+            });
+    }
+
+    return {mutate: mutate, apply: apply};
+})();